@@ -0,0 +1,174 @@
+'''
+@summary: Admission control for the batch endpoint. Batches are turned away before
+          their body is even parsed when the process already has too many
+          sub-requests in flight, or the executor too many queued, so that overload
+          is answered quickly instead of piling up work.
+'''
+from __future__ import absolute_import, unicode_literals
+
+import threading
+from functools import wraps
+
+import six
+from django.http.response import HttpResponse
+
+from batch_requests.settings import br_settings as _settings, import_class
+
+
+RETRY_AFTER_HEADER_NAME = "Retry-After"
+
+
+class AdmissionController(object):
+    '''
+        Keeps count of the cost of the batches being served by the process, a batch
+        costing `cost` sub-requests: a number, or a function of the batch request
+        returning one. A batch is admitted while the total stays under
+        `max_in_flight`, and the queue depth of the executor under `max_queue_depth`.
+        Either limit may be None. A batch costing more than `max_in_flight` is only
+        admitted when no other batch is in flight.
+    '''
+
+    def __init__(self, max_in_flight=None, max_queue_depth=None, cost=1):
+        self.max_in_flight = max_in_flight
+        self.max_queue_depth = max_queue_depth
+        self.cost = cost
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def get_cost(self, request):
+        return self.cost(request) if callable(self.cost) else self.cost
+
+    def is_overloaded(self, executor):
+        get_queue_depth = getattr(executor, "get_queue_depth", None)
+        return (
+            self.max_queue_depth is not None and get_queue_depth is not None and
+            get_queue_depth() >= self.max_queue_depth
+        )
+
+    def admit(self, cost, executor=None):
+        '''
+            Reserves the cost for a batch, returns whether it was admitted.
+        '''
+        if self.is_overloaded(executor):
+            return False
+
+        with self._lock:
+            if self.max_in_flight is not None and self.in_flight and self.in_flight + cost > self.max_in_flight:
+                return False
+            self.in_flight += cost
+            return True
+
+    def release(self, cost):
+        with self._lock:
+            self.in_flight -= cost
+
+
+class ReleasingIterator(six.Iterator):
+    '''
+        Iterates over the content of a streamed response, calls release once it is
+        exhausted or closed, whichever comes first.
+    '''
+
+    def __init__(self, content, release):
+        self.content = iter(content)
+        self.release = release
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self.content)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        release, self.release = self.release, None
+        try:
+            close = getattr(self.content, "close", None)
+            if close is not None:
+                close()
+        finally:
+            if release is not None:
+                release()
+
+
+def get_admission_controller():
+    '''
+        Returns the AdmissionController configured by the ADMISSION_* settings, None
+        if admission control is off.
+    '''
+    if _settings.ADMISSION_MAX_IN_FLIGHT is None and _settings.ADMISSION_MAX_QUEUE_DEPTH is None:
+        return None
+
+    cost = _settings.ADMISSION_BATCH_COST
+    if cost is None:
+        cost = _settings.MAX_LIMIT
+    elif isinstance(cost, six.string_types):
+        cost = import_class(cost)
+
+    return AdmissionController(_settings.ADMISSION_MAX_IN_FLIGHT, _settings.ADMISSION_MAX_QUEUE_DEPTH, cost)
+
+
+def get_rejected_response():
+    '''
+        The response to a batch turned away, telling the client when to try again.
+    '''
+    resp = HttpResponse(status=_settings.ADMISSION_REJECT_STATUS)
+    resp[RETRY_AFTER_HEADER_NAME] = "%d" % _settings.ADMISSION_RETRY_AFTER
+    if _settings.metrics_sink is not None:
+        _settings.metrics_sink.increment("batch_requests.rejected")
+    return resp
+
+
+def admit(request, executor):
+    '''
+        Returns the cost reserved for the batch request, None if it was turned away.
+        0 if admission control is off.
+    '''
+    controller = _settings.admission_controller
+    if controller is None:
+        return 0
+
+    cost = controller.get_cost(request)
+    return cost if controller.admit(cost, executor) else None
+
+
+def release(cost):
+    if cost:
+        _settings.admission_controller.release(cost)
+
+
+def release_after(resp, cost):
+    '''
+        Releases the cost of a batch once its response is done with, after the whole
+        content of a streamed response.
+    '''
+    if not cost or not resp.streaming:
+        release(cost)
+        return resp
+
+    resp.streaming_content = ReleasingIterator(resp.streaming_content, lambda: release(cost))
+    return resp
+
+
+def admission_control(view):
+    '''
+        Turns batches away from the view when the process is overloaded, see
+        AdmissionController.
+    '''
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        cost = admit(request, _settings.executor)
+        if cost is None:
+            return get_rejected_response()
+
+        try:
+            resp = view(request, *args, **kwargs)
+        except BaseException:
+            release(cost)
+            raise
+        return release_after(resp, cost)
+
+    return wrapper
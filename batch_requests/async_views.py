@@ -0,0 +1,233 @@
+'''
+@summary: An async variant of the batch view, for ASGI deployments. Requires Python 3
+          and Django 3.1+.
+'''
+from __future__ import absolute_import, unicode_literals
+
+import asyncio
+
+from django.http.response import (
+    HttpResponseBadRequest,
+    HttpResponseNotAllowed,
+    HttpResponseNotFound,
+    HttpResponseServerError,
+)
+from django.urls.exceptions import Resolver404
+
+from batch_requests.admission import admit, get_rejected_response, release
+from batch_requests.bulk import BulkGroup, fan_out_groups
+from batch_requests.concurrent.async_executor import AsyncExecutor, wait_for_slot
+from batch_requests.dependencies import DependencyGraph, has_dependencies
+from batch_requests.exceptions import BadBatchRequest
+from batch_requests.instrumentation import Timings, finish_sub_request, mark_queued, start_sub_request
+from batch_requests.loaders import create_batch_context
+from batch_requests.queries import counting_queries, create_query_counter
+from batch_requests.routers import create_batch_routing, routing_queries
+from batch_requests.settings import br_settings as _settings
+from batch_requests.dedup import fan_out_list, in_order
+from batch_requests.views import (
+    build_sub_response,
+    cache_response,
+    construct_wsgi_from_data,
+    get_bulk_responses,
+    get_bulkhead,
+    get_bulkhead_timeout,
+    get_cached_response,
+    get_requests_data,
+    get_resolver_match,
+    get_timeout_response,
+    get_too_many_requests_response,
+    get_unique_requests,
+    get_view_response,
+    group_bulk_requests,
+    mark_deadlines,
+    prepare_layer,
+    respond,
+)
+
+
+executor = AsyncExecutor(
+    _settings.NUM_WORKERS, _settings.REQUEST_TIMEOUT, batch_timeout=_settings.BATCH_TIMEOUT
+)
+
+
+async def get_response_async(wsgi_request, run_sync):
+    '''
+        Given a WSGI request, awaits the corresponding view if it is async, otherwise
+        runs it in a thread, and returns the response. Cache lookups and serialisation
+        are sync, they run in a thread too.
+    '''
+    timings = start_sub_request(wsgi_request)
+    d_resp = None
+    if _settings.response_cache is not None:
+        d_resp = await run_sync(get_cached_response, wsgi_request, timings)
+    if d_resp is None:
+        semaphore = get_bulkhead(wsgi_request)
+        admitted = semaphore is None or await acquire_async(semaphore, timings, get_bulkhead_timeout(wsgi_request))
+        try:
+            if admitted:
+                resp = await get_view_response_async(wsgi_request, run_sync, timings)
+            else:
+                resp = get_too_many_requests_response()
+        finally:
+            if semaphore is not None and admitted:
+                semaphore.release()
+        d_resp = await run_sync(serialise_response, wsgi_request, resp, timings)
+
+    finish_sub_request(wsgi_request, d_resp, timings)
+    return d_resp
+
+
+def serialise_response(wsgi_request, resp, timings):
+    '''Returns the sub-response for the HTTP response, and caches it.'''
+    with timings.measure("serialise"):
+        d_resp = build_sub_response(resp, timings)
+    cache_response(wsgi_request, resp, d_resp)
+    return d_resp
+
+
+async def acquire_async(semaphore, timings, timeout):
+    '''
+        Acquires a slot of the bulkhead without blocking the event loop, waiting at
+        most timeout seconds, None for as long as it takes.
+    '''
+    with timings.measure("bulkhead"):
+        return await wait_for_slot(semaphore, timeout)
+
+
+async def get_view_response_async(wsgi_request, run_sync, timings):
+    '''
+        Awaits the view of the request if it is async, otherwise runs it in a thread,
+        and returns its HTTP response.
+    '''
+    # Queries are made from the threads sync code runs in, they are counted and routed there.
+    counter = create_query_counter([wsgi_request])
+
+    def in_thread(func):
+        return routing_queries(counting_queries(func, counter), [wsgi_request])
+
+    if getattr(wsgi_request, "batch_middleware", None) is not None:
+        # Middleware are sync, the whole stack runs in a thread.
+        return await run_sync(in_thread(get_view_response), wsgi_request, timings)
+
+    # Get the view / handler for this request
+    try:
+        with timings.measure("resolve"):
+            view, args, kwargs = get_resolver_match(wsgi_request)
+    except Resolver404:
+        return HttpResponseNotFound()
+
+    kwargs = dict(kwargs, request=wsgi_request)
+
+    try:
+        with timings.measure("view"):
+            if asyncio.iscoroutinefunction(view):
+                return await view(*args, **kwargs)
+
+            resp = await run_sync(in_thread(view), *args, **kwargs)
+            # Sync wrappers around async views hand back a coroutine.
+            if asyncio.iscoroutine(resp):
+                resp = await resp
+            return resp
+    except Exception as exc:
+        return HttpResponseServerError(content=str(exc))
+
+
+async def get_unit_response_async(unit, run_sync):
+    '''
+        Returns the sub-response of a request, or the list of those of a BulkGroup.
+        Bulk handlers are sync, they run in a thread.
+    '''
+    if isinstance(unit, BulkGroup):
+        return await run_sync(get_bulk_responses, unit)
+    return await get_response_async(unit, run_sync)
+
+
+async def execute_requests_async(wsgi_requests, start=None):
+    loop = asyncio.get_event_loop()
+    start = loop.time() if start is None else start
+    mark_queued(wsgi_requests)
+    mark_deadlines(wsgi_requests, executor, start, loop.time)
+    units, positions = group_bulk_requests(wsgi_requests, executor)
+    if positions is None:
+        return await executor.execute(
+            wsgi_requests, get_response_async, on_timeout=get_timeout_response, start=start
+        )
+
+    results = await executor.execute(
+        units, get_unit_response_async, on_timeout=get_timeout_response, start=start
+    )
+    return [result for _, result in in_order(fan_out_groups(enumerate(results), positions))]
+
+
+async def execute_dependent_requests_async(request, graph):
+    '''
+        Execute the requests layer by layer, following the dependency graph, the
+        deadlines of all counting from the start of the first layer.
+    '''
+    start = asyncio.get_event_loop().time()
+    responses = [None] * len(graph.requests)
+    for layer in graph.layers:
+        runnable = prepare_layer(request, graph, layer, responses)
+        results = await execute_requests_async([wsgi_request for _, wsgi_request in runnable], start)
+        for (index, _), result in zip(runnable, results):
+            responses[index] = result
+
+    return responses
+
+
+async def async_handle_batch_requests(request, *args, **kwargs):
+    '''
+        An async variant of handle_batch_requests. Async sub-views run concurrently in
+        the event loop without using any thread.
+    '''
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+
+    cost = admit(request, executor)
+    if cost is None:
+        return get_rejected_response()
+
+    try:
+        return await handle_admitted_batch_async(request)
+    finally:
+        release(cost)
+
+
+async def handle_admitted_batch_async(request):
+    '''
+        Runs the batch request once admitted, and returns the batch response.
+    '''
+    timings = Timings()
+    request.batch_context = create_batch_context()
+    request.batch_routing = create_batch_routing()
+    try:
+        with timings.measure("parse"):
+            requests_data = get_requests_data(request)
+            graph = DependencyGraph(requests_data) if has_dependencies(requests_data) else None
+    except BadBatchRequest as brx:
+        return HttpResponseBadRequest(content=str(brx))
+
+    if graph is not None:
+        with timings.measure("execute"):
+            response = await execute_dependent_requests_async(request, graph)
+        return await respond_async(request, response, timings)
+
+    # Get the Individual WSGI requests.
+    with timings.measure("construct"):
+        unique_data, positions = get_unique_requests(requests_data)
+        wsgi_requests = [construct_wsgi_from_data(request, data) for data in unique_data]
+
+    with timings.measure("execute"):
+        response = fan_out_list(await execute_requests_async(wsgi_requests), positions)
+
+    return await respond_async(request, response, timings, positions)
+
+
+async def respond_async(request, response, timings, positions=None):
+    '''Encodes and compresses the batch response in a thread, off the event loop.'''
+    return await executor.get_sync_runner()(respond, request, response, timings, positions)
+
+
+# csrf_exempt would wrap the view in a sync function, hiding that it is a coroutine from Django.
+async_handle_batch_requests.csrf_exempt = True
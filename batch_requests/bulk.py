@@ -0,0 +1,92 @@
+'''
+@summary: The bulk view protocol. A view may declare a bulk handler answering many
+          sub-requests in one call, e.g. to fetch all the objects they ask for with a
+          single query. Sub-requests of a batch going to such a view are grouped and
+          handed to its bulk handler at once.
+'''
+from __future__ import absolute_import, unicode_literals
+
+from collections import namedtuple
+
+
+class BulkCall(namedtuple("BulkCall", ["request", "args", "kwargs"])):
+    '''
+        A sub-request for a bulk handler, with the arguments its view would be called
+        with (kwargs do not include the request).
+    '''
+    __slots__ = ()
+
+
+def bulk_handler(handler):
+    '''
+        Declares the bulk handler of the decorated view function:
+
+            def get_items(calls):
+                ids = [call.kwargs["pk"] for call in calls]
+                items = Item.objects.in_bulk(ids)
+                return [JsonResponse(items[pk].as_dict()) for pk in ids]
+
+            @bulk_handler(get_items)
+            def item_view(request, pk):
+                ...
+
+        The handler is called with a list of BulkCall and returns the list of their
+        responses, in the same order. It may answer None for any call it does not
+        handle, the view is called for it instead. Class based views (and Django REST
+        framework views) declare theirs as a `bulk_handler` classmethod.
+    '''
+    def decorator(view):
+        view.bulk_handler = handler
+        return view
+
+    return decorator
+
+
+def get_bulk_handler(view):
+    '''
+        Returns the bulk handler of the view function or of its class, None if it
+        has none.
+    '''
+    handler = getattr(view, "bulk_handler", None)
+    if handler is not None:
+        return handler
+
+    # as_view() keeps the class as view_class, or as cls for REST framework.
+    view_class = getattr(view, "view_class", None) or getattr(view, "cls", None)
+    return getattr(view_class, "bulk_handler", None)
+
+
+class BulkGroup(object):
+    '''
+        The sub-requests of a batch handed to the same bulk handler. The group may
+        take as long as the most pressed of them.
+    '''
+
+    def __init__(self, handler, view, calls):
+        self.handler = handler
+        self.view = view
+        self.calls = calls
+
+        timeouts = [
+            call.request.batch_timeout for call in calls
+            if getattr(call.request, "batch_timeout", None) is not None
+        ]
+        self.batch_timeout = min(timeouts) if timeouts else None
+
+    @property
+    def requests(self):
+        return [call.request for call in self.calls]
+
+
+def fan_out_groups(results, positions):
+    '''
+        Given (unit index, result) pairs, yields (index, result) for every request of
+        the unit, a group getting a list of results or a single one for all, e.g. when
+        it timed out.
+    '''
+    for unit_index, result in results:
+        indexes = positions[unit_index]
+        if not isinstance(result, list):
+            result = [result] * len(indexes)
+        for index, member_result in zip(indexes, result):
+            yield index, member_result
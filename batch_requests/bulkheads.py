@@ -0,0 +1,56 @@
+'''
+@summary: Bounds the number of sub-requests running at the same time against a route,
+          across all the batches served by the process, so that batches cannot use up
+          all the capacity of an expensive endpoint.
+'''
+from __future__ import absolute_import, unicode_literals
+
+import os
+import weakref
+
+import six
+
+from batch_requests.concurrent.slots import Slots
+
+
+# All the bulkheads alive in this process, so that they can be reset after a fork.
+_bulkheads = weakref.WeakSet()
+
+
+class Bulkheads(object):
+    '''
+        Slots per limited route, which sync and async views can both wait on. `limits` maps routes to the number of
+        sub-requests which may run at the same time against them, a route being
+        either the dotted path of a view, the name of a URL pattern (with its
+        namespace, if any) or a URL pattern as written in the URLconf.
+    '''
+
+    def __init__(self, limits):
+        self.limits = dict(limits)
+        self.reset()
+        _bulkheads.add(self)
+
+    def reset(self):
+        self.semaphores = {
+            route: Slots(limit) for route, limit in six.iteritems(self.limits)
+        }
+
+    def get_route(self, match):
+        '''Returns the limited route the ResolverMatch belongs to, None if not limited.'''
+        for route in (match._func_path, match.view_name, getattr(match, "route", None)):
+            if route in self.semaphores:
+                return route
+        return None
+
+    def get_semaphore(self, match):
+        return self.semaphores.get(self.get_route(match), None)
+
+
+def _reset_bulkheads_after_fork():
+    # Slots held by the threads of the parent would never be released in the child.
+    for bulkheads in list(_bulkheads):
+        bulkheads.reset()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_bulkheads_after_fork)
@@ -0,0 +1,206 @@
+'''
+@summary: A cache for the responses of safe (GET, HEAD) sub-requests, shared by the
+          batches served by a process and optionally backed by a Django cache.
+'''
+from __future__ import absolute_import, unicode_literals
+
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+
+import six
+
+from batch_requests.concurrent.executor import monotonic
+
+
+SAFE_METHODS = {"GET", "HEAD"}
+CACHEABLE_STATUSES = {200, 203}
+MAX_AGE_RE = re.compile(r"(?:^|,)\s*(s-maxage|max-age)\s*=\s*(\d+)")
+UNCACHEABLE_DIRECTIVES_RE = re.compile(r"(?:^|,)\s*(no-store|no-cache|private)\b")
+
+# Headers that are not prefixed by HTTP_ in the WSGI environ.
+UNPREFIXED_HEADERS = {"CONTENT_TYPE", "CONTENT_LENGTH"}
+
+
+def header_to_meta(header):
+    header = header.strip().replace("-", "_").upper()
+    if header not in UNPREFIXED_HEADERS:
+        header = "HTTP_{header}".format(header=header)
+    return header
+
+
+def get_response_timeout(resp, default_timeout):
+    '''
+        Returns the number of seconds the response may be cached for according to its
+        Cache-Control header, or the default timeout if it has none. 0 if the response
+        may not be cached at all.
+    '''
+    if resp.status_code not in CACHEABLE_STATUSES:
+        return 0
+
+    if resp.has_header("Vary") and resp["Vary"].strip() == "*":
+        return 0
+
+    cache_control = resp["Cache-Control"].lower() if resp.has_header("Cache-Control") else ""
+    if UNCACHEABLE_DIRECTIVES_RE.search(cache_control):
+        return 0
+
+    max_ages = dict(MAX_AGE_RE.findall(cache_control))
+    max_age = max_ages.get("s-maxage", max_ages.get("max-age", None))
+    if max_age is not None:
+        return int(max_age)
+
+    return default_timeout or 0
+
+
+class LRUCache(object):
+    '''
+        A thread safe, bounded, in-process store with an optional time to live for
+        every entry.
+    '''
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key, None)
+            if entry is None:
+                return default
+
+            value, expires = entry
+            if expires is not None and expires <= monotonic():
+                del self._entries[key]
+                return default
+
+            # Most recently used entries go last, evicted last.
+            del self._entries[key]
+            self._entries[key] = entry
+            return value
+
+    def set(self, key, value, timeout=None):
+        '''Stores the value for timeout seconds, forever if None.'''
+        expires = None if timeout is None else monotonic() + timeout
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (value, expires)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class ResponseCache(object):
+    '''
+        Caches the sub-responses of safe requests, keyed on the method, path, query
+        string, the configured `vary_headers` (as in request.META) and the headers
+        listed in the Vary header of the response. Looks in the in-process LRU first,
+        then in the Django cache named `backend`, if any.
+    '''
+
+    def __init__(self, max_entries=1000, timeout=60, vary_headers=(), backend=None):
+        self.timeout = timeout
+        self.vary_headers = tuple(sorted(vary_headers))
+        self.backend = backend
+        self.local = LRUCache(max_entries)
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def get_backend(self):
+        if self.backend is None:
+            return None
+
+        from django.core.cache import caches
+        return caches[self.backend]
+
+    def get_base_key(self, wsgi_request):
+        return (
+            wsgi_request.method,
+            wsgi_request.path_info,
+            wsgi_request.META.get("QUERY_STRING", ""),
+        )
+
+    def get_key(self, base_key, wsgi_request, headers):
+        values = tuple(wsgi_request.META.get(h, None) for h in headers)
+        digest = hashlib.md5(repr(base_key + headers + values).encode("utf-8")).hexdigest()
+        return "batch_requests.response.%s" % digest
+
+    def get_vary_key(self, base_key):
+        digest = hashlib.md5(repr(base_key).encode("utf-8")).hexdigest()
+        return "batch_requests.vary.%s" % digest
+
+    def _lookup(self, key):
+        value = self.local.get(key)
+        if value is None:
+            backend = self.get_backend()
+            if backend is not None:
+                value = backend.get(key)
+        return value
+
+    def _store(self, key, value, timeout):
+        self.local.set(key, value, timeout)
+        backend = self.get_backend()
+        if backend is not None:
+            backend.set(key, value, timeout)
+
+    def get(self, wsgi_request):
+        '''
+            Returns a copy of the cached sub-response for the request, or None.
+        '''
+        if wsgi_request.method not in SAFE_METHODS:
+            return None
+
+        base_key = self.get_base_key(wsgi_request)
+        headers = self._lookup(self.get_vary_key(base_key))
+        cached = None
+        if headers is not None:
+            cached = self._lookup(self.get_key(base_key, wsgi_request, headers))
+
+        with self._stats_lock:
+            if cached is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        if cached is None:
+            return None
+        return dict(cached, headers=dict(cached["headers"]))
+
+    def set(self, wsgi_request, resp, d_resp, exclude_headers=()):
+        '''
+            Caches the sub-response d_resp built from the view response resp, if the
+            request is safe and the response allows it.
+        '''
+        if wsgi_request.method not in SAFE_METHODS:
+            return
+
+        timeout = get_response_timeout(resp, self.timeout)
+        if timeout <= 0:
+            return
+
+        vary = resp["Vary"].split(",") if resp.has_header("Vary") else []
+        headers = tuple(sorted(set(self.vary_headers) | {header_to_meta(h) for h in vary if h.strip()}))
+
+        base_key = self.get_base_key(wsgi_request)
+        headers_to_cache = {
+            k: v for k, v in six.iteritems(d_resp["headers"]) if k not in exclude_headers
+        }
+        self._store(self.get_vary_key(base_key), headers, timeout)
+        self._store(self.get_key(base_key, wsgi_request, headers), dict(d_resp, headers=headers_to_cache), timeout)
+
+    def clear(self):
+        self.local.clear()
+        with self._stats_lock:
+            self.hits = self.misses = 0
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self.local)}
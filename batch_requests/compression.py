@@ -0,0 +1,114 @@
+'''
+@summary: Compression of batch responses, negotiated with the Accept-Encoding header.
+          Streamed responses are compressed incrementally, flushing after every
+          sub-response so that clients may decode it as soon as it arrives.
+'''
+from __future__ import absolute_import, unicode_literals
+
+import six
+from django.utils.cache import patch_vary_headers
+
+from batch_requests.compressors import COMPRESSORS, is_available
+from batch_requests.settings import br_settings as _settings
+
+
+def parse_accept_encoding(header):
+    '''Returns the {encoding: quality} accepted according to an Accept-Encoding header.'''
+    accepted = {}
+    for item in header.split(","):
+        parts = item.strip().split(";")
+        encoding = parts[0].strip().lower()
+        if not encoding:
+            continue
+
+        quality = 1.0
+        for param in parts[1:]:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[encoding] = quality
+
+    return accepted
+
+
+def get_compressor_class(request):
+    '''
+        Returns the class of the enabled compressor the client prefers, ties going to
+        the first one in the COMPRESSION setting, whose encodings were checked when
+        the settings loaded. Encodings whose library is not installed are skipped.
+        None if the client accepts none.
+    '''
+    accepted = parse_accept_encoding(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+    best, best_quality = None, 0
+    for encoding in _settings.COMPRESSION:
+        if not is_available(COMPRESSORS[encoding]):
+            continue
+
+        quality = accepted.get(encoding, accepted.get("*", 0))
+        if quality > best_quality:
+            best, best_quality = COMPRESSORS[encoding], quality
+
+    return best
+
+
+def get_compressor(compressor_class):
+    level = _settings.COMPRESSION_LEVEL
+    if isinstance(level, dict):
+        level = level.get(compressor_class.encoding, None)
+    return compressor_class(level)
+
+
+def compress_stream(chunks, compressor):
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+def get_precompressed_size(responses):
+    '''
+        Returns the size of the sub-response bodies the sub-views compressed themselves,
+        which compress poorly, if at all.
+    '''
+    return sum(
+        len(d_resp["body"]) for d_resp in responses
+        if d_resp and d_resp["headers"].get("Content-Encoding", None) and
+        isinstance(d_resp["body"], (six.binary_type, six.text_type))
+    )
+
+
+def compress_batch_response(request, resp, responses=None):
+    '''
+        Compresses the batch response in the encoding negotiated with the client, if
+        compression is enabled. Buffered responses are left alone when smaller than
+        COMPRESSION_MIN_SIZE, not counting the sub-response bodies already compressed.
+        Once the rest is large enough, the whole response is compressed, those bodies
+        included: they are part of one stream.
+    '''
+    if not _settings.COMPRESSION or resp.has_header("Content-Encoding"):
+        return resp
+
+    if not resp.streaming:
+        size = len(resp.content) - get_precompressed_size(responses or [])
+        if size < _settings.COMPRESSION_MIN_SIZE:
+            return resp
+
+    patch_vary_headers(resp, ("Accept-Encoding",))
+    compressor_class = get_compressor_class(request)
+    if compressor_class is None:
+        return resp
+
+    compressor = get_compressor(compressor_class)
+    if resp.streaming:
+        resp.streaming_content = compress_stream(resp.streaming_content, compressor)
+    else:
+        resp.content = compressor.compress(resp.content) + compressor.finish()
+        if resp.has_header("Content-Length"):
+            resp["Content-Length"] = str(len(resp.content))
+
+    resp["Content-Encoding"] = compressor_class.encoding
+    return resp
@@ -0,0 +1,137 @@
+'''
+@summary: The compressors batch responses can be compressed with, by encoding. Loaded
+          along with the settings, which check the COMPRESSION encodings are known.
+          Encodings whose library is not installed are left out of the negotiation.
+'''
+from __future__ import absolute_import, unicode_literals
+
+import logging
+import zlib
+from abc import ABCMeta, abstractmethod
+from importlib import import_module
+
+import six
+from django.core.exceptions import ImproperlyConfigured
+
+from batch_requests.json_codecs import import_library
+
+log = logging.getLogger(__name__)
+
+# Whether the libraries of the compressors are installed, by library name.
+_available = {}
+
+
+@six.add_metaclass(ABCMeta)
+class Compressor(object):
+    '''
+        Compresses one response, with `compress`, `flush` to emit everything compressed
+        so far, and `finish` to end the stream.
+    '''
+    encoding = None
+    default_level = None
+    # The library the compressor needs, None if it only needs the standard library.
+    library = None
+
+    @abstractmethod
+    def compress(self, data):
+        '''Returns the compressed bytes ready so far, possibly none.'''
+
+    @abstractmethod
+    def flush(self):
+        '''Returns the rest of what was compressed so far.'''
+
+    @abstractmethod
+    def finish(self):
+        '''Returns the end of the compressed stream.'''
+
+
+class GzipCompressor(Compressor):
+    encoding = "gzip"
+    default_level = 6
+
+    def __init__(self, level=None):
+        level = self.default_level if level is None else level
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class BrotliCompressor(Compressor):
+    encoding = "br"
+    default_level = 5
+    library = "brotli"
+
+    def __init__(self, level=None):
+        brotli = import_library(self.library, "COMPRESSION")
+        level = self.default_level if level is None else level
+        self._compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class ZstdCompressor(Compressor):
+    encoding = "zstd"
+    default_level = 3
+    library = "zstandard"
+
+    def __init__(self, level=None):
+        self.zstandard = import_library(self.library, "COMPRESSION")
+        level = self.default_level if level is None else level
+        self._compressor = self.zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(self.zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self._compressor.flush(self.zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+
+COMPRESSORS = {c.encoding: c for c in (GzipCompressor, BrotliCompressor, ZstdCompressor)}
+
+
+def is_available(compressor_class):
+    '''Returns whether the library the compressor needs is installed, looked for once.'''
+    library = compressor_class.library
+    if library is None:
+        return True
+
+    if library not in _available:
+        try:
+            import_module(library)
+        except ImportError:
+            _available[library] = False
+        else:
+            _available[library] = True
+    return _available[library]
+
+
+def check_encodings(encodings):
+    '''
+        Raises ImproperlyConfigured if any of the encodings has no compressor, warns
+        about those whose library is not installed.
+    '''
+    for encoding in encodings:
+        if encoding not in COMPRESSORS:
+            raise ImproperlyConfigured("Unknown COMPRESSION encoding '%s'." % encoding)
+        if not is_available(COMPRESSORS[encoding]):
+            log.warning(
+                "COMPRESSION encoding '%s' needs the '%s' library, which is not installed.",
+                encoding, COMPRESSORS[encoding].library,
+            )
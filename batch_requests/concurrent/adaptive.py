@@ -0,0 +1,189 @@
+'''
+@summary: An executor deciding, batch by batch, which sub-requests are worth handing to
+          the thread pool and which are cheaper to run inline, from the latency each
+          route had so far and how busy the pool is.
+'''
+from __future__ import absolute_import, unicode_literals
+
+import logging
+import threading
+
+from django.urls.exceptions import Resolver404
+
+from batch_requests.cache import LRUCache
+from batch_requests.concurrent.executor import (
+    SequentialPoolExecutor,
+    ThreadBasedExecutor,
+    default_result_handler,
+    monotonic,
+    pop_start,
+)
+from batch_requests.resolver import ResolverCache
+
+
+log = logging.getLogger(__name__)
+
+
+class RouteLatencies(object):
+    '''
+        The exponentially weighted moving average of the latency of the `max_routes`
+        most recently seen routes, in seconds. `alpha` is the weight of the latest
+        latency.
+    '''
+
+    def __init__(self, alpha=0.2, max_routes=1000):
+        self.alpha = alpha
+        self.averages = LRUCache(max_routes)
+        self._lock = threading.Lock()
+
+    def get(self, route):
+        '''Returns the average latency of the route, None if it was never measured.'''
+        return self.averages.get(route)
+
+    def update(self, route, latency):
+        with self._lock:
+            average = self.averages.get(route)
+            if average is not None:
+                latency = average + self.alpha * (latency - average)
+            self.averages.set(route, latency)
+
+
+class AdaptiveExecutor(ThreadBasedExecutor):
+    '''
+        A thread based executor only sending to the pool the sub-requests expected to
+        take at least `inline_latency` seconds. The cheaper ones run inline, in the
+        thread handling the batch, while the pool works on the others.
+
+        Everything runs inline for batches of less than `min_parallel_size` requests,
+        and when the pool already has `max_saturation` times `num_workers` requests
+        in flight, since they would only wait in its queue. Requests to routes never
+        measured are sent to the pool until their latency is known.
+
+        The latency of a route is tracked per resolved view, as an exponentially
+        weighted moving average with weight `alpha` (see RouteLatencies). Decisions
+        are logged at DEBUG level to the "batch_requests.concurrent.adaptive" logger.
+    '''
+
+    def __init__(self, num_workers, timeout=None, queue_size=None, batch_timeout=None,
+                 inline_latency=0.001, min_parallel_size=2, max_saturation=1.0,
+                 alpha=0.2, max_routes=1000, manage_connections=True, max_connections=None,
+                 queue_timeout=10):
+        super(AdaptiveExecutor, self).__init__(
+            num_workers, timeout, queue_size=queue_size, batch_timeout=batch_timeout,
+            manage_connections=manage_connections, max_connections=max_connections,
+            queue_timeout=queue_timeout
+        )
+        self.inline_latency = inline_latency
+        self.min_parallel_size = min_parallel_size
+        self.max_saturation = max_saturation
+        self.latencies = RouteLatencies(alpha, max_routes)
+        self.resolver = ResolverCache(max_routes)
+        self._inline_pool = SequentialPoolExecutor()
+
+    def get_route(self, request):
+        '''
+            Returns the dotted path of the view the request goes to, None if unknown.
+        '''
+        path = getattr(request, "path_info", None)
+        if path is None:
+            return None
+
+        try:
+            return self.resolver.resolve(path)._func_path
+        except Resolver404:
+            return None
+
+    def get_saturation(self):
+        '''The number of requests in the pool, queued or running, per worker.'''
+        return float(self.get_queue_depth()) / self.num_workers
+
+    def submit(self, pool, fn, *args, **kwargs):
+        if pool is self._inline_pool:
+            kwargs.pop("queue_timeout", None)
+            return pool.submit(fn, *args, **kwargs)
+        return super(AdaptiveExecutor, self).submit(pool, fn, *args, **kwargs)
+
+    def plan(self, requests):
+        '''
+            Returns the routes of the requests, and for each of them whether it should
+            run in the pool.
+        '''
+        routes = [self.get_route(r) for r in requests]
+
+        if len(requests) < self.min_parallel_size:
+            reason, in_pool = "small batch", [False] * len(requests)
+        elif self.get_saturation() >= self.max_saturation:
+            reason, in_pool = "pool saturated", [False] * len(requests)
+        else:
+            latencies = [self.latencies.get(route) for route in routes]
+            reason = "route latencies"
+            in_pool = [
+                route is None or latency is None or latency >= self.inline_latency
+                for route, latency in zip(routes, latencies)
+            ]
+
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug(
+                "Running %d of %d requests in the pool (%s, saturation %.2f): %s",
+                sum(in_pool), len(requests), reason, self.get_saturation(),
+                ", ".join(
+                    "%s=%s" % (route, "pool" if p else "inline") for route, p in zip(routes, in_pool)
+                ),
+            )
+
+        return routes, in_pool
+
+    def timed(self, route, resp_generator):
+        '''Wraps the resp_generator to measure the latency of the route.'''
+        if route is None:
+            return resp_generator
+
+        def run(request, *args, **kwargs):
+            start = monotonic()
+            try:
+                return resp_generator(request, *args, **kwargs)
+            finally:
+                self.latencies.update(route, monotonic() - start)
+
+        return run
+
+    def submit_planned(self, requests, plan, resp_generator, *args, **kwargs):
+        '''
+            Submits the requests as planned, returns a list of (future, deadline). The
+            requests for the pool are submitted first, so that it works on them while
+            the others run inline.
+        '''
+        start = pop_start(kwargs)
+        routes, in_pool = plan
+        pool = self.get_executor_pool() if any(in_pool) else None
+        jobs = [None] * len(requests)
+        for use_pool in (True, False):
+            for index, request in enumerate(requests):
+                if in_pool[index] is use_pool:
+                    jobs[index] = self.submit_request(
+                        pool if use_pool else self._inline_pool, start, request,
+                        self.timed(routes[index], resp_generator), *args, **kwargs
+                    )
+        return jobs
+
+    def submit_all(self, requests, resp_generator, *args, **kwargs):
+        return self.submit_planned(requests, self.plan(requests), resp_generator, *args, **kwargs)
+
+    def iter_inline(self, requests, routes, resp_generator, result_handler, start=None):
+        '''Runs every request only once the iteration gets to it, like SequentialExecutor.'''
+        start = monotonic() if start is None else start
+        for index, (request, route) in enumerate(zip(requests, routes)):
+            job = self.submit_request(self._inline_pool, start, request, self.timed(route, resp_generator))
+            yield index, self._handle_job(job, result_handler)
+
+    def iter_execute(self, requests, resp_generator,
+                     result_handler=default_result_handler, in_order=True, start=None):
+        plan = self.plan(requests)
+        routes, in_pool = plan
+        if not any(in_pool):
+            return self.iter_inline(requests, routes, resp_generator, result_handler, start)
+
+        jobs = self.submit_planned(requests, plan, resp_generator, start=start)
+        if in_order:
+            return self.iter_in_order(jobs, result_handler)
+        return self.iter_as_completed(jobs, result_handler)
@@ -0,0 +1,157 @@
+'''
+@summary: An executor running the requests as asyncio tasks, for async views. Requires
+          Python 3 and asgiref (shipped with Django 3.0+).
+'''
+from __future__ import absolute_import, unicode_literals
+
+import asyncio
+import os
+import threading
+
+from asgiref.sync import sync_to_async
+
+from batch_requests.concurrent.executor import DeadlineMixin
+from batch_requests.concurrent.slots import Slots
+
+
+async def wait_for_slot(slots, timeout=None):
+    '''
+        Acquires one of the Slots without blocking the event loop, waiting to be woken
+        by a release for at most timeout seconds, None for as long as it takes. Returns
+        whether it was acquired.
+    '''
+    loop = asyncio.get_event_loop()
+    deadline = None if timeout is None else loop.time() + timeout
+    while not slots.acquire(False):
+        waiter = loop.create_future()
+        slots.add_waiter(loop, waiter)
+        try:
+            # A slot released before the waiter was added woke no one.
+            if slots.acquire(False):
+                slots.discard_waiter(loop, waiter)
+                return True
+            remaining = None if deadline is None else max(deadline - loop.time(), 0)
+            await asyncio.wait_for(waiter, remaining)
+        except asyncio.TimeoutError:
+            slots.discard_waiter(loop, waiter)
+            return False
+        except BaseException:
+            slots.discard_waiter(loop, waiter)
+            raise
+    return True
+
+
+class SlotHolder(object):
+    '''
+        Hands the slot of a sync call over to the thread running it, which frees it once
+        the call is done. The slot of a call cancelled before its thread started is
+        freed right away instead, and the call never runs.
+    '''
+
+    def __init__(self, slots):
+        self.slots = slots
+        self._claimed = False
+        self._lock = threading.Lock()
+
+    def claim(self):
+        '''Returns whether the caller is the first to claim the slot.'''
+        with self._lock:
+            claimed, self._claimed = self._claimed, True
+        return not claimed
+
+    def run(self, fn, *args, **kwargs):
+        if not self.claim():
+            return None
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self.slots.release()
+
+    def release_unstarted(self):
+        if self.claim():
+            self.slots.release()
+
+
+class AsyncExecutor(DeadlineMixin):
+    '''
+        An implementation of executor using asyncio tasks for concurrency. Async views
+        are awaited right in the event loop, sync views are run in threads with at most
+        `num_workers` of them running at a time, across all the batches of the process.
+    '''
+
+    def __init__(self, num_workers, timeout=None, queue_size=None, batch_timeout=None):
+        if queue_size is not None:
+            raise ValueError("AsyncExecutor has no queue_size, sync calls wait for a thread in the event loop.")
+        self.num_workers = num_workers
+        self.timeout = timeout
+        self.batch_timeout = batch_timeout
+        self._slots = None
+        self._slots_pid = None
+
+    def get_slots(self):
+        '''
+            Returns the Slots of the threads running sync code, shared by the batches of
+            the process whatever event loop they run in. Created again in a forked
+            child, where the threads of the parent never release theirs.
+        '''
+        if self._slots_pid != os.getpid():
+            self._slots = Slots(self.num_workers)
+            self._slots_pid = os.getpid()
+        return self._slots
+
+    def get_sync_runner(self):
+        '''
+            Returns a coroutine function running a sync function in a thread, once one of
+            the `num_workers` slots is free. Threads cannot be interrupted: a call
+            cancelled once its thread started, e.g. past its deadline, holds its slot
+            until it returns.
+        '''
+        slots = self.get_slots()
+
+        async def run_sync(fn, *args, **kwargs):
+            await wait_for_slot(slots)
+            holder = SlotHolder(slots)
+            try:
+                return await sync_to_async(holder.run, thread_sensitive=False)(fn, *args, **kwargs)
+            finally:
+                holder.release_unstarted()
+
+        return run_sync
+
+    async def run_request(self, request, resp_generator, run_sync, start, on_timeout):
+        deadline = self.get_deadline(request, start)
+        if deadline is None:
+            return await resp_generator(request, run_sync)
+
+        timeout = max(deadline - asyncio.get_event_loop().time(), 0)
+        try:
+            return await asyncio.wait_for(resp_generator(request, run_sync), timeout)
+        except asyncio.TimeoutError:
+            if on_timeout is None:
+                raise
+            return on_timeout()
+
+    async def execute(self, requests, resp_generator, on_timeout=None, start=None):
+        '''
+            Awaits the resp_generator coroutine for all the requests concurrently and
+            returns the list of results. resp_generator is called with the request and a
+            coroutine function to run sync code in a thread.
+
+            A request still running once its deadline passes is cancelled and its result
+            is `on_timeout()`. Deadlines count from `start`, on the clock of the loop,
+            now by default. Cancelling the batch cancels all its requests.
+        '''
+        if start is None:
+            start = asyncio.get_event_loop().time()
+        run_sync = self.get_sync_runner()
+        tasks = [
+            asyncio.ensure_future(self.run_request(r, resp_generator, run_sync, start, on_timeout))
+            for r in requests
+        ]
+
+        try:
+            return await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
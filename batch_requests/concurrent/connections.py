@@ -0,0 +1,111 @@
+'''
+@summary: Lifecycle of the database connections of the threads of a pool. Django keeps a
+          connection per thread, and closes the old ones of a thread when a request
+          starts and finishes, which never happens on the threads of a pool. Sub-requests
+          run there the same way instead, so that CONN_MAX_AGE is honoured, broken
+          connections are dropped and persistent ones are reused from batch to batch.
+'''
+from __future__ import absolute_import, unicode_literals
+
+import threading
+from collections import OrderedDict
+
+import six
+from django.db import close_old_connections, connections
+
+
+def get_open_connections():
+    '''Returns the database connections of the current thread which are open.'''
+    return [conn for conn in connections.all() if conn.connection is not None]
+
+
+def close_connections(conns):
+    '''
+        Closes connections of another thread, which must not be using them meanwhile.
+    '''
+    for conn in conns:
+        conn.inc_thread_sharing()
+        try:
+            conn.close()
+        finally:
+            conn.dec_thread_sharing()
+
+
+class WorkerConnections(object):
+    '''
+        Keeps track of the threads of a pool holding open database connections, at
+        most `max_connections` of them (None for no limit).
+
+        A thread holds a slot while it runs a sub-request, and keeps it while idle as
+        long as it has connections open. A thread needing a slot when none is free
+        closes the connections of the thread idle for the longest and takes its slot,
+        or waits for a running one to finish. `max_connections` hence also bounds the
+        sub-requests running at once on the pool.
+    '''
+
+    def __init__(self, max_connections=None):
+        self.max_connections = max_connections
+        self._condition = threading.Condition()
+        # The open connections of the holders by thread, None while they run, the
+        # longest idle first.
+        self._holders = OrderedDict()
+
+    def acquire(self):
+        '''Takes a slot for the current thread, which is about to run a sub-request.'''
+        ident = threading.current_thread().ident
+        with self._condition:
+            while True:
+                if ident in self._holders or self.max_connections is None or \
+                        len(self._holders) < self.max_connections:
+                    self._holders[ident] = None
+                    return
+
+                idle = next((key for key, conns in six.iteritems(self._holders) if conns is not None), None)
+                if idle is not None:
+                    # The slot is taken over before closing, the idle thread cannot start meanwhile.
+                    close_connections(self._holders.pop(idle))
+                    continue
+
+                self._condition.wait()
+
+    def release(self):
+        '''
+            Called once the sub-request of the current thread is done, keeps its slot if
+            it still has connections open.
+        '''
+        ident = threading.current_thread().ident
+        conns = get_open_connections()
+        with self._condition:
+            self._holders.pop(ident, None)
+            if conns:
+                self._holders[ident] = conns
+            self._condition.notify_all()
+
+    def close_idle(self):
+        '''Closes the connections of the idle threads, e.g. once the pool is shut down.'''
+        with self._condition:
+            idle = [key for key, conns in six.iteritems(self._holders) if conns is not None]
+            for key in idle:
+                close_connections(self._holders.pop(key))
+            self._condition.notify_all()
+
+    @property
+    def holders(self):
+        return len(self._holders)
+
+
+def run_with_connections(worker_connections, fn, *args, **kwargs):
+    '''
+        Calls fn on a thread of the pool the way Django handles a request, closing the
+        connections of the thread which are broken or past CONN_MAX_AGE before and
+        after it.
+    '''
+    worker_connections.acquire()
+    try:
+        close_old_connections()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            close_old_connections()
+    finally:
+        worker_connections.release()
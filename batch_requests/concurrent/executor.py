@@ -5,17 +5,70 @@ Created on Feb 20, 2016
 '''
 from __future__ import absolute_import, unicode_literals
 
+import atexit
+import os
+import threading
+import time
+import weakref
 from abc import ABCMeta
 
-from concurrent.futures._base import Executor as BaseExecutor, Future
+import six
+
+from concurrent.futures._base import (
+    FIRST_COMPLETED,
+    Executor as BaseExecutor,
+    Future,
+    TimeoutError,
+    wait,
+)
 from concurrent.futures.process import ProcessPoolExecutor
 from concurrent.futures.thread import ThreadPoolExecutor
 
+from batch_requests.concurrent.connections import WorkerConnections, run_with_connections
+from batch_requests.concurrent.process import from_result, init_worker, run_in_worker, to_spec
+
+
+# All the executors alive in this process, so that their pools can be shut down on exit
+# and forgotten after a fork.
+_executors = weakref.WeakSet()
+
+# Deadlines must not move with the wall clock, fall back to it only where there is no choice (py2).
+monotonic = getattr(time, "monotonic", time.time)
+
 
 def default_result_handler(future, *args, **kwargs):
     return future.result()
 
 
+def pop_start(kwargs):
+    '''
+        Pops the `start` of the batch, on the monotonic clock, from the keyword
+        arguments of a submission. Now if not given.
+    '''
+    start = kwargs.pop("start", None)
+    return monotonic() if start is None else start
+
+
+def acquire(semaphore, timeout=None):
+    '''
+        Acquires the semaphore, waiting for timeout seconds at most, forever if None.
+        Returns whether it was acquired.
+    '''
+    if timeout is None:
+        return semaphore.acquire()
+
+    if not six.PY2:
+        return semaphore.acquire(True, timeout)
+
+    # Locks cannot time out on py2, poll them.
+    deadline = monotonic() + timeout
+    while not semaphore.acquire(False):
+        if monotonic() >= deadline:
+            return False
+        time.sleep(0.001)
+    return True
+
+
 class SequentialPoolExecutor(BaseExecutor):
     def __init__(self, *args, **kwargs):
         self._args = args
@@ -34,42 +87,350 @@ class SequentialPoolExecutor(BaseExecutor):
         return f
 
 
-class Executor(object):
+class DeadlineMixin(object):
+    '''
+        Works out when to stop waiting for a request, expects `timeout` and
+        `batch_timeout` attributes.
+    '''
+
+    def get_timeout(self, request):
+        '''
+            Returns the time the given request may take: the shortest of its own
+            `batch_timeout` and the default for this executor, a request cannot ask for
+            more. None for no limit.
+        '''
+        timeouts = [t for t in (getattr(request, "batch_timeout", None), self.timeout) if t is not None]
+        return min(timeouts) if timeouts else None
+
+    def get_deadline(self, request, start):
+        '''
+            Returns the point in time (on the monotonic clock) after which we stop
+            waiting for the request, or None to wait forever.
+        '''
+        timeouts = [t for t in (self.get_timeout(request), self.batch_timeout) if t is not None]
+        return start + min(timeouts) if timeouts else None
+
+
+class Executor(DeadlineMixin):
     '''Based executor class to encapsulate the job execution.'''
     __metaclass__ = ABCMeta
 
-    def __init__(self, num_workers, timeout=None):
-        '''Create a pool for (maybe) concurrent execution with specified number of workers.'''
+    # Whether BulkGroup units can be submitted, see batch_requests.bulk.
+    runs_bulk_groups = True
+    # Whether sub-requests run in this process, holding the slots of its bulkheads.
+    shares_bulkheads = True
+
+    def __init__(self, num_workers, timeout=None, queue_size=None, batch_timeout=None, queue_timeout=10):
+        '''
+            Set up a (maybe) concurrent executor with specified number of workers.
+
+            The pool itself is created lazily on first use and shared by every batch
+            executed in this process. `queue_size` bounds the number of sub-requests
+            submitted to the pool but not yet finished, across all the batches. A
+            submission waits `queue_timeout` seconds at most for a free slot, forever
+            if None.
+
+            `timeout` is the default time a single request may take, `batch_timeout`
+            the time the whole batch may take, both in seconds.
+        '''
         self.num_workers = num_workers
         self.timeout = timeout
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.batch_timeout = batch_timeout
+        self._reset_pool_state()
+        _executors.add(self)
+
+    def _reset_pool_state(self):
+        '''Forget the pool and the synchronisation primitives guarding it.'''
+        self._pool = None
+        self._pool_pid = None
+        self._lock = threading.Lock()
+        self._queue_slots = threading.BoundedSemaphore(self.queue_size) if self.queue_size else None
+        self._pending = 0
+        self._pending_lock = threading.Lock()
 
-    def get_executor_pool(self, num_workers=None):
+    def create_executor_pool(self, num_workers=None):
         return self.executor_cls(num_workers or self.num_workers)
 
+    def _pool_is_usable(self, pool):
+        return (
+            pool is not None and
+            self._pool_pid == os.getpid() and
+            not getattr(pool, "_broken", False)
+        )
+
+    def get_executor_pool(self):
+        '''
+            Returns the process wide pool, creating it if this is the first use, if the
+            process was forked since it was created or if the pool broke down.
+        '''
+        pool = self._pool
+        if self._pool_is_usable(pool):
+            return pool
+
+        if self._pool_pid is not None and self._pool_pid != os.getpid():
+            # We are in a forked child, parent's locks and worker threads are not ours.
+            self._reset_pool_state()
+
+        with self._lock:
+            if not self._pool_is_usable(self._pool):
+                self._pool = self.create_executor_pool()
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def get_queue_depth(self):
+        '''The number of sub-requests submitted to the pool and not finished yet, across all the batches.'''
+        return self._pending
+
+    def _job_done(self, future=None):
+        with self._pending_lock:
+            self._pending -= 1
+        if self._queue_slots is not None:
+            self._queue_slots.release()
+
+    def submit(self, pool, fn, *args, **kwargs):
+        '''
+            Submit the job to the pool, waiting while the submission queue is full: for
+            the `queue_timeout` keyword argument, or that of the executor, in seconds.
+            Raises TimeoutError if no slot frees up in time.
+        '''
+        queue_timeout = kwargs.pop("queue_timeout", self.queue_timeout)
+        if self._queue_slots is not None and not acquire(self._queue_slots, queue_timeout):
+            raise TimeoutError()
+        with self._pending_lock:
+            self._pending += 1
+
+        try:
+            future = pool.submit(fn, *args, **kwargs)
+        except BaseException:
+            self._job_done()
+            raise
+
+        future.add_done_callback(self._job_done)
+        return future
+
+    def shutdown(self, wait=True):
+        '''
+            Shut down the shared pool, if any. A later batch will start a new one.
+        '''
+        with self._lock:
+            pool, self._pool = self._pool, None
+            owned = self._pool_pid == os.getpid()
+            self._pool_pid = None
+
+        if pool is not None and owned:
+            pool.shutdown(wait=wait)
+
+    def submit_request(self, pool, start, request, resp_generator, *args, **kwargs):
+        '''
+            Submits the resp_generator for the request, returns (future, deadline). A request
+            whose deadline passed before it could start, or which found no free slot in
+            the submission queue before it, is never run.
+        '''
+        deadline = self.get_deadline(request, start)
+        future = None
+        now = monotonic()
+        if deadline is None or now < deadline:
+            queue_timeout = self.queue_timeout
+            if deadline is not None:
+                # No point waiting for a slot past the deadline.
+                queue_timeout = deadline - now if queue_timeout is None else min(queue_timeout, deadline - now)
+            try:
+                future = self.submit(
+                    pool, resp_generator, request, *args, queue_timeout=queue_timeout, **kwargs
+                )
+            except TimeoutError:
+                pass  # the submission queue stayed full, answered as timed out
+        if future is None:
+            future = Future()
+            future.set_exception(TimeoutError())
+        return future, deadline
+
+    def submit_all(self, requests, resp_generator, *args, **kwargs):
+        '''
+            Submits the resp_generator for all the requests, returns a list of (future,
+            deadline). Deadlines count from the `start` keyword argument, now by default.
+        '''
+        start = pop_start(kwargs)
+        pool = self.get_executor_pool()
+        return [
+            self.submit_request(pool, start, r, resp_generator, *args, **kwargs)
+            for r in requests
+        ]
+
+    def _handle_job(self, job, result_handler):
+        future, deadline = job
+        timeout = None if deadline is None else max(deadline - monotonic(), 0)
+        result = result_handler(future, timeout)
+        future.cancel()  # no-op unless it is a straggler still in the queue
+        return result
+
+    def iter_in_order(self, jobs, result_handler=default_result_handler):
+        '''Yields (index, result) for the submitted jobs, in the order of submission.'''
+        for index, job in enumerate(jobs):
+            yield index, self._handle_job(job, result_handler)
+
+    def iter_as_completed(self, jobs, result_handler=default_result_handler):
+        '''
+            Yields (index, result) for the submitted jobs as soon as they finish or
+            their deadline passes, whichever comes first.
+        '''
+        pending = dict(enumerate(jobs))
+        while pending:
+            now = monotonic()
+            ready = sorted(
+                index for index, (future, deadline) in six.iteritems(pending)
+                if future.done() or (deadline is not None and deadline <= now)
+            )
+            for index in ready:
+                yield index, self._handle_job(pending.pop(index), result_handler)
+
+            if not pending:
+                break
+
+            deadlines = [deadline for _, deadline in six.itervalues(pending) if deadline is not None]
+            timeout = max(min(deadlines) - monotonic(), 0) if deadlines else None
+            wait([future for future, _ in six.itervalues(pending)], timeout, FIRST_COMPLETED)
+
+    def iter_execute(self, requests, resp_generator,
+                     result_handler=default_result_handler, in_order=True, start=None):
+        '''
+            Same as execute, but returns an iterator over (index, result) instead of the list
+            of results. The requests are submitted right away, results are waited for
+            while iterating, in order or as they complete.
+        '''
+        jobs = self.submit_all(requests, resp_generator, start=start)
+        if in_order:
+            return self.iter_in_order(jobs, result_handler)
+        return self.iter_as_completed(jobs, result_handler)
+
     def execute(self, requests, resp_generator,
                 result_handler=default_result_handler,
                 *args, **kwargs):
-        '''Calls the resp_generator for all the requests in parallel in an asynchronous way'''
-        with self.get_executor_pool() as pool:
-            futures = [
-                pool.submit(resp_generator, r, *args, **kwargs)
-                for r in requests
-            ]
+        '''
+            Calls the resp_generator for all the requests in parallel in an asynchronous way.
 
-        timeout = self.timeout
-        return [result_handler(f, timeout) for f in futures]
+            Every request is waited for until its deadline at most, counting from the
+            start of the batch: now, or the `start` keyword argument (on the monotonic
+            clock) for batches executed in several steps. Requests whose deadline
+            passed before they could start are never run, those still queued when it
+            passes are cancelled. The `result_handler` receives the time left until the
+            deadline.
+        '''
+        jobs = self.submit_all(requests, resp_generator, *args, **kwargs)
+        return [result for _, result in self.iter_in_order(jobs, result_handler)]
 
 
 class SequentialExecutor(Executor):
     '''An implementation of executor using no parallelism.'''
     executor_cls = SequentialPoolExecutor
 
+    def iter_execute(self, requests, resp_generator,
+                     result_handler=default_result_handler, in_order=True, start=None):
+        '''
+            Runs every request only once the iteration gets to it, so that the first
+            results are available before the last requests have even started.
+        '''
+        start = monotonic() if start is None else start
+        pool = self.get_executor_pool()
+        for index, r in enumerate(requests):
+            job = self.submit_request(pool, start, r, resp_generator)
+            yield index, self._handle_job(job, result_handler)
+
 
 class ThreadBasedExecutor(Executor):
-    '''An implementation of executor using threads for parallelism.'''
+    '''
+        An implementation of executor using threads for parallelism.
+
+        Unless `manage_connections` is False, sub-requests handle the database
+        connections of the thread they run on like Django does those of a request,
+        see batch_requests.concurrent.connections. `max_connections` bounds the
+        threads of the pool holding connections, None for as many as `num_workers`.
+    '''
     executor_cls = ThreadPoolExecutor
 
+    def __init__(self, num_workers, timeout=None, queue_size=None, batch_timeout=None,
+                 manage_connections=True, max_connections=None, queue_timeout=10):
+        self.manage_connections = manage_connections
+        self.max_connections = max_connections
+        super(ThreadBasedExecutor, self).__init__(
+            num_workers, timeout, queue_size=queue_size, batch_timeout=batch_timeout,
+            queue_timeout=queue_timeout
+        )
+
+    def _reset_pool_state(self):
+        super(ThreadBasedExecutor, self)._reset_pool_state()
+        self.worker_connections = WorkerConnections(self.max_connections) if self.manage_connections else None
+
+    def submit(self, pool, fn, *args, **kwargs):
+        if self.worker_connections is not None:
+            fn, args = run_with_connections, (self.worker_connections, fn) + args
+        return super(ThreadBasedExecutor, self).submit(pool, fn, *args, **kwargs)
+
+    def shutdown(self, wait=True):
+        super(ThreadBasedExecutor, self).shutdown(wait=wait)
+        if self.worker_connections is not None:
+            self.worker_connections.close_idle()
+
 
 class ProcessBasedExecutor(Executor):
-    '''An implementation of executor using process(es) for parallelism.'''
+    '''
+        An implementation of executor using process(es) for parallelism.
+
+        Sub-requests are sent to the workers as SubRequestSpec and their responses come
+        back as SubResponse, see batch_requests.concurrent.process. `mp_context` is the
+        name of the multiprocessing start method of the workers ("fork", "spawn" or
+        "forkserver"), the platform's default if None.
+    '''
     executor_cls = ProcessPoolExecutor
+    # Only sub-requests can be sent to the workers, as specs.
+    runs_bulk_groups = False
+    # Every worker would only count the sub-requests it runs itself.
+    shares_bulkheads = False
+
+    def __init__(self, num_workers, timeout=None, queue_size=None, batch_timeout=None, mp_context=None,
+                 queue_timeout=10):
+        super(ProcessBasedExecutor, self).__init__(
+            num_workers, timeout, queue_size=queue_size, batch_timeout=batch_timeout,
+            queue_timeout=queue_timeout
+        )
+        self.mp_context = mp_context
+
+    def create_executor_pool(self, num_workers=None):
+        if six.PY2:
+            # The futures backport can neither set workers up nor pick how they start.
+            return self.executor_cls(num_workers or self.num_workers)
+
+        import multiprocessing
+
+        context = multiprocessing.get_context(self.mp_context) if self.mp_context else None
+        return self.executor_cls(num_workers or self.num_workers, context, initializer=init_worker)
+
+    def submit(self, pool, fn, request, *args, **kwargs):
+        return super(ProcessBasedExecutor, self).submit(
+            pool, run_in_worker, fn, to_spec(request), *args, **kwargs
+        )
+
+    def _handle_job(self, job, result_handler):
+        return from_result(super(ProcessBasedExecutor, self)._handle_job(job, result_handler))
+
+
+def shutdown_executors(wait=True):
+    '''
+        Shut down the pools of all the executors in this process. Registered to run at
+        interpreter exit, may also be called from a server's worker exit hook.
+    '''
+    for executor in list(_executors):
+        executor.shutdown(wait=wait)
+
+
+def _reset_executors_after_fork():
+    for executor in list(_executors):
+        executor._reset_pool_state()
+
+
+atexit.register(shutdown_executors)
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_executors_after_fork)
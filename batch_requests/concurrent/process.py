@@ -0,0 +1,123 @@
+'''
+@summary: What process pools exchange with their workers. Sub-requests are sent as
+          compact, picklable specs instead of WSGIRequest objects, and sub-responses
+          come back as tuples. Workers set Django up once, when they start.
+'''
+from __future__ import absolute_import, unicode_literals
+
+import io
+from collections import namedtuple
+
+import six
+from django.core.handlers.wsgi import WSGIRequest
+
+
+# The attributes of a sub-request that are needed to run it in a worker. Its routing
+# goes along as a copy: writes made in a worker do not stick the rest of the batch
+# to the primary. The batch context, shared by the sub-requests of the process
+# running the batch, does not.
+SPEC_ATTRIBUTES = ("batch_middleware", "batch_routing", "batch_read_replica")
+
+
+def get_spec_attributes():
+    '''
+        The attributes sent to the workers, the SHARED_REQUEST_ATTRIBUTES included:
+        those have to be picklable, and workers get copies of them.
+    '''
+    # The settings build the executors of this package.
+    from batch_requests.settings import br_settings as _settings
+
+    return SPEC_ATTRIBUTES + tuple(_settings.SHARED_REQUEST_ATTRIBUTES)
+
+
+class SubRequestSpec(namedtuple("SubRequestSpec", ["environ", "body", "attributes"])):
+    '''
+        Everything a worker needs to rebuild a sub-request: the text entries of its
+        WSGI environ (method, path, query string and headers among them), its body
+        as bytes and the attributes returned by get_spec_attributes.
+    '''
+    __slots__ = ()
+
+    @classmethod
+    def from_request(cls, request):
+        environ = {k: v for k, v in six.iteritems(request.environ) if isinstance(v, six.string_types)}
+        attributes = {
+            attr: getattr(request, attr) for attr in get_spec_attributes() if hasattr(request, attr)
+        }
+        return cls(environ, request.body, attributes)
+
+    def to_request(self):
+        environ = dict(self.environ)
+        environ["wsgi.input"] = io.BytesIO(self.body)
+        environ["wsgi.errors"] = io.BytesIO()
+        request = WSGIRequest(environ)
+        for attr, value in six.iteritems(self.attributes):
+            setattr(request, attr, value)
+        return request
+
+
+class SubResponse(namedtuple("SubResponse", ["status_code", "reason_phrase", "headers", "body"])):
+    '''A sub-response, as sent back by a worker.'''
+    __slots__ = ()
+
+    @classmethod
+    def from_dict(cls, d_resp):
+        '''Returns the sub-response dict as a SubResponse, or as it is if it has other keys.'''
+        if isinstance(d_resp, dict) and len(d_resp) == len(cls._fields) and all(k in d_resp for k in cls._fields):
+            return cls(**d_resp)
+        return d_resp
+
+    def to_dict(self):
+        return dict(zip(self._fields, self))
+
+
+def to_spec(request):
+    '''Returns the spec of the sub-request, or the request as it is if it is not one.'''
+    if isinstance(request, WSGIRequest):
+        return SubRequestSpec.from_request(request)
+    return request
+
+
+def from_result(result):
+    '''Returns the dict of a SubResponse sent back by a worker, other results as they are.'''
+    if isinstance(result, SubResponse):
+        return result.to_dict()
+    return result
+
+
+def run_in_worker(fn, request, *args, **kwargs):
+    '''
+        Calls fn with the sub-request rebuilt from its spec, in a worker process.
+    '''
+    if isinstance(request, SubRequestSpec):
+        request = request.to_request()
+    return SubResponse.from_dict(fn(request, *args, **kwargs))
+
+
+def init_worker():
+    '''
+        Sets Django up in a new worker process, from the DJANGO_SETTINGS_MODULE
+        environment variable unless the settings came along with a fork, and loads
+        the URLconf and the batch view so that the first sub-requests do not pay for
+        it. What the worker has by then, e.g. the heap of the forked parent, is left
+        out of garbage collection (Python 3.7+), which would otherwise walk it all on
+        the first full collection, in the middle of a sub-request.
+    '''
+    import gc
+
+    import django
+    from django.apps import apps
+    from django.urls import Resolver404, resolve
+
+    if not apps.ready:
+        django.setup()
+
+    try:
+        # Walking the patterns once compiles their regular expressions.
+        resolve("/")
+    except Resolver404:
+        pass
+    import batch_requests.views  # noqa: F401
+
+    if hasattr(gc, "freeze"):
+        gc.freeze()
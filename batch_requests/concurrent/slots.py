@@ -0,0 +1,66 @@
+'''
+@summary: A bounded semaphore which threads and event loops can both wait on, without
+          blocking the loops or polling for a free slot.
+'''
+from __future__ import absolute_import, unicode_literals
+
+import collections
+import threading
+
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class Slots(object):
+    '''
+        A bounded semaphore of `value` slots. Threads acquire and release it like a
+        threading.BoundedSemaphore. Event loops register a future as a waiter instead,
+        see batch_requests.concurrent.async_executor.wait_for_slot: every release wakes
+        the oldest waiter, whatever thread and loop it comes from.
+    '''
+
+    def __init__(self, value):
+        self._semaphore = threading.BoundedSemaphore(value)
+        self._lock = threading.Lock()
+        self._waiters = collections.deque()
+
+    def acquire(self, blocking=True, timeout=None):
+        if timeout is None:
+            return self._semaphore.acquire(blocking)
+        return self._semaphore.acquire(blocking, timeout)
+
+    def release(self):
+        self._semaphore.release()
+        self._wake_next()
+
+    def add_waiter(self, loop, waiter):
+        '''Registers the future, to be resolved in its loop once a slot is released.'''
+        with self._lock:
+            self._waiters.append((loop, waiter))
+
+    def discard_waiter(self, loop, waiter):
+        '''
+            Forgets the future of a waiter giving up. One already woken passes its wake
+            on to the next waiter, so that the released slot is not left unclaimed.
+        '''
+        with self._lock:
+            try:
+                self._waiters.remove((loop, waiter))
+                return
+            except ValueError:
+                pass
+        self._wake_next()
+
+    def _wake_next(self):
+        while True:
+            with self._lock:
+                if not self._waiters:
+                    return
+                loop, waiter = self._waiters.popleft()
+            try:
+                loop.call_soon_threadsafe(_wake, waiter)
+                return
+            except RuntimeError:
+                pass  # the loop of the waiter is closed, wake the next one
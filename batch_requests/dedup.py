@@ -0,0 +1,94 @@
+'''
+@summary: Deduplication of identical safe requests within a batch, so that each of them
+          runs only once and its response is used for all the copies.
+'''
+from __future__ import absolute_import, unicode_literals
+
+import binascii
+import json
+
+import six
+
+from batch_requests.cache import SAFE_METHODS
+
+
+def encode_bytes(value):
+    '''Encodes the raw bytes bodies of binary envelopes within request keys.'''
+    if isinstance(value, six.binary_type):
+        return {"bytes": binascii.hexlify(value).decode("ascii")}
+    raise TypeError("%r is not JSON serializable" % value)
+
+
+def get_request_key(data):
+    '''
+        Returns what identifies the request within the batch, None if it is not safe
+        to answer it with the response of another request.
+    '''
+    method = data["method"].upper()
+    if method not in SAFE_METHODS:
+        return None
+
+    return json.dumps(
+        [
+            method, data["url"], data.get("headers", {}), data.get("body", ""), data.get("timeout", None),
+            data.get("middleware", None), data.get("read_replica", None),
+        ],
+        sort_keys=True, default=encode_bytes,
+    )
+
+
+def deduplicate(requests):
+    '''
+        Returns the list of unique requests, and a list giving for each unique request
+        the indexes in `requests` it answers.
+    '''
+    unique, positions, seen = [], [], {}
+    for index, data in enumerate(requests):
+        key = get_request_key(data)
+        if key is not None and key in seen:
+            positions[seen[key]].append(index)
+            continue
+
+        if key is not None:
+            seen[key] = len(unique)
+        unique.append(data)
+        positions.append([index])
+
+    return unique, positions
+
+
+def get_duplicates(positions):
+    '''Returns a dict mapping the index of every duplicate request to the one that ran.'''
+    return {
+        duplicate: indexes[0]
+        for indexes in positions for duplicate in indexes[1:]
+    }
+
+
+def fan_out(results, positions):
+    '''
+        Given (unique index, result) pairs, yields (index, result) for every request
+        of the batch the result answers.
+    '''
+    for unique_index, result in results:
+        for index in positions[unique_index]:
+            yield index, result
+
+
+def in_order(results):
+    '''
+        Given (index, result) pairs in any order, yields them by increasing index as
+        soon as all the previous ones are there.
+    '''
+    pending = {}
+    next_index = 0
+    for index, result in results:
+        pending[index] = result
+        while next_index in pending:
+            yield next_index, pending.pop(next_index)
+            next_index += 1
+
+
+def fan_out_list(results, positions):
+    '''Returns the list of results for every request of the batch, in order.'''
+    return [result for _, result in in_order(fan_out(enumerate(results), positions))]
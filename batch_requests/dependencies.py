@@ -0,0 +1,193 @@
+'''
+@summary: Dependencies between the requests of a batch. A request may be given a `name`,
+          and other requests may list it in their `depends_on` or refer to its response
+          with `{result=<name>:<JSONPath>}` placeholders in their url, headers or body.
+'''
+from __future__ import absolute_import, unicode_literals
+
+import json
+import re
+
+import six
+
+from batch_requests.encoding import loads_body
+from batch_requests.exceptions import BadBatchRequest
+
+
+PLACEHOLDER_RE = re.compile(r"\{result=(?P<name>[^:{}]+):(?P<path>\$[^{}]*)\}")
+JSON_PATH_STEP_RE = re.compile(
+    r"\.(?P<key>[^.\[\]]+)|\[(?P<index>-?\d+)\]|\['(?P<quoted>[^']*)'\]|\[\"(?P<dquoted>[^\"]*)\"\]"
+)
+
+
+class DependencyError(Exception):
+    '''
+        Raised when a request can not be run because of a request it depends on.
+    '''
+    pass
+
+
+def get_failed_dependency_response(reason):
+    return {
+        "status_code": 424,
+        "reason_phrase": "Failed Dependency",
+        "body": reason,
+        "headers": {},
+    }
+
+
+def has_dependencies(requests):
+    '''Returns True if any of the request definitions uses names or dependencies.'''
+    return any(
+        "name" in data or "depends_on" in data or find_references(data)
+        for data in requests
+    )
+
+
+def find_references(value):
+    '''Returns the set of request names referred to by placeholders within the value.'''
+    if isinstance(value, six.string_types):
+        return {match.group("name") for match in PLACEHOLDER_RE.finditer(value)}
+    if isinstance(value, dict):
+        value = list(value.values())
+    if isinstance(value, (list, tuple)):
+        return set().union(*(find_references(v) for v in value)) if value else set()
+    return set()
+
+
+def resolve_json_path(document, path):
+    '''
+        Resolves the subset of JSONPath made of `$`, `.key`, `[index]` and `['key']` steps.
+    '''
+    rest = path[1:]
+    position = 0
+    while position < len(rest):
+        step = JSON_PATH_STEP_RE.match(rest, position)
+        if step is None:
+            raise DependencyError("Invalid JSONPath '%s'." % path)
+        position = step.end()
+
+        key = step.group("key") or step.group("quoted") or step.group("dquoted")
+        try:
+            if step.group("index") is not None:
+                document = document[int(step.group("index"))]
+            else:
+                document = document[key]
+        except (KeyError, IndexError, TypeError):
+            raise DependencyError("JSONPath '%s' does not match the response." % path)
+
+    return document
+
+
+class DependencyGraph(object):
+    '''
+        Orders the requests of a batch in layers, each layer only depending on the
+        previous ones, and resolves the references of a request to earlier responses.
+    '''
+
+    def __init__(self, requests):
+        self.requests = requests
+        self.names = {}
+        for index, data in enumerate(requests):
+            name = data.get("name", None)
+            if name is None:
+                continue
+            if not isinstance(name, six.string_types):
+                raise BadBatchRequest("Request name should be a string.")
+            if name in self.names:
+                raise BadBatchRequest("Request name '%s' is used more than once." % name)
+            self.names[name] = index
+
+        self.dependencies = [self.get_dependencies(data) for data in requests]
+        self.layers = self.get_layers()
+
+    def get_dependencies(self, data):
+        '''Returns the indexes of the requests the given request depends on.'''
+        depends_on = data.get("depends_on", [])
+        if isinstance(depends_on, six.string_types):
+            depends_on = [depends_on]
+        if not isinstance(depends_on, (list, tuple)):
+            raise BadBatchRequest("depends_on should be a list of request names.")
+
+        names = set(depends_on) | find_references(
+            [data.get("url", ""), data.get("headers", {}), data.get("body", "")]
+        )
+        unknown = sorted(name for name in names if name not in self.names)
+        if unknown:
+            raise BadBatchRequest("Unknown request name(s): %s." % ", ".join(unknown))
+
+        return {self.names[name] for name in names}
+
+    def get_layers(self):
+        '''
+            Returns the list of layers, each a list of request indexes that can run in
+            parallel once all the previous layers are done.
+        '''
+        layers = []
+        done = set()
+        remaining = set(range(len(self.requests)))
+        while remaining:
+            layer = sorted(i for i in remaining if self.dependencies[i] <= done)
+            if not layer:
+                raise BadBatchRequest("Requests have circular dependencies.")
+            layers.append(layer)
+            done.update(layer)
+            remaining.difference_update(layer)
+
+        return layers
+
+    def get_response(self, name, responses):
+        response = responses[self.names[name]]
+        if response["status_code"] >= 400:
+            raise DependencyError(
+                "Request '%s' failed with status %d." % (name, response["status_code"])
+            )
+        return response
+
+    def get_body(self, name, responses):
+        body = self.get_response(name, responses)["body"]
+        try:
+            return loads_body(body)
+        except ValueError:
+            raise DependencyError("Response of request '%s' is not JSON." % name)
+
+    def substitute(self, value, responses):
+        '''Replaces the placeholders within value with the referred response values.'''
+        if isinstance(value, six.string_types):
+            whole = PLACEHOLDER_RE.match(value)
+            if whole and whole.end() == len(value):
+                # Keep the type of the referred value, e.g. an integer id in a JSON body.
+                return resolve_json_path(self.get_body(whole.group("name"), responses), whole.group("path"))
+
+            def replace(match):
+                result = resolve_json_path(self.get_body(match.group("name"), responses), match.group("path"))
+                if not isinstance(result, six.string_types):
+                    result = json.dumps(result)
+                return result
+
+            return PLACEHOLDER_RE.sub(replace, value)
+
+        if isinstance(value, dict):
+            return {k: self.substitute(v, responses) for k, v in six.iteritems(value)}
+        if isinstance(value, (list, tuple)):
+            return [self.substitute(v, responses) for v in value]
+        return value
+
+    def prepare(self, index, responses):
+        '''
+            Returns the definition of the request at index with its references replaced
+            by values of the earlier responses. Raises DependencyError if any of the
+            requests it depends on failed.
+        '''
+        for dependency in sorted(self.dependencies[index]):
+            self.get_response(self.requests[dependency]["name"], responses)
+
+        data = dict(self.requests[index])
+        for key in ("url", "headers", "body"):
+            if key in data:
+                data[key] = self.substitute(data[key], responses)
+
+        if not isinstance(data["url"], six.string_types):
+            data["url"] = six.text_type(data["url"])
+
+        return data
@@ -0,0 +1,114 @@
+'''
+@summary: Encodes the batch response from byte chunks. Bodies which already are JSON
+          are spliced into the payload as they are, rather than parsed and dumped again.
+'''
+from __future__ import absolute_import, unicode_literals
+
+import re
+
+import six
+
+from batch_requests.settings import br_settings as _settings
+
+
+JSON_CONTENT_TYPE_RE = re.compile(r"^\s*application/(?:[\w.+-]+\+)?json\s*(?:;|$)", re.IGNORECASE)
+# The outline of a JSON document: an object, an array, a string or a scalar.
+JSON_OUTLINE_RE = re.compile(
+    br'\s*(?:\{.*\}|\[.*\]|".*"|true|false|null|-?[0-9][0-9.eE+-]*)\s*\Z', re.DOTALL
+)
+
+
+class RawJSON(object):
+    '''
+        A JSON document, kept as the bytes it was received as and embedded verbatim
+        in the batch response.
+    '''
+
+    def __init__(self, content):
+        self.content = content
+
+    def loads(self):
+        return _settings.json_codec.loads(self.content)
+
+    def __eq__(self, other):
+        return isinstance(other, RawJSON) and self.content == other.content
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return "RawJSON(%r)" % self.content
+
+
+def is_json_response(response):
+    '''Returns True if the Content-Type of the response says it is JSON.'''
+    return (
+        response.has_header("Content-Type") and
+        JSON_CONTENT_TYPE_RE.match(response["Content-Type"]) is not None
+    )
+
+
+def looks_like_json(content):
+    '''
+        Returns True if the bytes have the outline of a JSON document. A cheap check,
+        without parsing, which keeps bodies that plainly are not JSON out of the batch
+        response.
+    '''
+    return isinstance(content, six.binary_type) and JSON_OUTLINE_RE.match(content) is not None
+
+
+# Values the codecs can not encode themselves, or which hold such values.
+SPECIAL_TYPES = (RawJSON, six.binary_type, dict, list, tuple)
+
+
+def iter_encode(value, codec):
+    '''
+        Yields the JSON encoding of the value as byte chunks. RawJSON values are
+        yielded as they are, without being copied. Containers of plain values are
+        handed to the codec in one go.
+    '''
+    if isinstance(value, RawJSON):
+        yield value.content
+    elif isinstance(value, six.binary_type):
+        yield codec.dumps(value.decode("utf-8"))
+    elif isinstance(value, dict):
+        if not any(isinstance(item, SPECIAL_TYPES) for item in six.itervalues(value)):
+            yield codec.dumps(value)
+            return
+        separator = b"{"
+        for key, item in six.iteritems(value):
+            yield separator + codec.dumps(six.text_type(key)) + b":"
+            for chunk in iter_encode(item, codec):
+                yield chunk
+            separator = b","
+        yield b"}" if separator == b"," else b"{}"
+    elif isinstance(value, (list, tuple)):
+        separator = b"["
+        for item in value:
+            yield separator
+            for chunk in iter_encode(item, codec):
+                yield chunk
+            separator = b","
+        yield b"]" if separator == b"," else b"[]"
+    else:
+        yield codec.dumps(value)
+
+
+def encode(value, codec=None):
+    '''
+        Returns the JSON encoding of the value as bytes, joining the chunks once. Uses
+        the JSON_CODEC unless given another codec.
+    '''
+    return b"".join(iter_encode(value, codec or _settings.json_codec))
+
+
+def loads_body(body):
+    '''
+        Returns the decoded JSON document of a sub-response body. Raises ValueError if
+        the body is not JSON.
+    '''
+    if isinstance(body, RawJSON):
+        return body.loads()
+    if isinstance(body, (six.binary_type, six.string_types)):
+        return _settings.json_codec.loads(body)
+    return body
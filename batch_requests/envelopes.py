@@ -0,0 +1,154 @@
+'''
+@summary: The formats of the batch request and response bodies, negotiated with the
+          Content-Type and Accept headers. Binary envelopes carry the sub-request and
+          sub-response bodies as raw bytes, neither escaped nor base64 encoded.
+'''
+from __future__ import absolute_import, unicode_literals
+
+from abc import ABCMeta, abstractmethod
+
+import six
+
+from batch_requests.encoding import RawJSON, encode
+from batch_requests.json_codecs import import_library
+from batch_requests.settings import br_settings as _settings
+
+
+def get_media_types(header):
+    '''Returns the media types listed in a Content-Type or Accept header, lower cased.'''
+    return [t.split(";", 1)[0].strip().lower() for t in header.split(",") if t.strip()]
+
+
+def load_raw_json(value):
+    '''Replaces the RawJSON values within the value with the documents they hold.'''
+    if isinstance(value, RawJSON):
+        return value.loads()
+    if isinstance(value, dict):
+        return {k: load_raw_json(v) for k, v in six.iteritems(value)}
+    if isinstance(value, (list, tuple)):
+        return [load_raw_json(v) for v in value]
+    return value
+
+
+@six.add_metaclass(ABCMeta)
+class Envelope(object):
+    '''
+        Decodes batch requests and encodes batch responses in one format. Decoding
+        errors are raised as ValueError.
+    '''
+    content_types = ()
+
+    @property
+    def content_type(self):
+        return self.content_types[0]
+
+    @abstractmethod
+    def loads(self, data):
+        '''Returns the value of the body, given as bytes.'''
+
+    @abstractmethod
+    def dumps(self, value):
+        '''Returns the body of the value, as bytes.'''
+
+    @abstractmethod
+    def iter_array(self, values, length):
+        '''Yields the encoding of the array of `length` values as chunks, one value at a time.'''
+
+
+class JSONEnvelope(Envelope):
+    '''JSON, parsed and encoded with the JSON_CODEC.'''
+    content_types = ("application/json",)
+
+    def loads(self, data):
+        return _settings.json_codec.loads(data)
+
+    def dumps(self, value):
+        return encode(value)
+
+    def iter_array(self, values, length):
+        separator = b""
+        yield b"["
+        for value in values:
+            yield separator + encode(value)
+            separator = b","
+        yield b"]"
+
+
+class MessagePackEnvelope(Envelope):
+    '''MessagePack, bodies are carried with the bin type.'''
+    content_types = ("application/msgpack", "application/x-msgpack")
+
+    def __init__(self):
+        self.msgpack = import_library("msgpack", "ENVELOPES")
+
+    def loads(self, data):
+        try:
+            return self.msgpack.unpackb(data, raw=False)
+        except (ValueError, self.msgpack.UnpackException) as exc:
+            raise ValueError(six.text_type(exc))
+
+    def dumps(self, value):
+        return self.msgpack.packb(load_raw_json(value), use_bin_type=True)
+
+    def iter_array(self, values, length):
+        packer = self.msgpack.Packer(use_bin_type=True)
+        yield packer.pack_array_header(length)
+        for value in values:
+            yield packer.pack(load_raw_json(value))
+
+
+class CBOREnvelope(Envelope):
+    '''CBOR, bodies are carried as byte strings.'''
+    content_types = ("application/cbor",)
+
+    def __init__(self):
+        self.cbor2 = import_library("cbor2", "ENVELOPES")
+
+    def loads(self, data):
+        try:
+            return self.cbor2.loads(data)
+        except (ValueError, self.cbor2.CBORDecodeError) as exc:
+            raise ValueError(six.text_type(exc))
+
+    def dumps(self, value):
+        return self.cbor2.dumps(load_raw_json(value))
+
+    def iter_array(self, values, length):
+        # An indefinite length array, its items followed by a break.
+        yield b"\x9f"
+        for value in values:
+            yield self.cbor2.dumps(load_raw_json(value))
+        yield b"\xff"
+
+
+def get_envelope(content_type, envelopes=None):
+    '''
+        Returns the envelope for the content type, None if none of the configured
+        envelopes handles it.
+    '''
+    for envelope in envelopes or _settings.envelopes:
+        if content_type in envelope.content_types:
+            return envelope
+    return None
+
+
+def get_request_envelope(request):
+    '''
+        Returns the envelope the batch request is encoded with, the first configured
+        envelope if its Content-Type is none of theirs.
+    '''
+    content_types = get_media_types(request.META.get("CONTENT_TYPE", ""))
+    envelope = get_envelope(content_types[0]) if content_types else None
+    return envelope or _settings.envelopes[0]
+
+
+def get_response_envelope(request):
+    '''
+        Returns the envelope to encode the batch response with, the first one the
+        client accepts in its order of preference, otherwise the envelope of the request.
+    '''
+    for content_type in get_media_types(request.META.get("HTTP_ACCEPT", "")):
+        envelope = get_envelope(content_type)
+        if envelope is not None:
+            return envelope
+    return get_request_envelope(request)
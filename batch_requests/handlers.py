@@ -0,0 +1,94 @@
+'''
+@summary: A request handler running sub-requests through (part of) the middleware stack,
+          built on Django's own handler machinery.
+'''
+from __future__ import absolute_import, unicode_literals
+
+import threading
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.core.handlers.base import BaseHandler
+from django.core.handlers.exception import convert_exception_to_response
+
+try:
+    from django.utils.module_loading import import_string
+except ImportError:
+    from django.utils.module_loading import import_by_path as import_string
+
+
+_handlers = {}
+_handlers_lock = threading.Lock()
+
+
+def get_project_middleware():
+    '''Returns the MIDDLEWARE of the project, old-style MIDDLEWARE_CLASSES are not supported.'''
+    return list(getattr(settings, "MIDDLEWARE", None) or [])
+
+
+class SubRequestHandler(BaseHandler):
+    '''
+        Runs the sub-requests through the given middleware, in the order given, then
+        through the view, exactly like Django's handler does for regular requests.
+        Only sync middleware are supported.
+    '''
+
+    def __init__(self, middleware):
+        super(SubRequestHandler, self).__init__()
+        self.middleware = list(middleware)
+        self.load_middleware()
+
+    def load_middleware(self, is_async=False):
+        '''
+            Same as BaseHandler.load_middleware, for our own list of middleware.
+        '''
+        self._view_middleware = []
+        self._template_response_middleware = []
+        self._exception_middleware = []
+
+        handler = convert_exception_to_response(self._get_response)
+        for middleware_path in reversed(self.middleware):
+            middleware = import_string(middleware_path)
+            try:
+                mw_instance = middleware(handler)
+            except MiddlewareNotUsed:
+                continue
+
+            if mw_instance is None:
+                raise ImproperlyConfigured(
+                    'Middleware factory %s returned None.' % middleware_path
+                )
+
+            if hasattr(mw_instance, 'process_view'):
+                self._view_middleware.insert(0, mw_instance.process_view)
+            if hasattr(mw_instance, 'process_template_response'):
+                self._template_response_middleware.append(mw_instance.process_template_response)
+            if hasattr(mw_instance, 'process_exception'):
+                self._exception_middleware.append(mw_instance.process_exception)
+
+            handler = convert_exception_to_response(mw_instance)
+
+        self._middleware_chain = handler
+
+    def get_response(self, request):
+        '''
+            Returns the HttpResponse for the sub-request. Unlike BaseHandler, leaves
+            the URLconf of the thread alone, it belongs to the batch request.
+        '''
+        return self._middleware_chain(request)
+
+
+def get_handler(middleware):
+    '''
+        Returns the handler for the given middleware. Handlers are created once per
+        process, for every list of middleware.
+    '''
+    key = tuple(middleware)
+    handler = _handlers.get(key, None)
+    if handler is None:
+        with _handlers_lock:
+            handler = _handlers.get(key, None)
+            if handler is None:
+                handler = _handlers[key] = SubRequestHandler(key)
+
+    return handler
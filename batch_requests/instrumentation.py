@@ -0,0 +1,145 @@
+'''
+@summary: Measures where the time of a batch goes, stage by stage, for the batch and for
+          every sub-request. Timings are reported with the batch_finished and
+          sub_request_finished signals, to the METRICS_SINK and, if SERVER_TIMING is
+          enabled, in Server-Timing headers.
+'''
+from __future__ import absolute_import, unicode_literals
+
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import six
+
+from batch_requests.loaders import report_batch_context
+from batch_requests.queries import report_queries
+from batch_requests.settings import br_settings as _settings
+from batch_requests.signals import batch_finished, sub_request_finished
+
+
+# Durations must not move with the wall clock, fall back to it only where there is no choice (py2).
+perf_counter = getattr(time, "perf_counter", time.time)
+
+SERVER_TIMING_HEADER_NAME = "Server-Timing"
+
+
+class Timings(object):
+    '''
+        The time spent in each stage of a batch or sub-request, in seconds, in the
+        order the stages were first measured.
+    '''
+
+    def __init__(self, start=None):
+        self.start = perf_counter() if start is None else start
+        self.durations = OrderedDict()
+
+    def add(self, stage, duration):
+        self.durations[stage] = self.durations.get(stage, 0) + duration
+
+    @contextmanager
+    def measure(self, stage):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, perf_counter() - start)
+
+    def elapsed(self):
+        return perf_counter() - self.start
+
+    def finish(self):
+        '''Records the time since the start as the "total" stage.'''
+        self.durations["total"] = self.elapsed()
+        return self
+
+    def as_server_timing(self):
+        return ", ".join(
+            "%s;dur=%.3f" % (stage, duration * 1000.0) for stage, duration in six.iteritems(self.durations)
+        )
+
+
+def mark_queued(wsgi_requests):
+    '''Notes when the sub-requests were handed to the executor, to measure their wait.'''
+    now = perf_counter()
+    for wsgi_request in wsgi_requests:
+        wsgi_request.batch_queued_at = now
+
+
+def start_sub_request(wsgi_request):
+    '''
+        Returns the Timings of a sub-request which is starting to run, with the time
+        it waited for a worker.
+    '''
+    timings = Timings()
+    queued_at = getattr(wsgi_request, "batch_queued_at", None)
+    if queued_at is not None:
+        timings.add("queue", max(timings.start - queued_at, 0))
+    return timings
+
+
+def record_timings(name, timings):
+    sink = _settings.metrics_sink
+    if sink is None:
+        return
+
+    for stage, duration in six.iteritems(timings.durations):
+        sink.observe(name, duration, {"stage": stage})
+
+
+def finish_sub_request(wsgi_request, d_resp, timings):
+    '''
+        Reports the timings of a sub-request, adding them to its Server-Timing header
+        if enabled.
+    '''
+    report_queries(wsgi_request, d_resp, timings)
+    timings.finish()
+    if _settings.SERVER_TIMING:
+        d_resp["headers"][SERVER_TIMING_HEADER_NAME] = timings.as_server_timing()
+
+    sink = _settings.metrics_sink
+    if sink is not None:
+        sink.increment("batch_requests.sub_requests", tags={"status": "%dxx" % (d_resp["status_code"] // 100)})
+        record_timings("batch_requests.sub_request.duration", timings)
+
+    sub_request_finished.send(sender=None, request=wsgi_request, response=d_resp, timings=timings)
+
+
+def finish_batch(request, resp, responses, timings):
+    '''
+        Reports the timings of a batch, adding them to the Server-Timing header of the
+        batch response if enabled. The response may not be sent yet when streaming.
+    '''
+    timings.finish()
+    if _settings.SERVER_TIMING and resp is not None:
+        resp[SERVER_TIMING_HEADER_NAME] = timings.as_server_timing()
+    report_batch_context(request, resp)
+
+    sink = _settings.metrics_sink
+    if sink is not None:
+        sink.increment("batch_requests.batches")
+        if responses is not None:
+            sink.observe("batch_requests.batch.size", len(responses))
+        record_timings("batch_requests.batch.duration", timings)
+
+    batch_finished.send(sender=None, request=request, responses=responses, timings=timings)
+
+
+def finish_streamed_batch(request, resp, timings):
+    '''
+        Reports the timings of a streamed batch once its content is consumed. Only the
+        stages done before streaming are in its Server-Timing header.
+    '''
+    if _settings.SERVER_TIMING:
+        resp[SERVER_TIMING_HEADER_NAME] = timings.as_server_timing()
+
+    def stream(content):
+        try:
+            with timings.measure("stream"):
+                for chunk in content:
+                    yield chunk
+        finally:
+            finish_batch(request, None, None, timings)
+
+    resp.streaming_content = stream(resp.streaming_content)
+    return resp
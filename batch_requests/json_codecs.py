@@ -0,0 +1,102 @@
+'''
+@summary: The JSON codecs batch requests may be parsed and batch responses encoded with,
+          picked with the JSON_CODEC setting. All but StdlibCodec need their library
+          to be installed.
+'''
+from __future__ import absolute_import, unicode_literals
+
+import json
+from abc import ABCMeta, abstractmethod
+from importlib import import_module
+
+import six
+from django.core.exceptions import ImproperlyConfigured
+
+
+@six.add_metaclass(ABCMeta)
+class JSONCodec(object):
+    '''
+        Decodes JSON documents from bytes or text, and encodes values to UTF-8 bytes.
+        Decoding errors are raised as ValueError whatever the library.
+    '''
+    name = None
+
+    @abstractmethod
+    def loads(self, data):
+        '''Returns the value of the JSON document, given as bytes or text.'''
+
+    @abstractmethod
+    def dumps(self, value):
+        '''Returns the JSON document of the value, as UTF-8 bytes.'''
+
+
+class StdlibCodec(JSONCodec):
+    '''The json module of the standard library.'''
+    name = "json"
+
+    def loads(self, data):
+        if isinstance(data, six.binary_type):
+            data = data.decode("utf-8")
+        return json.loads(data)
+
+    def dumps(self, value):
+        return json.dumps(value).encode("utf-8")
+
+
+def import_library(name, setting="JSON_CODEC"):
+    try:
+        return import_module(name)
+    except ImportError:
+        raise ImproperlyConfigured(
+            "{setting} needs the '{name}' library, which is not installed.".format(setting=setting, name=name)
+        )
+
+
+class OrjsonCodec(JSONCodec):
+    '''orjson, encodes straight to bytes.'''
+    name = "orjson"
+
+    def __init__(self):
+        self.orjson = import_library("orjson")
+
+    def loads(self, data):
+        return self.orjson.loads(data)
+
+    def dumps(self, value):
+        return self.orjson.dumps(value)
+
+
+class UjsonCodec(JSONCodec):
+    '''ujson, with forward slashes left unescaped like the other codecs.'''
+    name = "ujson"
+
+    def __init__(self):
+        self.ujson = import_library("ujson")
+
+    def loads(self, data):
+        if isinstance(data, six.binary_type):
+            data = data.decode("utf-8")
+        return self.ujson.loads(data)
+
+    def dumps(self, value):
+        return self.ujson.dumps(value, ensure_ascii=False, escape_forward_slashes=False).encode("utf-8")
+
+
+class MsgspecCodec(JSONCodec):
+    '''msgspec, reusing a single encoder.'''
+    name = "msgspec"
+
+    def __init__(self):
+        msgspec = import_library("msgspec")
+        self.decode_error = msgspec.DecodeError
+        self.decode = msgspec.json.decode
+        self.encode = msgspec.json.Encoder().encode
+
+    def loads(self, data):
+        try:
+            return self.decode(data)
+        except self.decode_error as exc:
+            raise ValueError(six.text_type(exc))
+
+    def dumps(self, value):
+        return self.encode(value)
@@ -0,0 +1,201 @@
+'''
+@summary: Batch scoped data loaders. The sub-requests of a batch share a BatchContext,
+          whose loaders memoise what they loaded for the life of the batch and
+          coalesce the lookups made at about the same time by concurrently running
+          sub-views into a single query.
+'''
+from __future__ import absolute_import, unicode_literals
+
+import json
+import threading
+import time
+
+import six
+from concurrent.futures import Future
+from django.conf import settings
+from django.db import models
+
+from batch_requests.settings import br_settings as _settings
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+
+class DataLoader(object):
+    '''
+        Loads values by key with `batch_load_fn`, which is called with a list of keys
+        and returns either the list of their values, in the same order, or a dict of
+        them (keys it has no value for get None).
+
+        The first lookup waits `window` seconds for the lookups of other threads to
+        come along before calling `batch_load_fn` with all their keys. Values, and
+        lookups in progress, are memoised: a key is only ever loaded once, unless its
+        load failed.
+    '''
+
+    def __init__(self, batch_load_fn, window=0):
+        self.batch_load_fn = batch_load_fn
+        self.window = window
+        # The lookups asked for, and the calls to batch_load_fn they took.
+        self.lookups = 0
+        self.queries = 0
+        self._futures = {}
+        self._queue = []
+        self._dispatching = False
+        self._lock = threading.Lock()
+
+    def get_key(self, key):
+        return key
+
+    def load(self, key):
+        return self.load_many([key])[0]
+
+    def load_many(self, keys):
+        '''
+            Returns the values of the keys, in the same order.
+        '''
+        keys = [self.get_key(key) for key in keys]
+        with self._lock:
+            self.lookups += 1
+            for key in keys:
+                if key not in self._futures:
+                    self._futures[key] = Future()
+                    self._queue.append(key)
+            futures = [self._futures[key] for key in keys]
+            lead = bool(self._queue) and not self._dispatching
+            if lead:
+                self._dispatching = True
+
+        if lead:
+            self.dispatch()
+        return [future.result() for future in futures]
+
+    def dispatch(self):
+        '''
+            Loads the queued keys, until no thread queues any more. Keys queued while
+            a load is running are loaded right after it.
+        '''
+        if self.window:
+            time.sleep(self.window)
+
+        while True:
+            with self._lock:
+                keys, self._queue = self._queue, []
+                if not keys:
+                    self._dispatching = False
+                    return
+                self.queries += 1
+            self.load_batch(keys)
+
+    def load_batch(self, keys):
+        try:
+            values = self.batch_load_fn(keys)
+            if isinstance(values, Mapping):
+                values = [values.get(key, None) for key in keys]
+            else:
+                values = list(values)
+            if len(values) != len(keys):
+                raise ValueError("Loaded %d values for %d keys." % (len(values), len(keys)))
+        except BaseException as exc:
+            with self._lock:
+                futures = [self._futures.pop(key) for key in keys]
+            for future in futures:
+                future.set_exception(exc)
+            if not isinstance(exc, Exception):
+                raise
+        else:
+            for key, value in zip(keys, values):
+                self._futures[key].set_result(value)
+
+
+class ModelLoader(DataLoader):
+    '''
+        Loads the instances of a model by primary key, in one query per batch of keys,
+        from the `using` database (None to leave it to the routers). Missing instances
+        are None.
+    '''
+
+    def __init__(self, model, window=0, using=None):
+        manager = model._default_manager if using is None else model._default_manager.db_manager(using)
+        super(ModelLoader, self).__init__(manager.in_bulk, window)
+        self.model = model
+        self.using = using
+
+    def get_key(self, key):
+        return self.model._meta.pk.to_python(key)
+
+
+def create_loader(source, window=0, using=None):
+    '''Returns a ModelLoader for a model class, a DataLoader for a batch load function.'''
+    if isinstance(source, type) and issubclass(source, models.Model):
+        return ModelLoader(source, window, using)
+    return DataLoader(source, window)
+
+
+class BatchContext(object):
+    '''
+        What the sub-requests of a batch share, as `request.batch_context`: one loader
+        per model or batch load function, and database the sub-requests read from, so
+        that what was read from a replica is not served once the reads of the batch
+        stick to the primary.
+    '''
+
+    def __init__(self, window=0):
+        self.window = window
+        self.loaders = {}
+        self._lock = threading.Lock()
+
+    def get_loader(self, source, using=None):
+        key = (source, using)
+        with self._lock:
+            loader = self.loaders.get(key, None)
+            if loader is None:
+                loader = self.loaders[key] = create_loader(source, self.window, using)
+            return loader
+
+    def stats(self):
+        '''
+            The lookups made through the loaders, the queries they took and how many
+            queries were saved.
+        '''
+        lookups = sum(loader.lookups for loader in six.itervalues(self.loaders))
+        queries = sum(loader.queries for loader in six.itervalues(self.loaders))
+        return {"lookups": lookups, "queries": queries, "saved": lookups - queries}
+
+
+def create_batch_context():
+    return BatchContext(_settings.LOADER_BATCH_WINDOW)
+
+
+def report_batch_context(request, resp):
+    '''
+        Reports the queries the loaders of the batch saved to the metrics sink, and in
+        a header of the batch response in DEBUG.
+    '''
+    context = getattr(request, "batch_context", None)
+    if context is None or not context.loaders:
+        return
+
+    stats = context.stats()
+    if settings.DEBUG and resp is not None:
+        resp[_settings.LOADER_HEADER_NAME] = json.dumps(stats, sort_keys=True)
+    if _settings.metrics_sink is not None:
+        _settings.metrics_sink.increment("batch_requests.loader.saved_queries", stats["saved"])
+
+
+def get_loader(request, source):
+    '''
+        Returns the loader of the batch the request is part of, for a model class or a
+        batch load function. Outside of a batch, a loader for this call only:
+
+            user = get_loader(request, User).load(pk)
+    '''
+    context = getattr(request, "batch_context", None)
+    if context is None:
+        return create_loader(source)
+
+    routing = getattr(request, "batch_routing", None)
+    using = routing.get_read_database([request]) if routing is not None else None
+    return context.get_loader(source, using)
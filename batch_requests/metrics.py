@@ -0,0 +1,113 @@
+'''
+@summary: Sinks the counters and histograms of batch requests are recorded to, picked
+          with the METRICS_SINK setting. StatsdMetricsSink and PrometheusMetricsSink
+          need their library to be installed.
+'''
+from __future__ import absolute_import, unicode_literals
+
+import re
+import threading
+from collections import defaultdict
+
+import six
+
+from batch_requests.json_codecs import import_library
+
+
+class MetricsSink(object):
+    '''
+        Records counters and histograms, named with dots and tagged with a dict of
+        labels. Durations are observed in seconds. Does nothing by itself.
+    '''
+
+    def increment(self, name, value=1, tags=None):
+        pass
+
+    def observe(self, name, value, tags=None):
+        pass
+
+
+def get_tagged_key(name, tags):
+    return (name, tuple(sorted(six.iteritems(tags or {}))))
+
+
+class InMemoryMetricsSink(MetricsSink):
+    '''
+        Keeps the metrics in memory, per process. Meant for tests and local development.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counters = defaultdict(int)
+            self.histograms = defaultdict(list)
+
+    def increment(self, name, value=1, tags=None):
+        with self._lock:
+            self.counters[get_tagged_key(name, tags)] += value
+
+    def observe(self, name, value, tags=None):
+        with self._lock:
+            self.histograms[get_tagged_key(name, tags)].append(value)
+
+    def get_counter(self, name, **tags):
+        return self.counters.get(get_tagged_key(name, tags), 0)
+
+    def get_histogram(self, name, **tags):
+        return list(self.histograms.get(get_tagged_key(name, tags), []))
+
+
+class StatsdMetricsSink(MetricsSink):
+    '''
+        Sends the metrics to statsd, tag values being appended to the metric name.
+        The options are those of statsd.StatsClient.
+    '''
+
+    def __init__(self, **options):
+        statsd = import_library("statsd", "METRICS_SINK")
+        self.client = statsd.StatsClient(**options)
+
+    def get_name(self, name, tags):
+        return ".".join([name] + [six.text_type(v) for _, v in sorted(six.iteritems(tags or {}))])
+
+    def increment(self, name, value=1, tags=None):
+        self.client.incr(self.get_name(name, tags), value)
+
+    def observe(self, name, value, tags=None):
+        self.client.timing(self.get_name(name, tags), value * 1000.0)
+
+
+class PrometheusMetricsSink(MetricsSink):
+    '''
+        Exposes the metrics as Prometheus counters and histograms, tags being labels.
+        A metric must always be recorded with the same tags.
+    '''
+
+    def __init__(self, registry=None, buckets=None):
+        self.prometheus_client = import_library("prometheus_client", "METRICS_SINK")
+        self.registry = registry or self.prometheus_client.REGISTRY
+        self.buckets = buckets
+        self.metrics = {}
+        self._lock = threading.Lock()
+
+    def get_metric(self, metric_class, name, tags, **kwargs):
+        name = re.sub(r"[^a-zA-Z0-9_]", "_", name)
+        with self._lock:
+            metric = self.metrics.get(name, None)
+            if metric is None:
+                metric = metric_class(
+                    name, name, labelnames=sorted(tags or {}), registry=self.registry, **kwargs
+                )
+                self.metrics[name] = metric
+        return metric.labels(**tags) if tags else metric
+
+    def increment(self, name, value=1, tags=None):
+        self.get_metric(self.prometheus_client.Counter, name, tags).inc(value)
+
+    def observe(self, name, value, tags=None):
+        kwargs = {"buckets": self.buckets} if self.buckets else {}
+        name = name + "_seconds" if name.endswith("duration") else name
+        self.get_metric(self.prometheus_client.Histogram, name, tags, **kwargs).observe(value)
@@ -0,0 +1,135 @@
+'''
+@summary: Counts the database queries of every sub-request, and the time they took,
+          with the execute wrappers of Django's connections (Django 2.0+). Enabled
+          with QUERY_ACCOUNTING, the counts are reported to the METRICS_SINK, as a "db"
+          stage of the sub-request timings and, in DEBUG, in a header of the
+          sub-response.
+'''
+from __future__ import absolute_import, unicode_literals
+
+import json
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+from batch_requests.settings import br_settings as _settings
+
+perf_counter = getattr(time, "perf_counter", time.time)
+
+
+class QueryCounter(object):
+    '''
+        An execute wrapper counting the queries it sees and the time they took, in
+        seconds. An executemany counts as one query. A counter can be shared by the
+        sub-requests answered in one call of a bulk handler, `shared_by` of them, in
+        which case each is accounted an even share of its queries.
+    '''
+
+    def __init__(self, shared_by=1):
+        self.count = 0
+        self.duration = 0.0
+        self.shared_by = shared_by
+
+    def __call__(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += perf_counter() - start
+            self.count += 1
+
+    def get_share(self):
+        '''Returns the (count, duration) of the queries of one of the sub-requests sharing the counter.'''
+        if self.shared_by == 1:
+            return self.count, self.duration
+        return round(self.count / float(self.shared_by), 3), self.duration / self.shared_by
+
+    def as_dict(self):
+        count, duration = self.get_share()
+        d = {"count": count, "duration": round(duration * 1000.0, 3)}
+        if self.shared_by > 1:
+            d["shared_by"] = self.shared_by
+        return d
+
+
+def create_query_counter(wsgi_requests):
+    '''
+        Returns a QueryCounter shared by the sub-requests, as their `batch_queries`,
+        None unless QUERY_ACCOUNTING is enabled. Their queries are split evenly between
+        them.
+    '''
+    if not _settings.QUERY_ACCOUNTING:
+        return None
+
+    counter = QueryCounter(len(wsgi_requests))
+    for wsgi_request in wsgi_requests:
+        wsgi_request.batch_queries = counter
+    return counter
+
+
+@contextmanager
+def wrap_connections(wrapper, aliases):
+    if not aliases:
+        yield
+        return
+
+    with connections[aliases[0]].execute_wrapper(wrapper):
+        with wrap_connections(wrapper, aliases[1:]):
+            yield
+
+
+@contextmanager
+def count_queries(counter):
+    '''
+        Counts the queries the block makes on any database into the counter, if not
+        None. Connections are per thread, the block has to run in the thread the
+        queries are made from.
+    '''
+    if counter is None:
+        yield
+        return
+
+    with wrap_connections(counter, list(connections)):
+        yield
+
+
+def counting_queries(func, counter):
+    '''Returns func, counting its queries into the counter wherever it is called.'''
+    if counter is None:
+        return func
+
+    def call(*args, **kwargs):
+        with count_queries(counter):
+            return func(*args, **kwargs)
+
+    return call
+
+
+def get_view_path(wsgi_request):
+    match = getattr(wsgi_request, "resolver_match", None)
+    return getattr(match, "_func_path", None) or "unresolved"
+
+
+def report_queries(wsgi_request, d_resp, timings):
+    '''
+        Reports the queries of a sub-request, if they were counted, to the metrics sink
+        tagged with its view, as the "db" stage of its timings and in DEBUG in a header
+        of its sub-response. Sub-requests answered by a bulk handler report their share
+        of the queries of the call.
+    '''
+    counter = getattr(wsgi_request, "batch_queries", None)
+    if counter is None:
+        return
+
+    count, duration = counter.get_share()
+    timings.add("db", duration)
+    if settings.DEBUG:
+        d_resp["headers"][_settings.QUERY_HEADER_NAME] = json.dumps(counter.as_dict(), sort_keys=True)
+
+    sink = _settings.metrics_sink
+    if sink is not None:
+        tags = {"view": get_view_path(wsgi_request)}
+        sink.observe("batch_requests.sub_request.queries", count, tags)
+        sink.observe("batch_requests.sub_request.db_duration", duration, tags)
@@ -0,0 +1,51 @@
+'''
+@summary: A cache for the resolution of sub-request paths to views, sparing a walk
+          through the URL patterns for the paths batches keep asking for.
+'''
+from __future__ import absolute_import, unicode_literals
+
+import copy
+
+from django.urls import get_resolver, get_urlconf
+from django.urls.exceptions import Resolver404
+
+from batch_requests.cache import LRUCache
+
+
+class ResolverCache(object):
+    '''
+        Memoizes the ResolverMatch of the `max_entries` most recently resolved paths.
+
+        Entries are keyed on the URLconf in use by the current thread (see
+        django.urls.set_urlconf) and are only valid for the resolver they were built
+        with, so that reloading the URLconf (clear_url_caches) invalidates them.
+    '''
+
+    def __init__(self, max_entries):
+        self.entries = LRUCache(max_entries)
+
+    def resolve(self, path):
+        urlconf = get_urlconf()
+        resolver = get_resolver(urlconf)
+        key = (urlconf, path)
+
+        entry = self.entries.get(key)
+        if entry is None or entry[0] is not resolver:
+            try:
+                match = resolver.resolve(path)
+            except Resolver404:
+                match = None
+            entry = (resolver, match)
+            self.entries.set(key, entry)
+
+        match = entry[1]
+        if match is None:
+            raise Resolver404({"path": path})
+
+        # Callers add the request to the kwargs, never share them across requests.
+        match = copy.copy(match)
+        match.kwargs = dict(match.kwargs)
+        return match
+
+    def clear(self):
+        self.entries.clear()
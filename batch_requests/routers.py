@@ -0,0 +1,131 @@
+'''
+@summary: Routes the reads of sub-requests to a read replica. With READ_REPLICA_DATABASE
+          set and BatchReplicaRouter in DATABASE_ROUTERS, the reads of safe method
+          sub-requests, or of those tagged with `"read_replica": true`, go to the
+          replica, until the batch writes to the primary.
+'''
+from __future__ import absolute_import, unicode_literals
+
+import threading
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS
+
+from batch_requests.settings import br_settings as _settings
+
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+# The sub-requests whose queries the current thread makes.
+_local = threading.local()
+
+
+class BatchRouting(object):
+    '''
+        What the sub-requests of a batch share to route their queries. The reads of
+        a sub-request go to `replica` if it may read from it, was not preceded in the
+        batch by a sub-request which may write, and as long as no write went to the
+        primary.
+    '''
+
+    def __init__(self, replica):
+        self.replica = replica
+        self.write_requested = False
+        self.wrote = False
+
+    def add(self, wsgi_request, data):
+        '''
+            Decides where the reads of a sub-request go, the sub-requests being added in
+            the order of the batch. Safe methods read from the replica, unless the
+            request says otherwise with its `read_replica` key.
+        '''
+        safe = wsgi_request.method in SAFE_METHODS
+        read_replica = data.get("read_replica", None)
+
+        wsgi_request.batch_routing = self
+        wsgi_request.batch_read_replica = (safe if read_replica is None else read_replica) and not self.write_requested
+        if not safe and read_replica is not True:
+            self.write_requested = True
+
+    def get_read_database(self, wsgi_requests):
+        if self.wrote or not all(getattr(r, "batch_read_replica", False) for r in wsgi_requests):
+            return None
+        return self.replica
+
+
+def create_batch_routing():
+    '''Returns the BatchRouting of a new batch, None without a READ_REPLICA_DATABASE.'''
+    if not _settings.READ_REPLICA_DATABASE:
+        return None
+    return BatchRouting(_settings.READ_REPLICA_DATABASE)
+
+
+def get_routing(wsgi_requests):
+    return getattr(wsgi_requests[0], "batch_routing", None) if wsgi_requests else None
+
+
+@contextmanager
+def route_queries(wsgi_requests):
+    '''
+        Routes the queries the block makes for the sub-requests, all from the same
+        batch. Routers being called in the thread making the queries, the block has to
+        run in it.
+    '''
+    if get_routing(wsgi_requests) is None:
+        yield
+        return
+
+    previous = getattr(_local, "requests", None)
+    _local.requests = wsgi_requests
+    try:
+        yield
+    finally:
+        _local.requests = previous
+
+
+def routing_queries(func, wsgi_requests):
+    '''Returns func, routing its queries for the sub-requests wherever it is called.'''
+    if get_routing(wsgi_requests) is None:
+        return func
+
+    def call(*args, **kwargs):
+        with route_queries(wsgi_requests):
+            return func(*args, **kwargs)
+
+    return call
+
+
+class BatchReplicaRouter(object):
+    '''
+        A database router sending the reads of sub-requests to the replica of their
+        batch. Any write sticks the rest of the batch to the primary, the default
+        database. Outside of sub-requests it leaves the routing to the other routers.
+    '''
+
+    def get_current(self):
+        requests = getattr(_local, "requests", None)
+        return requests, get_routing(requests)
+
+    def db_for_read(self, model, **hints):
+        requests, routing = self.get_current()
+        if routing is None:
+            return None
+        return routing.get_read_database(requests)
+
+    def db_for_write(self, model, **hints):
+        _, routing = self.get_current()
+        if routing is not None:
+            routing.wrote = True
+
+        # Instances read from a replica are saved to the primary.
+        instance = hints.get("instance", None)
+        replica = _settings.READ_REPLICA_DATABASE
+        if replica and instance is not None and instance._state.db == replica:
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        replica = _settings.READ_REPLICA_DATABASE
+        databases = {DEFAULT_DB_ALIAS, replica}
+        if replica and obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
@@ -7,6 +7,7 @@ import multiprocessing
 
 import six
 from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 
 try:
     from django.utils.importlib import import_module
@@ -15,18 +16,55 @@ except ImportError:
 
 DEFAULTS = {
     "ADD_DURATION_HEADER": True,
+    "ADMISSION_BATCH_COST": None,
+    "ADMISSION_MAX_IN_FLIGHT": None,
+    "ADMISSION_MAX_QUEUE_DEPTH": None,
+    "ADMISSION_REJECT_STATUS": 503,
+    "ADMISSION_RETRY_AFTER": 1,
     "BATCH_RESPONSE_STATUS": 200,
+    "BATCH_TIMEOUT": None,
+    "CACHE_BACKEND": None,
+    "CACHE_HEADER_NAME": "batch_requests.cache",
+    "CACHE_MAX_ENTRIES": 1000,
+    "CACHE_TIMEOUT": 60,
+    "CACHE_VARY_HEADERS": {"HTTP_AUTHORIZATION", "HTTP_COOKIE"},
+    "COMPRESSION": (),
+    "COMPRESSION_LEVEL": None,
+    "COMPRESSION_MIN_SIZE": 1024,
     "CONCURRENT_EXECUTOR": "batch_requests.concurrent.executor.ThreadBasedExecutor",
+    "CONCURRENT_EXECUTOR_OPTIONS": {},
     "DEBUG_HEADER_NAME": "batch_requests.debug",
+    "DEDUPLICATE_REQUESTS": False,
+    "DEDUPLICATION_HEADER_NAME": "batch_requests.deduplicated",
     "DEFAULT_CONTENT_TYPE": "application/json",
     "DISALLOW_CACHING": False,
     "DURATION_HEADER_NAME": "batch_requests.duration",
+    "ENVELOPES": ("batch_requests.envelopes.JSONEnvelope",),
     "EXECUTE_PARALLEL": False,
+    "EXECUTOR_QUEUE_SIZE": None,
+    "EXECUTOR_QUEUE_TIMEOUT": 10,
     "HEADERS_TO_INCLUDE": {"HTTP_USER_AGENT", "HTTP_COOKIE"},
+    "JSON_CODEC": "batch_requests.json_codecs.StdlibCodec",
+    "LOADER_BATCH_WINDOW": 0,
+    "LOADER_HEADER_NAME": "batch_requests.loaders",
     "NUM_WORKERS": multiprocessing.cpu_count() * 4,
+    "QUERY_ACCOUNTING": False,
+    "QUERY_HEADER_NAME": "batch_requests.queries",
+    "READ_REPLICA_DATABASE": None,
     "MAX_LIMIT": 20,
+    "METRICS_SINK": None,
+    "METRICS_SINK_OPTIONS": {},
     "REQUEST_TIMEOUT": None,
+    "RESOLVER_CACHE_SIZE": None,
+    "RESPONSE_CACHE": None,
+    "ROUTE_CONCURRENCY_LIMITS": {},
+    "ROUTE_CONCURRENCY_TIMEOUT": 0,
+    "SERVER_TIMING": False,
+    "SHARED_REQUEST_ATTRIBUTES": (),
+    "STREAM_RESPONSES": False,
+    "SUB_REQUEST_MIDDLEWARE": None,
     "USE_HTTPS": False,
+    "USE_MIDDLEWARE": False,
 
     # JN: added for ORM use
     "DESERIALIZE_RESPONSES": False,
@@ -56,22 +94,101 @@ class BatchRequestSettings(object):
         self.user_settings = user_settings or {}
         self.defaults = defaults or {}
         self.executor = self._executor()
+        self.response_cache = self._response_cache()
+        self.resolver_cache = self._resolver_cache()
+        self.bulkheads = self._bulkheads()
+        self.json_codec = import_class(self.JSON_CODEC)()
+        self.metrics_sink = self._metrics_sink()
+        self._check_compression()
 
     def _executor(self):
         '''
             Creating an ExecutorPool is a costly operation. Executor needs to be instantiated only once.
         '''
         executor_path = "batch_requests.concurrent.executor.SequentialExecutor"
+        options = {}
         if self.EXECUTE_PARALLEL:
             executor_path = self.CONCURRENT_EXECUTOR
+            options = self.CONCURRENT_EXECUTOR_OPTIONS
 
         executor_class = import_class(executor_path)
-        return executor_class(self.NUM_WORKERS, self.REQUEST_TIMEOUT)
+        return executor_class(
+            self.NUM_WORKERS, self.REQUEST_TIMEOUT,
+            queue_size=self.EXECUTOR_QUEUE_SIZE, queue_timeout=self.EXECUTOR_QUEUE_TIMEOUT,
+            batch_timeout=self.BATCH_TIMEOUT, **options
+        )
+
+    def _response_cache(self):
+        '''
+            The sub-response cache is shared by all the batches, if enabled.
+        '''
+        if not self.RESPONSE_CACHE:
+            return None
+
+        cache_class = import_class(self.RESPONSE_CACHE)
+        return cache_class(
+            max_entries=self.CACHE_MAX_ENTRIES, timeout=self.CACHE_TIMEOUT,
+            vary_headers=self.CACHE_VARY_HEADERS, backend=self.CACHE_BACKEND,
+        )
+
+    def _resolver_cache(self):
+        '''
+            The cache of resolved sub-request paths is shared by all the batches, if enabled.
+        '''
+        if not self.RESOLVER_CACHE_SIZE:
+            return None
+
+        return import_class("batch_requests.resolver.ResolverCache")(self.RESOLVER_CACHE_SIZE)
+
+    def _bulkheads(self):
+        '''
+            The per route concurrency limits are shared by all the batches, if any.
+        '''
+        if not self.ROUTE_CONCURRENCY_LIMITS:
+            return None
+
+        if not getattr(self.executor, "shares_bulkheads", True):
+            raise ImproperlyConfigured(
+                "ROUTE_CONCURRENCY_LIMITS can not be used with %s, its workers would each "
+                "limit only the sub-requests they run." % type(self.executor).__name__
+            )
+
+        return import_class("batch_requests.bulkheads.Bulkheads")(self.ROUTE_CONCURRENCY_LIMITS)
+
+    def _metrics_sink(self):
+        '''
+            The sink batch metrics are recorded to, if any.
+        '''
+        if not self.METRICS_SINK:
+            return None
+
+        return import_class(self.METRICS_SINK)(**self.METRICS_SINK_OPTIONS)
+
+    def _check_compression(self):
+        '''
+            Unknown COMPRESSION encodings fail here, rather than on every batch.
+        '''
+        import_class("batch_requests.compressors.check_encodings")(self.COMPRESSION)
+
+    def _envelopes(self):
+        '''
+            The formats batches can be exchanged in, the first one being the default.
+        '''
+        return [import_class(path)() for path in self.ENVELOPES]
 
     def __getattr__(self, attr):
         '''
             Override the attribute access behavior.
         '''
+        if attr == "envelopes":
+            # Envelopes depend on these settings, they are created on first use.
+            self.envelopes = self._envelopes()
+            return self.envelopes
+
+        if attr == "admission_controller":
+            # So does the admission controller.
+            self.admission_controller = import_class("batch_requests.admission.get_admission_controller")()
+            return self.admission_controller
 
         if attr not in self.defaults:
             raise AttributeError("Invalid API setting: '%s'" % attr)
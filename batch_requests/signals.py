@@ -0,0 +1,16 @@
+'''
+@summary: Signals sent once a batch or one of its sub-requests is done, with the time
+          spent in each of their stages.
+'''
+from __future__ import absolute_import, unicode_literals
+
+from django.dispatch import Signal
+
+
+# Sent with request (the batch request), responses (the list of sub-responses, None
+# when streamed) and timings (a Timings).
+batch_finished = Signal()
+
+# Sent with request (the WSGIRequest of the sub-request), response (the sub-response
+# dict) and timings (a Timings).
+sub_request_finished = Signal()
@@ -5,8 +5,13 @@
 '''
 from __future__ import absolute_import, unicode_literals
 
+import io
+import re
+
 import six
-from django.test.client import RequestFactory, FakePayload
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from six.moves.urllib.parse import unquote_to_bytes, urlparse
 
 from batch_requests.settings import br_settings as _settings
 
@@ -17,79 +22,109 @@ WSGI_HEADERS = {
     "REMOTE_HOST", "REMOTE_USER", "REQUEST_METHOD", "SERVER_NAME",
     "SERVER_PORT",
 }
+CHARSET_RE = re.compile(r".*; charset=([\w\d-]+);?")
+
+
+def transform_header(header, _wsgi_headers=WSGI_HEADERS):
+    """Transform headers, if necessary
+
+    For every header, replace - to _, prepend http_ if necessary and
+    convert to upper case.
+    """
+    header = header.replace("-", "_").upper()
+    if header not in _wsgi_headers:
+        header = "HTTP_{header}".format(header=header)
+    return header
 
 
-class BatchRequestFactory(RequestFactory):
+def to_wsgi_str(value):
+    '''WSGI wants native strings, latin-1 decoded on Python 3.'''
+    return value.decode("iso-8859-1") if six.PY3 else value
 
+
+class SubRequestBuilder(object):
     '''
-        Extend the RequestFactory and update the environment variables for WSGI.
+        Builds the WSGI requests of the sub-requests of one batch request. The part of
+        the environ they inherit from the batch request is computed once, every
+        sub-request gets a copy of it.
     '''
 
-    def _base_environ(self, **request):
-        '''
-            Override the default values for the wsgi environment variables.
-        '''
+    def __init__(self, curr_request):
+        secure = _settings.USE_HTTPS
         # This is a minimal valid WSGI environ dictionary, plus:
         # - HTTP_COOKIE: for cookie support,
         # - REMOTE_ADDR: often useful, see #8551.
         # See http://www.python.org/dev/peps/pep-3333/#environ-variables
-
-        environ = {
-            'HTTP_COOKIE': self.cookies.output(header='', sep='; '),
-            'PATH_INFO': str('/'),
-            'REMOTE_ADDR': str('127.0.0.1'),
-            'REQUEST_METHOD': str('GET'),
-            'SCRIPT_NAME': str(''),
-            'SERVER_NAME': str('localhost'),
-            'SERVER_PORT': str('8000'),
-            'SERVER_PROTOCOL': str('HTTP/1.1'),
-            'wsgi.version': (1, 0),
-            'wsgi.url_scheme': str('http'),
-            'wsgi.input': FakePayload(b''),
-            'wsgi.errors': self.errors,
-            'wsgi.multiprocess': True,
-            'wsgi.multithread': True,
-            'wsgi.run_once': False,
+        self.base_environ = {
+            "HTTP_COOKIE": str(""),
+            "PATH_INFO": str("/"),
+            "QUERY_STRING": str(""),
+            "REMOTE_ADDR": str("127.0.0.1"),
+            "REQUEST_METHOD": str("GET"),
+            "SCRIPT_NAME": str(""),
+            "SERVER_NAME": str("localhost"),
+            "SERVER_PORT": str("443" if secure else "80"),
+            "SERVER_PROTOCOL": str("HTTP/1.1"),
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": str("https" if secure else "http"),
+            "wsgi.multiprocess": True,
+            "wsgi.multithread": True,
+            "wsgi.run_once": False,
+            "CONTENT_TYPE": _settings.DEFAULT_CONTENT_TYPE,
         }
-        environ.update(self.defaults)
-        environ.update(request)
-        return environ
+        self.base_environ.update({
+            h: v for h, v in six.iteritems(curr_request.META)
+            if h in _settings.HEADERS_TO_INCLUDE
+        })
+
+    def get_body_bytes(self, body, content_type):
+        if isinstance(body, six.binary_type):
+            return body
+
+        match = CHARSET_RE.match(content_type)
+        charset = match.group(1) if match else settings.DEFAULT_CHARSET
+        return six.text_type(body).encode(charset)
+
+    def build(self, method, url, headers, body):
+        '''
+            Returns the WSGIRequest for the given method, url, headers and body.
+        '''
+        environ = self.base_environ.copy()
+        # Override existing batch requests headers with the new headers passed for this request.
+        environ.update({transform_header(h): v for h, v in six.iteritems(headers)})
+
+        parsed = urlparse(url)
+        path = parsed.path
+        if parsed.params:
+            path += ";" + parsed.params
+        environ["PATH_INFO"] = to_wsgi_str(unquote_to_bytes(path))
+        environ["QUERY_STRING"] = to_wsgi_str(parsed.query.encode("utf-8"))
+        environ["REQUEST_METHOD"] = str(method)
+
+        body = self.get_body_bytes(body or b"", environ["CONTENT_TYPE"])
+        if body:
+            environ["CONTENT_LENGTH"] = str(len(body))
+        # BytesIO shares the buffer of the bytes it is given until written to.
+        environ["wsgi.input"] = io.BytesIO(body)
+        # Every sub-request writes its own errors, possibly from its own thread.
+        environ["wsgi.errors"] = io.BytesIO()
+
+        return WSGIRequest(environ)
+
+
+def get_sub_request_builder(curr_request):
+    '''
+        Returns the SubRequestBuilder of the batch request, created on first use.
+    '''
+    builder = getattr(curr_request, "_batch_sub_request_builder", None)
+    if builder is None:
+        builder = SubRequestBuilder(curr_request)
+        curr_request._batch_sub_request_builder = builder
+    return builder
 
 
-def get_wsgi_request_object(
-    curr_request, method, url, headers, body,
-    REQUEST_FACTORY=BatchRequestFactory()  # purposefully using a shared instance
-):
+def get_wsgi_request_object(curr_request, method, url, headers, body):
     '''
         Based on the given request parameters, constructs and returns the WSGI request object.
     '''
-    def transform_header(header, _wsgi_headers=WSGI_HEADERS):
-        """Transform headers, if necessary
-
-        For every header, replace - to _, prepend http_ if necessary and
-        convert to upper case.
-        """
-        header = header.replace("-", "_").upper()
-        if header not in _wsgi_headers:
-            header = "HTTP_{header}".format(header=header)
-        return header
-
-    t_headers = {"CONTENT_TYPE": _settings.DEFAULT_CONTENT_TYPE}
-    t_headers.update({
-        transform_header(h): v for h, v in six.iteritems(headers)
-    })
-
-    # Override existing batch requests headers with the new headers passed for this request.
-    x_headers = {
-        h: v for h, v in six.iteritems(curr_request.META)
-        if h in _settings.HEADERS_TO_INCLUDE
-    }
-    x_headers.update(t_headers)
-
-    return getattr(REQUEST_FACTORY, method.lower())(
-        url,
-        data=body,
-        secure=_settings.USE_HTTPS,
-        content_type=x_headers.get("CONTENT_TYPE", _settings.DEFAULT_CONTENT_TYPE),
-        **x_headers
-    )
+    return get_sub_request_builder(curr_request).build(method, url, headers, body)
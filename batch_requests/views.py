@@ -7,7 +7,8 @@ from __future__ import absolute_import, unicode_literals
 
 import json
 import logging
-from datetime import datetime
+from collections import OrderedDict
+from contextlib import contextmanager
 
 import six
 from concurrent.futures import TimeoutError
@@ -17,13 +18,39 @@ from django.http.response import (
     HttpResponseBadRequest,
     HttpResponseNotFound,
     HttpResponseServerError,
+    StreamingHttpResponse,
 )
 from django.urls import resolve
 from django.urls.exceptions import Resolver404
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 
+from batch_requests.admission import admission_control
+from batch_requests.bulk import BulkCall, BulkGroup, fan_out_groups, get_bulk_handler
+from batch_requests.compression import compress_batch_response
+from batch_requests.concurrent.executor import acquire, monotonic
+from batch_requests.dedup import deduplicate, fan_out, fan_out_list, get_duplicates, in_order
+from batch_requests.dependencies import (
+    DependencyError,
+    DependencyGraph,
+    get_failed_dependency_response,
+    has_dependencies,
+)
+from batch_requests.encoding import RawJSON, encode, is_json_response, looks_like_json
+from batch_requests.envelopes import JSONEnvelope, get_request_envelope, get_response_envelope
 from batch_requests.exceptions import BadBatchRequest
+from batch_requests.handlers import get_handler, get_project_middleware
+from batch_requests.instrumentation import (
+    Timings,
+    finish_batch,
+    finish_streamed_batch,
+    finish_sub_request,
+    mark_queued,
+    start_sub_request,
+)
+from batch_requests.loaders import create_batch_context
+from batch_requests.queries import count_queries, create_query_counter
+from batch_requests.routers import create_batch_routing, route_queries
 from batch_requests.settings import br_settings as _settings
 from batch_requests.utils import get_wsgi_request_object
 
@@ -32,6 +59,8 @@ log = logging.getLogger(__name__)
 
 
 DURATION_HEADER_NAME = _settings.DURATION_HEADER_NAME
+JSON_ENVELOPE = JSONEnvelope()
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
 UNKNOWN_STATUSES = {
     207: "Multiple Statuses",
     429: "Too Many Requests",
@@ -42,14 +71,6 @@ VALID_HTTP_METHODS = {
 }
 
 
-class BytesEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, six.binary_type):
-            return obj.decode("utf-8")
-
-        return super(BytesEncoder, self).default(obj)
-
-
 class SetEncoder(json.JSONEncoder):
     def default(self, obj):
         if isinstance(obj, (set, frozenset)):
@@ -58,18 +79,22 @@ class SetEncoder(json.JSONEncoder):
         return super(SetEncoder, self).default(obj)
 
 
+def get_timeout_response():
+    return {
+        "status_code": 408,
+        "reason_phrase": "Request Timeout",
+        "body": "",
+        "headers": {},
+    }
+
+
 def timeout_result_handler(future, timeout=None):
     """Allow timing out concurrent requests"""
 
     try:
         result = future.result(timeout=timeout)
     except TimeoutError:
-        result = {
-            "status_code": 408,
-            "reason_phrase": "Request Timeout",
-            "body": "",
-            "headers": {},
-        }
+        result = get_timeout_response()
 
     return result
 
@@ -77,8 +102,12 @@ def timeout_result_handler(future, timeout=None):
 def handle_sub_response_body(response):
     body = getattr(response, "rendered_content", None) or response.content
     if body and _settings.DESERIALIZE_RESPONSES:
+        if is_json_response(response) and looks_like_json(body):
+            # Embed the body of the view in the batch response as it is. Anything else
+            # is parsed, or passed on as a string, so the batch response stays JSON.
+            return RawJSON(body)
         try:
-            return json.loads(body)
+            return _settings.json_codec.loads(body)
         except ValueError:
             pass  # fall through and just return body
 
@@ -93,58 +122,395 @@ def handle_sub_reason_phrase(response, unknown=UNKNOWN_STATUSES):
     return response.reason_phrase
 
 
-def construct_duration_header(duration):
-    return duration.seconds + (duration.microseconds / 1000000.0)
+def add_duration_header(d_resp, timings):
+    d_resp["headers"][DURATION_HEADER_NAME] = timings.elapsed()
 
 
-def add_duration_header(resp, start, end):
-    resp["headers"][DURATION_HEADER_NAME] = construct_duration_header(end - start)
+def build_sub_response(resp, timings):
+    '''
+        Converts the HTTP response of a sub-request into a simple dict.
+    '''
+    d_resp = {
+        "status_code": resp.status_code,
+        "reason_phrase": handle_sub_reason_phrase(resp),
+        "headers": {k: v for k, v in six.itervalues(resp._headers)},
+        "body": handle_sub_response_body(resp),
+    }
 
+    # Check if we need to send across the duration header.
+    if _settings.ADD_DURATION_HEADER:
+        add_duration_header(d_resp, timings)
 
-def get_response(wsgi_request):
+    return d_resp
+
+
+def resolve_view(path):
+    '''
+        Returns the ResolverMatch for the path, through the resolver cache if enabled.
+    '''
+    cache = _settings.resolver_cache
+    if cache is None:
+        return resolve(path)
+
+    return cache.resolve(path)
+
+
+def get_resolver_match(wsgi_request):
+    '''
+        Returns the ResolverMatch of the request, resolving its path on first use only.
+    '''
+    match = wsgi_request.resolver_match
+    if match is None:
+        match = wsgi_request.resolver_match = resolve_view(wsgi_request.path_info)
+    return match
+
+
+def get_view_response(wsgi_request, timings=None):
     '''
         Given a WSGI request, makes a call to a corresponding view
-        function and returns the response.
+        function and returns its HTTP response.
     '''
-    resp = None
-    service_start_time = datetime.now()
+    timings = timings or Timings()
+    middleware = getattr(wsgi_request, "batch_middleware", None)
+    if middleware is not None:
+        # Let Django's handler machinery do its task.
+        try:
+            with timings.measure("view"):
+                return get_handler(middleware).get_response(wsgi_request)
+        except Exception as exc:
+            return HttpResponseServerError(content=str(exc))
+
     # Get the view / handler for this request
     try:
-        view, args, kwargs = resolve(wsgi_request.path_info)
+        with timings.measure("resolve"):
+            view, args, kwargs = get_resolver_match(wsgi_request)
     except Resolver404:
-        resp = HttpResponseNotFound()
+        return HttpResponseNotFound()
 
-    if resp is None:
-        kwargs.update({"request": wsgi_request})
+    kwargs = dict(kwargs, request=wsgi_request)
 
-        # Let the view do his task.
-        try:
-            resp = view(*args, **kwargs)
-        except Exception as exc:
-            resp = HttpResponseServerError(content=str(exc))
+    # Let the view do his task.
+    try:
+        with timings.measure("view"):
+            return view(*args, **kwargs)
+    except Exception as exc:
+        return HttpResponseServerError(content=str(exc))
 
-    # Convert HTTP response into simple dict type.
-    d_resp = {
-        "status_code": resp.status_code,
-        "reason_phrase": handle_sub_reason_phrase(resp),
-        "headers": {k: v for k, v in six.itervalues(resp._headers)},
-        "body": handle_sub_response_body(resp),
-    }
 
-    # Check if we need to send across the duration header.
+def get_bulkhead(wsgi_request):
+    '''
+        Returns the semaphore bounding the concurrency of the request's route, if any.
+    '''
+    bulkheads = _settings.bulkheads
+    if bulkheads is None:
+        return None
+
+    try:
+        match = get_resolver_match(wsgi_request)
+    except Resolver404:
+        return None
+
+    return bulkheads.get_semaphore(match)
+
+
+def mark_deadlines(wsgi_requests, executor, start, clock=monotonic):
+    '''
+        Notes on the sub-requests when the executor stops waiting for them, on the
+        monotonic clock, so that they do not wait for a bulkhead past it. `start` is
+        the start of the batch on the `clock` of the executor.
+    '''
+    offset = monotonic() - clock()
+    for wsgi_request in wsgi_requests:
+        deadline = executor.get_deadline(wsgi_request, start)
+        wsgi_request.batch_deadline = None if deadline is None else deadline + offset
+
+
+def get_bulkhead_timeout(wsgi_request):
+    '''
+        Returns how long the request may wait for a slot of a bulkhead, None for as
+        long as it takes: ROUTE_CONCURRENCY_TIMEOUT seconds, and never past its deadline.
+    '''
+    timeout = _settings.ROUTE_CONCURRENCY_TIMEOUT
+    deadline = getattr(wsgi_request, "batch_deadline", None)
+    if deadline is None:
+        return timeout
+
+    left = max(deadline - monotonic(), 0)
+    return left if timeout is None else min(timeout, left)
+
+
+@contextmanager
+def limit_concurrency(wsgi_request, timings):
+    '''
+        Holds a slot of the bulkhead of the request's route while the block runs,
+        waiting for one at most ROUTE_CONCURRENCY_TIMEOUT seconds, and not past the
+        deadline of the request. Yields whether the request may run.
+    '''
+    semaphore = get_bulkhead(wsgi_request)
+    if semaphore is None:
+        yield True
+        return
+
+    with timings.measure("bulkhead"):
+        admitted = acquire(semaphore, get_bulkhead_timeout(wsgi_request))
+    try:
+        yield admitted
+    finally:
+        if admitted:
+            semaphore.release()
+
+
+def get_too_many_requests_response():
+    return HttpResponse(status=429)
+
+
+def get_cached_response(wsgi_request, timings):
+    '''
+        Returns the cached sub-response for the request, if response caching is
+        enabled and there is one.
+    '''
+    cache = _settings.response_cache
+    if cache is None:
+        return None
+
+    with timings.measure("cache"):
+        d_resp = cache.get(wsgi_request)
+    if d_resp is None:
+        return None
+
+    d_resp["headers"][_settings.CACHE_HEADER_NAME] = "hit"
     if _settings.ADD_DURATION_HEADER:
-        add_duration_header(d_resp, service_start_time, datetime.now())
+        add_duration_header(d_resp, timings)
 
     return d_resp
 
 
-def get_wsgi_requests(request):
+def cache_response(wsgi_request, resp, d_resp):
+    cache = _settings.response_cache
+    if cache is not None:
+        cache.set(wsgi_request, resp, d_resp, exclude_headers={DURATION_HEADER_NAME})
+
+
+def get_response(wsgi_request):
     '''
-        For the given batch request, extract the individual requests and create
-        WSGIRequest object for each.
+        Given a WSGI request, makes a call to a corresponding view
+        function and returns the response.
+    '''
+    timings = start_sub_request(wsgi_request)
+    d_resp = get_cached_response(wsgi_request, timings)
+    if d_resp is None:
+        counter = create_query_counter([wsgi_request])
+        with limit_concurrency(wsgi_request, timings) as admitted, count_queries(counter), \
+                route_queries([wsgi_request]):
+            resp = get_view_response(wsgi_request, timings) if admitted else get_too_many_requests_response()
+        with timings.measure("serialise"):
+            d_resp = build_sub_response(resp, timings)
+        cache_response(wsgi_request, resp, d_resp)
+
+    finish_sub_request(wsgi_request, d_resp, timings)
+    return d_resp
+
+
+def get_bulk_group_key(wsgi_request):
     '''
-    body = request.body.decode('utf-8')
-    requests = json.loads(body)
+        Returns the (bulk handler, view, method) the request may be handed to, None if
+        its view has no bulk handler. Requests are only grouped with requests of the
+        same method, so that writes never share a call with reads.
+    '''
+    if getattr(wsgi_request, "batch_middleware", None) is not None:
+        return None
+
+    try:
+        view = get_resolver_match(wsgi_request).func
+    except Resolver404:
+        return None
+
+    handler = get_bulk_handler(view)
+    return None if handler is None else (handler, view, wsgi_request.method)
+
+
+def group_bulk_requests(wsgi_requests, executor=None):
+    '''
+        Groups the requests to views with a bulk handler. Returns the units to run,
+        requests or BulkGroup, and for each of them the indexes of the requests it
+        answers. Returns None as the indexes if there is no group, or if the executor
+        (the configured one by default) cannot run groups.
+    '''
+    executor = executor or _settings.executor
+    if not getattr(executor, "runs_bulk_groups", True):
+        return wsgi_requests, None
+
+    groups = OrderedDict()
+    for index, wsgi_request in enumerate(wsgi_requests):
+        key = get_bulk_group_key(wsgi_request)
+        groups.setdefault(key or index, []).append(index)
+
+    if all(len(indexes) == 1 for indexes in six.itervalues(groups)):
+        return wsgi_requests, None
+
+    units, positions = [], []
+    for key, indexes in six.iteritems(groups):
+        if len(indexes) == 1:
+            units.append(wsgi_requests[indexes[0]])
+        else:
+            handler, view, _ = key
+            calls = []
+            for index in indexes:
+                _, args, kwargs = get_resolver_match(wsgi_requests[index])
+                calls.append(BulkCall(wsgi_requests[index], args, kwargs))
+            units.append(BulkGroup(handler, view, calls))
+        positions.append(indexes)
+
+    return units, positions
+
+
+def call_bulk_handler(group, calls, timings):
+    '''
+        Returns the HTTP responses of the calls from the bulk handler of the group,
+        calling the view for those it does not answer.
+    '''
+    try:
+        with timings.measure("view"):
+            responses = list(group.handler(calls))
+        if len(responses) != len(calls):
+            raise ValueError("The bulk handler returned %d responses for %d requests." % (len(responses), len(calls)))
+    except Exception as exc:
+        return [HttpResponseServerError(content=str(exc)) for _ in calls]
+
+    for index, call in enumerate(calls):
+        if responses[index] is None:
+            try:
+                with timings.measure("view"):
+                    responses[index] = group.view(*call.args, request=call.request, **call.kwargs)
+            except Exception as exc:
+                responses[index] = HttpResponseServerError(content=str(exc))
+
+    return responses
+
+
+def get_bulk_responses(group):
+    '''
+        Returns the sub-responses of a BulkGroup, answering in one call all the requests
+        of the group which are not cached. They all get the time of the call in their
+        timings.
+    '''
+    requests = group.requests
+    timings = [start_sub_request(wsgi_request) for wsgi_request in requests]
+    d_resps = [get_cached_response(r, t) for r, t in zip(requests, timings)]
+
+    pending = [index for index, d_resp in enumerate(d_resps) if d_resp is None]
+    if pending:
+        calls = [group.calls[index] for index in pending]
+        group_timings = Timings()
+        counter = create_query_counter([call.request for call in calls])
+        with limit_concurrency(calls[0].request, group_timings) as admitted, count_queries(counter), \
+                route_queries([call.request for call in calls]):
+            if admitted:
+                responses = call_bulk_handler(group, calls, group_timings)
+            else:
+                responses = [get_too_many_requests_response() for _ in calls]
+
+        for index, resp in zip(pending, responses):
+            for stage, duration in six.iteritems(group_timings.durations):
+                timings[index].add(stage, duration)
+            with timings[index].measure("serialise"):
+                d_resps[index] = build_sub_response(resp, timings[index])
+            cache_response(requests[index], resp, d_resps[index])
+
+    for wsgi_request, d_resp, sub_timings in zip(requests, d_resps, timings):
+        finish_sub_request(wsgi_request, d_resp, sub_timings)
+    return d_resps
+
+
+def get_unit_response(unit):
+    '''Returns the sub-response of a request, or the list of those of a BulkGroup.'''
+    if isinstance(unit, BulkGroup):
+        return get_bulk_responses(unit)
+    return get_response(unit)
+
+
+def validate_request_data(data, valid_http_methods=VALID_HTTP_METHODS):
+    '''
+        Makes sure the definition of a single request is valid.
+    '''
+    url = data.get("url", None)
+    method = data.get("method", None)
+
+    if url is None or method is None:
+        raise BadBatchRequest("Request definition should have url, method defined.")
+
+    if method.upper() not in valid_http_methods:
+        raise BadBatchRequest("Invalid request method.")
+
+    timeout = data.get("timeout", None)
+    if timeout is not None:
+        valid_timeout = isinstance(timeout, six.integer_types + (float,)) and not isinstance(timeout, bool)
+        if not valid_timeout or timeout <= 0:
+            raise BadBatchRequest("Request timeout should be a positive number of seconds.")
+
+    middleware = data.get("middleware", None)
+    if middleware is not None:
+        if not isinstance(middleware, (list, tuple)):
+            raise BadBatchRequest("Request middleware should be a list.")
+
+        allowed = get_allowed_middleware()
+        not_allowed = [m for m in middleware if m not in allowed]
+        if not_allowed:
+            raise BadBatchRequest("Middleware not allowed: %s." % ", ".join(map(six.text_type, not_allowed)))
+
+    name = data.get("name", None)
+    if name is not None and not isinstance(name, six.string_types):
+        raise BadBatchRequest("Request name should be a string.")
+
+    depends_on = data.get("depends_on", None)
+    if depends_on is not None and not isinstance(depends_on, six.string_types):
+        valid_depends_on = isinstance(depends_on, (list, tuple)) and \
+            all(isinstance(dependency, six.string_types) for dependency in depends_on)
+        if not valid_depends_on:
+            raise BadBatchRequest("depends_on should be a list of request names.")
+
+    read_replica = data.get("read_replica", None)
+    if read_replica is not None and not isinstance(read_replica, bool):
+        raise BadBatchRequest("Request read_replica should be a boolean.")
+
+
+def get_allowed_middleware():
+    '''
+        Returns the middleware sub-requests go through, an empty list if they
+        go straight to the view.
+    '''
+    if not _settings.USE_MIDDLEWARE:
+        return []
+
+    if _settings.SUB_REQUEST_MIDDLEWARE is None:
+        return get_project_middleware()
+
+    return list(_settings.SUB_REQUEST_MIDDLEWARE)
+
+
+def get_request_middleware(data):
+    '''
+        Returns the middleware the request should go through, None to call the view
+        directly. A request may pick some of the allowed middleware, their order
+        stays the configured one.
+    '''
+    if not _settings.USE_MIDDLEWARE:
+        return None
+
+    allowed = get_allowed_middleware()
+    requested = data.get("middleware", None)
+    if requested is None:
+        return tuple(allowed)
+
+    return tuple(m for m in allowed if m in requested)
+
+
+def get_requests_data(request):
+    '''
+        For the given batch request, extract and validate the definitions of the
+        individual requests.
+    '''
+    requests = get_request_envelope(request).loads(request.body)
 
     if not isinstance(requests, (list, tuple)):
         raise BadBatchRequest("The body of batch request should always be list!")
@@ -152,88 +518,279 @@ def get_wsgi_requests(request):
     if len(requests) > _settings.MAX_LIMIT:
         raise BadBatchRequest("You can batch maximum of %d requests." % (_settings.MAX_LIMIT))
 
-    # We could mutate the current request with the respective parameters, but
-    # mutation is ghost in the dark, so lets avoid. Construct the new WSGI
-    # request object for each request.
-    def construct_wsgi_from_data(data, valid_http_methods=VALID_HTTP_METHODS):
-        '''
-            Given the data in the format of url, method, body and headers, construct a new
-            WSGIRequest object.
-        '''
-        url = data.get("url", None)
-        method = data.get("method", None)
+    for data in requests:
+        validate_request_data(data)
+
+    return requests
+
+
+# We could mutate the current request with the respective parameters, but
+# mutation is ghost in the dark, so lets avoid. Construct the new WSGI
+# request object for each request.
+def construct_wsgi_from_data(request, data):
+    '''
+        Given the data in the format of url, method, body and headers, construct a new
+        WSGIRequest object.
+    '''
+    # support singly/doubly encoded JSON
+    body = data.get("body", "")
+    if isinstance(body, dict):
+        # Bodies from binary envelopes may hold bytes, encoded as UTF-8 text.
+        body = encode(body).decode("utf-8")
+    headers = data.get("headers", {})
+    wsgi_request = get_wsgi_request_object(request, data["method"].upper(), data["url"], headers, body)
+
+    # Lets the executor stop waiting for this request once its time is up.
+    wsgi_request.batch_timeout = data.get("timeout", None)
+    wsgi_request.batch_middleware = get_request_middleware(data)
+    wsgi_request.batch_context = getattr(request, "batch_context", None)
 
-        if url is None or method is None:
-            raise BadBatchRequest("Request definition should have url, method defined.")
+    # Sub-requests are constructed in the order of the batch, writes stick the next ones to the primary.
+    routing = getattr(request, "batch_routing", None)
+    if routing is not None:
+        routing.add(wsgi_request, data)
 
-        method = method.upper()
-        if method not in valid_http_methods:
-            raise BadBatchRequest("Invalid request method.")
+    # Share what middleware already computed for the batch request, e.g. the user.
+    for attr in _settings.SHARED_REQUEST_ATTRIBUTES:
+        if hasattr(request, attr):
+            setattr(wsgi_request, attr, getattr(request, attr))
 
-        # support singly/doubly encoded JSON
-        body = data.get("body", "")
-        if isinstance(body, dict):
-            body = json.dumps(body, cls=BytesEncoder)
-        headers = data.get("headers", {})
-        return get_wsgi_request_object(request, method, url, headers, body)
+    return wsgi_request
 
-    return (construct_wsgi_from_data(data) for data in requests)
+
+def get_wsgi_requests(request):
+    '''
+        For the given batch request, extract the individual requests and create
+        WSGIRequest object for each.
+    '''
+    return [construct_wsgi_from_data(request, data) for data in get_requests_data(request)]
 
 
-def execute_requests(wsgi_requests):
+def prepare_layer(request, graph, layer, responses):
+    '''
+        Returns the list of (index, WSGIRequest) to run for the given layer of the
+        dependency graph. Requests whose dependencies failed are answered right away.
+    '''
+    runnable = []
+    for index in layer:
+        try:
+            data = graph.prepare(index, responses)
+        except DependencyError as exc:
+            responses[index] = get_failed_dependency_response(six.text_type(exc))
+        else:
+            runnable.append((index, construct_wsgi_from_data(request, data)))
+
+    return runnable
+
+
+def execute_requests(wsgi_requests, start=None):
     '''
         Execute the requests either sequentially or in parallel based on parallel
-        execution setting.
+        execution setting. Their deadlines count from `start`, now by default.
     '''
-    return _settings.executor.execute(
-        wsgi_requests, get_response, result_handler=timeout_result_handler
+    start = monotonic() if start is None else start
+    mark_queued(wsgi_requests)
+    mark_deadlines(wsgi_requests, _settings.executor, start)
+    units, positions = group_bulk_requests(wsgi_requests)
+    if positions is None:
+        return _settings.executor.execute(
+            wsgi_requests, get_response, result_handler=timeout_result_handler, start=start
+        )
+
+    results = _settings.executor.execute(
+        units, get_unit_response, result_handler=timeout_result_handler, start=start
     )
+    return [result for _, result in in_order(fan_out_groups(enumerate(results), positions))]
 
 
-@csrf_exempt
-@require_http_methods(["POST"])
-def handle_batch_requests(request, *args, **kwargs):
+def execute_dependent_requests(request, graph):
     '''
-        A view function to handle the overall processing of batch requests.
+        Execute the requests layer by layer, following the dependency graph. Every
+        layer runs like a batch of its own, the deadlines of all counting from the
+        start of the first one.
     '''
-    try:
-        # Get the Individual WSGI requests.
-        wsgi_requests = get_wsgi_requests(request)
-    except BadBatchRequest as brx:
-        return HttpResponseBadRequest(content=six.text_type(brx))
+    start = monotonic()
+    responses = [None] * len(graph.requests)
+    for layer in graph.layers:
+        runnable = prepare_layer(request, graph, layer, responses)
+        results = execute_requests([wsgi_request for _, wsgi_request in runnable], start)
+        for (index, _), result in zip(runnable, results):
+            responses[index] = result
 
-    batch_start_time = datetime.now()
+    return responses
 
-    # Fire these WSGI requests, and collect the response for the same.
-    try:
-        response = execute_requests(wsgi_requests)
-    except BadBatchRequest as brx:
-        return HttpResponseBadRequest(content=six.text_type(brx))
 
-    batch_end_time = datetime.now()
-    BATCH_RESPONSE_STATUS = _settings.BATCH_RESPONSE_STATUS
+def stream_requests(wsgi_requests, in_order=True):
+    '''
+        Same as execute_requests, but returns an iterator over (index, response), in
+        order or as the responses complete. Requests handed to a bulk handler come
+        together, in the order of their group.
+    '''
+    start = monotonic()
+    mark_queued(wsgi_requests)
+    mark_deadlines(wsgi_requests, _settings.executor, start)
+    units, positions = group_bulk_requests(wsgi_requests)
+    if positions is None:
+        return _settings.executor.iter_execute(
+            wsgi_requests, get_response, result_handler=timeout_result_handler, in_order=in_order, start=start
+        )
+
+    return fan_out_groups(_settings.executor.iter_execute(
+        units, get_unit_response, result_handler=timeout_result_handler, in_order=in_order, start=start
+    ), positions)
+
+
+def stream_ndjson(responses):
+    '''
+        Encodes the (index, response) one at a time, as newline delimited JSON. Each
+        response carries its index in the batch since they come in any order.
+    '''
+    for index, response in responses:
+        entry = dict(response, index=index)
+        yield encode(entry) + b"\n"
+
+
+def accepts_ndjson(request):
+    return NDJSON_CONTENT_TYPE in request.META.get("HTTP_ACCEPT", "")
 
-    # Evrything's done, return the response.
-    resp_kwargs = {
-        "content": json.dumps(response, cls=BytesEncoder),
-        "content_type": "application/json",
-        "status": BATCH_RESPONSE_STATUS,
-    }
+
+def get_batch_response(response_cls, **kwargs):
+    '''
+        Instantiates the batch response with the configured status and headers.
+    '''
+    BATCH_RESPONSE_STATUS = _settings.BATCH_RESPONSE_STATUS
+    kwargs["status"] = BATCH_RESPONSE_STATUS
 
     # handle STDLIB unknown reason phrases
     batch_reason = UNKNOWN_STATUSES.get(BATCH_RESPONSE_STATUS, None)
     if batch_reason:
-        resp_kwargs["reason"] = batch_reason
+        kwargs["reason"] = batch_reason
 
-    resp = HttpResponse(**resp_kwargs)
+    resp = response_cls(**kwargs)
 
     if _settings.DISALLOW_CACHING:
         resp["Cache-Control"] = "Private"
 
-    if _settings.ADD_DURATION_HEADER:
-        resp[DURATION_HEADER_NAME] = construct_duration_header(batch_end_time - batch_start_time)
-
     if settings.DEBUG:
         resp[_settings.DEBUG_HEADER_NAME] = json.dumps(_settings.as_dict(), cls=SetEncoder)
+        if _settings.response_cache is not None:
+            resp[_settings.CACHE_HEADER_NAME] = json.dumps(_settings.response_cache.stats())
+
+    return resp
+
+
+def build_batch_response(response, timings, envelope=JSON_ENVELOPE):
+    '''
+        Encodes the sub-responses into the batch response, in the given envelope.
+    '''
+    resp = get_batch_response(
+        HttpResponse,
+        content=envelope.dumps(response),
+        content_type=envelope.content_type,
+    )
+
+    if _settings.ADD_DURATION_HEADER:
+        resp[DURATION_HEADER_NAME] = timings.elapsed()
 
     return resp
+
+
+def get_unique_requests(requests_data):
+    '''
+        Returns the requests to run, and for each of them the list of indexes in the
+        batch it answers. Identical safe requests run once if deduplication is enabled.
+    '''
+    if _settings.DEDUPLICATE_REQUESTS:
+        return deduplicate(requests_data)
+
+    return requests_data, [[index] for index in range(len(requests_data))]
+
+
+def add_deduplication_header(resp, positions):
+    '''
+        Tells which requests were answered with the response of another one, in DEBUG.
+    '''
+    duplicates = get_duplicates(positions) if positions else None
+    if settings.DEBUG and duplicates:
+        resp[_settings.DEDUPLICATION_HEADER_NAME] = json.dumps(duplicates, sort_keys=True)
+
+
+def stream_batch_response(request, wsgi_requests, positions):
+    '''
+        Streams the sub-responses as they become available. The whole batch response
+        is never held in memory, and there is no batch duration header since the
+        headers go out before the sub-requests are done.
+    '''
+    envelope = get_response_envelope(request)
+    if isinstance(envelope, JSONEnvelope) and accepts_ndjson(request):
+        responses = fan_out(stream_requests(wsgi_requests, in_order=False), positions)
+        content = stream_ndjson(responses)
+        content_type = NDJSON_CONTENT_TYPE
+    else:
+        responses = in_order(fan_out(stream_requests(wsgi_requests), positions))
+        length = sum(len(indexes) for indexes in positions)
+        content = envelope.iter_array((response for _, response in responses), length)
+        content_type = envelope.content_type
+
+    resp = get_batch_response(
+        StreamingHttpResponse, streaming_content=content, content_type=content_type
+    )
+    add_deduplication_header(resp, positions)
+    return resp
+
+
+def respond(request, response, timings, positions=None):
+    '''
+        Returns the batch response for the sub-responses, encoded and compressed as
+        negotiated with the client, and reports the timings of the batch.
+    '''
+    with timings.measure("serialise"):
+        resp = build_batch_response(response, timings, get_response_envelope(request))
+        add_deduplication_header(resp, positions)
+        resp = compress_batch_response(request, resp, response)
+
+    finish_batch(request, resp, response, timings)
+    return resp
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+@admission_control
+def handle_batch_requests(request, *args, **kwargs):
+    '''
+        A view function to handle the overall processing of batch requests.
+    '''
+    timings = Timings()
+    request.batch_context = create_batch_context()
+    request.batch_routing = create_batch_routing()
+    try:
+        with timings.measure("parse"):
+            requests_data = get_requests_data(request)
+            graph = DependencyGraph(requests_data) if has_dependencies(requests_data) else None
+    except BadBatchRequest as brx:
+        return HttpResponseBadRequest(content=six.text_type(brx))
+
+    if graph is not None:
+        # Sub-requests of later layers are constructed along the way.
+        with timings.measure("execute"):
+            response = execute_dependent_requests(request, graph)
+        return respond(request, response, timings)
+
+    # Get the Individual WSGI requests.
+    with timings.measure("construct"):
+        unique_data, positions = get_unique_requests(requests_data)
+        wsgi_requests = [construct_wsgi_from_data(request, data) for data in unique_data]
+
+    if _settings.STREAM_RESPONSES:
+        resp = compress_batch_response(request, stream_batch_response(request, wsgi_requests, positions))
+        return finish_streamed_batch(request, resp, timings)
+
+    # Fire these WSGI requests, and collect the response for the same.
+    try:
+        with timings.measure("execute"):
+            response = fan_out_list(execute_requests(wsgi_requests), positions)
+    except BadBatchRequest as brx:
+        return HttpResponseBadRequest(content=six.text_type(brx))
+
+    # Evrything's done, return the response.
+    return respond(request, response, timings, positions)
@@ -0,0 +1,3 @@
+'''
+@summary: Benchmarks for the batch request pipeline, see benchmarks.run.
+'''
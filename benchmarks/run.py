@@ -0,0 +1,278 @@
+#! /usr/bin/env python
+'''
+@summary: Benchmarks the stages of the batch request pipeline separately (parse,
+          construct, resolve, dispatch, serialise) and as a whole, over batch sizes,
+          body sizes, executors, JSON codecs and CPU / IO bound views. Results are written as JSON,
+          and can be compared to the results of an earlier run to catch regressions.
+
+          python -m benchmarks.run --output results.json
+          python -m benchmarks.run --compare baseline.json --threshold 0.2
+'''
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import argparse
+import json
+import platform
+import sys
+import time
+from timeit import default_timer
+
+import django
+from django.conf import settings
+
+
+EXECUTORS = {
+    "adaptive": "batch_requests.concurrent.adaptive.AdaptiveExecutor",
+    "sequential": "batch_requests.concurrent.executor.SequentialExecutor",
+    "thread": "batch_requests.concurrent.executor.ThreadBasedExecutor",
+    "process": "batch_requests.concurrent.executor.ProcessBasedExecutor",
+}
+CODECS = {
+    "json": "batch_requests.json_codecs.StdlibCodec",
+    "msgspec": "batch_requests.json_codecs.MsgspecCodec",
+    "orjson": "batch_requests.json_codecs.OrjsonCodec",
+    "ujson": "batch_requests.json_codecs.UjsonCodec",
+}
+VIEW_URLS = {
+    "cpu": "/cpu/?n=20000",
+    "io": "/io/?ms=5",
+}
+NUM_WORKERS = 8
+
+
+def configure():
+    '''Configures a minimal Django project, unless running within one already.'''
+    if settings.configured:
+        return
+
+    settings.configure(
+        DEBUG=False,
+        SECRET_KEY="benchmarks",
+        ROOT_URLCONF="benchmarks.urls",
+        INSTALLED_APPS=("batch_requests",),
+        MIDDLEWARE=[],
+        BATCH_REQUESTS={"MAX_LIMIT": 1000, "ADD_DURATION_HEADER": True},
+    )
+    django.setup()
+
+
+def measure(fn, repeat):
+    '''Runs fn `repeat` times, returns the timings in milliseconds, and its last result.'''
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = default_timer()
+        result = fn()
+        timings.append((default_timer() - start) * 1000.0)
+
+    return timings, result
+
+
+def summarize(timings):
+    ordered = sorted(timings)
+    middle = len(ordered) // 2
+    median = ordered[middle] if len(ordered) % 2 else (ordered[middle - 1] + ordered[middle]) / 2.0
+    return {
+        "min_ms": ordered[0],
+        "median_ms": median,
+        "mean_ms": sum(ordered) / len(ordered),
+        "max_ms": ordered[-1],
+    }
+
+
+def get_batch_body(view, batch_size, body_size):
+    body = "x" * body_size
+    return json.dumps([
+        {"method": "post", "url": VIEW_URLS[view], "body": body, "headers": {"content_type": "text/plain"}}
+        for _ in range(batch_size)
+    ])
+
+
+def bench_scenario(codec, view, batch_size, body_size, executors, repeat):
+    '''
+        Benchmarks all the stages for one combination of view, batch size and body size.
+        Returns the list of results.
+    '''
+    from django.test import RequestFactory
+
+    from batch_requests.settings import br_settings, import_class
+    from batch_requests.encoding import encode
+    from batch_requests.views import (
+        construct_wsgi_from_data,
+        get_requests_data,
+        get_response,
+        handle_batch_requests,
+        resolve_view,
+        timeout_result_handler,
+    )
+
+    batch_body = get_batch_body(view, batch_size, body_size)
+
+    def batch_request():
+        return RequestFactory().post("/api/v1/batch/", batch_body, content_type="application/json")
+
+    parent = batch_request()
+    requests_data = get_requests_data(parent)
+    wsgi_requests = [construct_wsgi_from_data(parent, data) for data in requests_data]
+
+    stages = [
+        ("parse", None, lambda: get_requests_data(parent)),
+        ("construct", None, lambda: [construct_wsgi_from_data(parent, data) for data in requests_data]),
+        ("resolve", None, lambda: [resolve_view(r.path_info) for r in wsgi_requests]),
+    ]
+
+    responses = None
+    orig_executor = br_settings.executor
+    try:
+        for name in executors:
+            executor = import_class(EXECUTORS[name])(NUM_WORKERS)
+            # Start the pool up front, it is shared by all the batches of a process.
+            executor.get_executor_pool()
+            br_settings.executor = executor
+            try:
+                dispatch_timings, responses = measure(
+                    lambda: executor.execute(
+                        [construct_wsgi_from_data(parent, data) for data in requests_data],
+                        get_response, result_handler=timeout_result_handler,
+                    ),
+                    repeat,
+                )
+                end_to_end_timings, _ = measure(lambda: handle_batch_requests(batch_request()), repeat)
+            finally:
+                executor.shutdown()
+
+            stages.append(("dispatch", name, dispatch_timings))
+            stages.append(("end_to_end", name, end_to_end_timings))
+    finally:
+        br_settings.executor = orig_executor
+
+    if responses is not None:
+        stages.append(("serialise", None, lambda: encode(responses)))
+
+    results = []
+    for stage, executor, fn_or_timings in stages:
+        timings = fn_or_timings if isinstance(fn_or_timings, list) else measure(fn_or_timings, repeat)[0]
+        result = {
+            "stage": stage,
+            "codec": codec,
+            "executor": executor,
+            "view": view,
+            "batch_size": batch_size,
+            "body_size": body_size,
+            "repeat": repeat,
+        }
+        result.update(summarize(timings))
+        results.append(result)
+
+    return results
+
+
+def run_benchmarks(batch_sizes=(1, 5, 20), body_sizes=(0, 1024, 65536),
+                   executors=("sequential", "thread", "process"), views=("cpu", "io"),
+                   codecs=("json",), repeat=20):
+    '''
+        Runs the benchmarks for all the combinations, returns the report as a dict.
+        Codecs whose library is not installed are skipped.
+    '''
+    from django.core.exceptions import ImproperlyConfigured
+    from django.test.utils import override_settings
+
+    configure()
+
+    import batch_requests
+    from batch_requests.settings import br_settings, import_class
+
+    results = []
+    orig_codec = br_settings.json_codec
+    try:
+        for codec in codecs:
+            try:
+                br_settings.json_codec = import_class(CODECS[codec])()
+            except ImproperlyConfigured as exc:
+                print("Skipping the %s codec: %s" % (codec, exc), file=sys.stderr)
+                continue
+
+            # Pool threads and processes do not see a URLconf set per thread, override it globally.
+            with override_settings(ROOT_URLCONF="benchmarks.urls"):
+                for view in views:
+                    for batch_size in batch_sizes:
+                        for body_size in body_sizes:
+                            results.extend(bench_scenario(codec, view, batch_size, body_size, executors, repeat))
+    finally:
+        br_settings.json_codec = orig_codec
+
+    return {
+        "version": batch_requests.__version__,
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "results": results,
+    }
+
+
+def get_result_key(result):
+    return (result.get("codec", "json"),) + tuple(
+        result[k] for k in ("stage", "executor", "view", "batch_size", "body_size")
+    )
+
+
+def compare(report, baseline, threshold):
+    '''
+        Returns the list of (key, baseline median, median) for the results whose median
+        grew by more than `threshold` (a ratio) since the baseline.
+    '''
+    baseline_results = {get_result_key(r): r for r in baseline["results"]}
+    regressions = []
+    for result in report["results"]:
+        before = baseline_results.get(get_result_key(result), None)
+        if before is None:
+            continue
+        if result["median_ms"] > before["median_ms"] * (1 + threshold):
+            regressions.append((get_result_key(result), before["median_ms"], result["median_ms"]))
+
+    return regressions
+
+
+def parse_list(value, cast=str):
+    return [cast(v) for v in value.split(",") if v]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the batch request pipeline.")
+    parser.add_argument("--batch-sizes", default="1,5,20", type=lambda v: parse_list(v, int))
+    parser.add_argument("--body-sizes", default="0,1024,65536", type=lambda v: parse_list(v, int))
+    parser.add_argument("--executors", default=",".join(sorted(EXECUTORS)), type=parse_list)
+    parser.add_argument("--views", default=",".join(sorted(VIEW_URLS)), type=parse_list)
+    parser.add_argument("--codecs", default="json", type=parse_list,
+                        help="Any of %s, json by default." % ", ".join(sorted(CODECS)))
+    parser.add_argument("--repeat", default=20, type=int)
+    parser.add_argument("--output", help="Write the results to this file, instead of stdout.")
+    parser.add_argument("--compare", help="Compare the results to those of an earlier run.")
+    parser.add_argument("--threshold", default=0.1, type=float,
+                        help="Slow down ratio considered a regression, 0.1 by default.")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(
+        batch_sizes=args.batch_sizes, body_sizes=args.body_sizes,
+        executors=args.executors, views=args.views, codecs=args.codecs, repeat=args.repeat,
+    )
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        for key, before, after in regressions:
+            print("Regression in %s: %.3fms -> %.3fms" % (key, before, after), file=sys.stderr)
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,11 @@
+from django.conf.urls import url
+
+from batch_requests.views import handle_batch_requests
+from benchmarks.views import cpu_view, io_view
+
+
+urlpatterns = [
+    url(r'^cpu/', cpu_view),
+    url(r'^io/', io_view),
+    url(r'^api/v1/batch/', handle_batch_requests),
+]
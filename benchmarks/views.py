@@ -0,0 +1,28 @@
+'''
+@summary: Stub views for benchmarking, one CPU bound and one IO bound.
+'''
+from __future__ import unicode_literals
+
+from time import sleep
+
+from django.http.response import HttpResponse
+
+
+def cpu_view(request):
+    '''
+        Burns CPU for `n` iterations, then echoes the request body back.
+    '''
+    total = 0
+    for i in range(int(request.GET.get("n", "20000"))):
+        total += i * i
+
+    return HttpResponse(request.body or str(total))
+
+
+def io_view(request):
+    '''
+        Waits for `ms` milliseconds, like a view waiting on a database, then echoes the
+        request body back.
+    '''
+    sleep(int(request.GET.get("ms", "5")) / 1000.0)
+    return HttpResponse(request.body or "done")
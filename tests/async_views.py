@@ -0,0 +1,24 @@
+'''
+@summary: Async views for testing the async batch view, Python 3 only.
+'''
+from __future__ import unicode_literals
+
+import asyncio
+
+from django.http.response import HttpResponse
+
+
+CANCELLED = []
+
+
+async def async_sleeping_view(request):
+    '''
+        Sleep for the number of seconds passed, without holding a thread.
+    '''
+    try:
+        await asyncio.sleep(float(request.GET.get("seconds", "1")))
+    except asyncio.CancelledError:
+        CANCELLED.append(request.get_full_path())
+        raise
+
+    return HttpResponse("Success!")
@@ -0,0 +1,31 @@
+'''
+@summary: Middleware for testing sub-requests going through the middleware stack.
+'''
+from __future__ import unicode_literals
+
+
+class HeaderMiddleware(object):
+    '''
+        Adds a header to every response.
+    '''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        response["X-Header-Middleware"] = "yes"
+        return response
+
+
+class AttributeMiddleware(object):
+    '''
+        Sets an attribute on every request.
+    '''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.middleware_attribute = "set"
+        return self.get_response(request)
@@ -0,0 +1,138 @@
+'''
+@summary: Test cases for the executor choosing between running sub-requests inline and
+          in the thread pool.
+'''
+from __future__ import absolute_import, unicode_literals
+
+import json
+import threading
+
+import mock
+from django.test import RequestFactory, SimpleTestCase
+
+from batch_requests.concurrent.adaptive import AdaptiveExecutor, RouteLatencies
+from batch_requests.settings import BatchRequestSettings, DEFAULTS, br_settings as _settings
+from tests.test_base import TestBase
+
+
+def get_thread(request):
+    return threading.current_thread()
+
+
+class TestRouteLatencies(SimpleTestCase):
+    '''
+        Tests the moving average of route latencies.
+    '''
+
+    def test_moving_average(self):
+        latencies = RouteLatencies(alpha=0.5)
+        self.assertIsNone(latencies.get("view"))
+
+        latencies.update("view", 1.0)
+        latencies.update("view", 3.0)
+        self.assertEqual(latencies.get("view"), 2.0)
+
+
+class TestAdaptiveExecutor(SimpleTestCase):
+    '''
+        Tests which sub-requests are run inline and which in the pool.
+    '''
+
+    def setUp(self):
+        self.executor = AdaptiveExecutor(2)
+        factory = RequestFactory()
+        self.cheap = factory.get("/views/")
+        self.slow = factory.get("/sleep/")
+        self.executor.latencies.update(self.executor.get_route(self.cheap), 0.0001)
+        self.executor.latencies.update(self.executor.get_route(self.slow), 1.0)
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def test_routes(self):
+        self.assertEqual(self.executor.get_route(self.cheap), "tests.test_views.SimpleView")
+        self.assertIsNone(self.executor.get_route(RequestFactory().get("/unknown/")))
+        self.assertIsNone(self.executor.get_route(1))
+
+    def test_plan(self):
+        unknown = RequestFactory().get("/echo/")
+        _, in_pool = self.executor.plan([self.cheap, self.slow, unknown])
+
+        self.assertEqual(in_pool, [False, True, True])
+
+    def test_small_batch_runs_inline(self):
+        _, in_pool = self.executor.plan([self.slow])
+
+        self.assertEqual(in_pool, [False])
+
+    def test_saturated_pool_runs_inline(self):
+        self.executor._pending = 2
+        _, in_pool = self.executor.plan([self.slow, self.slow])
+
+        self.assertEqual(in_pool, [False, False])
+
+    def test_execute(self):
+        threads = self.executor.execute([self.cheap, self.slow, self.cheap], get_thread)
+
+        self.assertIs(threads[0], threading.current_thread())
+        self.assertIsNot(threads[1], threading.current_thread())
+        self.assertIs(threads[2], threading.current_thread())
+        self.assertEqual(self.executor.get_queue_depth(), 0)
+
+    def test_iter_execute_inline(self):
+        results = self.executor.iter_execute([self.cheap, self.cheap], get_thread)
+
+        self.assertIsNone(self.executor._pool)
+        self.assertEqual([r for _, r in results], [threading.current_thread()] * 2)
+
+    def test_latencies_are_measured(self):
+        with mock.patch("batch_requests.concurrent.adaptive.monotonic", side_effect=[10, 12]):
+            self.executor.execute([self.cheap], get_thread)
+
+        self.assertAlmostEqual(self.executor.latencies.get(self.executor.get_route(self.cheap)), 0.40008)
+
+    def test_decisions_are_logged(self):
+        with mock.patch("batch_requests.concurrent.adaptive.log") as log:
+            log.isEnabledFor.return_value = True
+            self.executor.plan([self.cheap, self.slow])
+
+        message = log.debug.call_args[0][0] % log.debug.call_args[0][1:]
+        self.assertIn("Running 1 of 2 requests in the pool", message)
+        self.assertIn("tests.test_views.SimpleView=inline", message)
+
+
+class TestAdaptiveBatch(TestBase):
+    '''
+        Tests batches run through the adaptive executor.
+    '''
+
+    def setUp(self):
+        self.orig_executor = _settings.executor
+
+    def tearDown(self):
+        _settings.executor.shutdown()
+        _settings.executor = self.orig_executor
+
+    def test_batch(self):
+        executor = _settings.executor = AdaptiveExecutor(3)
+        batch = json.dumps([
+            {"method": "get", "url": "/views/"},
+            {"method": "get", "url": "/exception/"},
+        ])
+        for _ in range(2):
+            resp = self.client.post("/api/v1/batch/", batch, content_type="application/json")
+            statuses = [r["status_code"] for r in json.loads(resp.content.decode("utf-8"))]
+            self.assertEqual(statuses, [200, 500])
+
+        self.assertIsNotNone(executor.latencies.get("tests.test_views.SimpleView"))
+        self.assertIsNotNone(executor.latencies.get("tests.test_views.ExceptionView"))
+
+    def test_options(self):
+        batch_settings = BatchRequestSettings({
+            "EXECUTE_PARALLEL": True,
+            "CONCURRENT_EXECUTOR": "batch_requests.concurrent.adaptive.AdaptiveExecutor",
+            "CONCURRENT_EXECUTOR_OPTIONS": {"inline_latency": 0.01, "alpha": 0.5},
+        }, DEFAULTS)
+
+        self.assertEqual(batch_settings.executor.inline_latency, 0.01)
+        self.assertEqual(batch_settings.executor.latencies.alpha, 0.5)
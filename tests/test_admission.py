@@ -0,0 +1,131 @@
+'''
+@summary: Test cases for the admission control of batches.
+'''
+from __future__ import absolute_import, unicode_literals
+
+import json
+import unittest
+
+import mock
+import six
+from django.test import SimpleTestCase
+
+from batch_requests.admission import AdmissionController, get_admission_controller
+from batch_requests.settings import br_settings as _settings
+from tests.test_base import TestBase
+
+
+def get_cost(request):
+    return int(request.META.get("HTTP_X_BATCH_SIZE", 1))
+
+
+class TestAdmissionController(SimpleTestCase):
+    '''
+        Tests batches are admitted while the process has capacity left.
+    '''
+
+    def test_max_in_flight(self):
+        controller = AdmissionController(max_in_flight=5)
+
+        self.assertTrue(controller.admit(3))
+        self.assertTrue(controller.admit(2))
+        self.assertFalse(controller.admit(1))
+        controller.release(3)
+        self.assertTrue(controller.admit(3))
+        self.assertEqual(controller.in_flight, 5)
+
+    def test_large_batch_admitted_alone(self):
+        controller = AdmissionController(max_in_flight=5)
+
+        self.assertTrue(controller.admit(10))
+        self.assertFalse(controller.admit(1))
+
+    def test_max_queue_depth(self):
+        controller = AdmissionController(max_queue_depth=10)
+        executor = mock.Mock()
+
+        executor.get_queue_depth.return_value = 9
+        self.assertTrue(controller.admit(1, executor))
+        executor.get_queue_depth.return_value = 10
+        self.assertFalse(controller.admit(1, executor))
+
+    def test_settings(self):
+        with mock.patch.object(_settings, "ADMISSION_MAX_IN_FLIGHT", 20), \
+                mock.patch.object(_settings, "ADMISSION_BATCH_COST", "tests.test_admission.get_cost"):
+            controller = get_admission_controller()
+
+        self.assertEqual(controller.max_in_flight, 20)
+        self.assertEqual(controller.get_cost(mock.Mock(META={"HTTP_X_BATCH_SIZE": "4"})), 4)
+        self.assertIsNone(get_admission_controller())
+
+    def test_default_cost(self):
+        with mock.patch.object(_settings, "ADMISSION_MAX_QUEUE_DEPTH", 20):
+            controller = get_admission_controller()
+
+        self.assertEqual(controller.get_cost(None), _settings.MAX_LIMIT)
+
+
+class TestAdmittedBatch(TestBase):
+    '''
+        Tests batches are turned away with a Retry-After when overloaded.
+    '''
+
+    def setUp(self):
+        self.controller = AdmissionController(max_in_flight=2, cost=2)
+        patcher = mock.patch.object(_settings, "admission_controller", self.controller)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post_batch(self, url="/api/v1/batch/"):
+        return self.client.post(url, json.dumps([
+            {"method": "get", "url": "/views/"},
+        ]), content_type="application/json")
+
+    def test_admitted(self):
+        resp = self.post_batch()
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(self.controller.in_flight, 0)
+
+    def test_rejected(self):
+        self.controller.admit(1)
+        resp = self.post_batch()
+
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(resp["Retry-After"], "1")
+
+        with mock.patch.object(_settings, "ADMISSION_REJECT_STATUS", 429), \
+                mock.patch.object(_settings, "ADMISSION_RETRY_AFTER", 5):
+            resp = self.post_batch()
+
+        self.assertEqual(resp.status_code, 429)
+        self.assertEqual(resp["Retry-After"], "5")
+
+    def test_bad_batch_released(self):
+        resp = self.client.post("/api/v1/batch/", "{}", content_type="application/json")
+
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(self.controller.in_flight, 0)
+
+    def test_streamed_batch(self):
+        with mock.patch.object(_settings, "STREAM_RESPONSES", True):
+            resp = self.post_batch()
+            self.assertEqual(self.controller.in_flight, 2)
+            b"".join(resp.streaming_content)
+
+        self.assertEqual(self.controller.in_flight, 0)
+
+    def test_streamed_batch_closed(self):
+        with mock.patch.object(_settings, "STREAM_RESPONSES", True):
+            resp = self.post_batch()
+            resp.close()
+
+        self.assertEqual(self.controller.in_flight, 0)
+
+    @unittest.skipIf(six.PY2, "The async batch view needs Python 3.")
+    def test_async_batch(self):
+        self.assertEqual(self.post_batch("/api/v1/async-batch/").status_code, 200)
+        self.assertEqual(self.controller.in_flight, 0)
+
+        self.controller.admit(1)
+        self.assertEqual(self.post_batch("/api/v1/async-batch/").status_code, 503)
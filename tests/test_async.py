@@ -0,0 +1,169 @@
+'''
+@summary: Test cases for the async batch view.
+'''
+from __future__ import absolute_import, unicode_literals
+
+import asyncio
+import json
+import threading
+from time import sleep, time
+
+import mock
+import pytest
+from django.test import RequestFactory, SimpleTestCase
+
+asgiref_sync = pytest.importorskip("asgiref.sync")
+
+from batch_requests import async_views  # noqa: E402
+from batch_requests.async_views import async_handle_batch_requests  # noqa: E402
+from batch_requests.concurrent.async_executor import AsyncExecutor, wait_for_slot  # noqa: E402
+from batch_requests.concurrent.slots import Slots  # noqa: E402
+from tests.async_views import CANCELLED  # noqa: E402
+
+
+class TestAsyncBatch(SimpleTestCase):
+    '''
+        Tests the async batch view runs async and sync sub-views concurrently.
+    '''
+
+    def post_batch(self, requests):
+        request = RequestFactory().post(
+            "/api/v1/async-batch/", json.dumps(requests), content_type="application/json"
+        )
+        start = time()
+        resp = asgiref_sync.async_to_sync(async_handle_batch_requests)(request)
+        return resp, json.loads(resp.content.decode("utf-8")), time() - start
+
+    def test_async_views_run_concurrently(self):
+        sleep = {"method": "get", "url": "/async-sleep/?seconds=0.5"}
+        resp, responses, duration = self.post_batch([sleep, sleep, sleep])
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([r["body"] for r in responses], ["Success!"] * 3)
+        self.assertLess(duration, 1.5)
+
+    def test_sync_views(self):
+        resp, responses, _ = self.post_batch([
+            {"method": "get", "url": "/views/"},
+            {"method": "post", "url": "/views/", "body": "echo", "headers": {"content_type": "text/plain"}},
+            {"method": "get", "url": "/exception/"},
+        ])
+
+        self.assertEqual([r["status_code"] for r in responses], [200, 201, 500])
+        self.assertEqual(responses[1]["body"], "echo")
+
+    def test_timeout_cancels_async_view(self):
+        _, responses, duration = self.post_batch([
+            {"method": "get", "url": "/async-sleep/?seconds=2", "timeout": 0.2},
+            {"method": "get", "url": "/views/"},
+        ])
+
+        self.assertEqual([r["status_code"] for r in responses], [408, 200])
+        self.assertIn("/async-sleep/?seconds=2", CANCELLED)
+        self.assertLess(duration, 2)
+
+    def test_serialisation_off_the_loop(self):
+        threads = []
+
+        def in_thread(func):
+            def wrapper(*args, **kwargs):
+                threads.append(threading.current_thread())
+                return func(*args, **kwargs)
+            return wrapper
+
+        async def handle(request):
+            return threading.current_thread(), await async_handle_batch_requests(request)
+
+        request = RequestFactory().post(
+            "/api/v1/async-batch/", json.dumps([{"method": "get", "url": "/views/"}]),
+            content_type="application/json"
+        )
+        with mock.patch.object(async_views, "build_sub_response", in_thread(async_views.build_sub_response)), \
+                mock.patch.object(async_views, "respond", in_thread(async_views.respond)):
+            loop_thread, resp = asgiref_sync.async_to_sync(handle)(request)
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(threads), 2)
+        self.assertNotIn(loop_thread, threads)
+
+    def test_only_post_is_allowed(self):
+        request = RequestFactory().get("/api/v1/async-batch/")
+        resp = asgiref_sync.async_to_sync(async_handle_batch_requests)(request)
+
+        self.assertEqual(resp.status_code, 405)
+
+
+class TestAsyncExecutor(SimpleTestCase):
+    '''
+        Tests the threads running sync code are bounded across batches.
+    '''
+
+    def setUp(self):
+        self.executor = AsyncExecutor(1)
+
+    async def run_sync_call(self, request, run_sync):
+        return await run_sync(sleep, request.seconds)
+
+    def execute(self, requests):
+        return asgiref_sync.async_to_sync(self.executor.execute)(
+            requests, self.run_sync_call, on_timeout=lambda: "timeout"
+        )
+
+    def test_slots_shared_by_batches(self):
+        slots = self.executor.get_slots()
+        slots.acquire()
+        self.addCleanup(slots.release)
+
+        self.assertEqual(self.execute([mock.Mock(seconds=0, batch_timeout=0.05)]), ["timeout"])
+
+    def test_slot_held_until_thread_finishes(self):
+        slots = self.executor.get_slots()
+
+        async def execute_and_acquire():
+            results = await self.executor.execute(
+                [mock.Mock(seconds=0.3, batch_timeout=0.05)], self.run_sync_call, on_timeout=lambda: "timeout"
+            )
+            # The thread is still sleeping, its slot cannot be taken.
+            return results, slots.acquire(False)
+
+        self.assertEqual(asgiref_sync.async_to_sync(execute_and_acquire)(), (["timeout"], False))
+        self.assertTrue(slots.acquire(False))
+        slots.release()
+
+    def test_queue_size(self):
+        with self.assertRaises(ValueError):
+            AsyncExecutor(1, queue_size=10)
+
+
+class TestSlots(SimpleTestCase):
+    '''
+        Tests event loops waiting for Slots are woken by releases.
+    '''
+
+    def test_woken_by_release_in_thread(self):
+        slots = Slots(1)
+        slots.acquire()
+
+        async def wait():
+            threading.Timer(0.05, slots.release).start()
+            return await wait_for_slot(slots, 1), await wait_for_slot(slots, 0.05)
+
+        self.assertEqual(asgiref_sync.async_to_sync(wait)(), (True, False))
+
+    def test_cancelled_waiter_passes_wake_on(self):
+        slots = Slots(1)
+        slots.acquire()
+
+        async def wait():
+            first = asyncio.ensure_future(wait_for_slot(slots))
+            second = asyncio.ensure_future(wait_for_slot(slots, 1))
+            await asyncio.sleep(0)
+            # The release wakes the first waiter, which gives up before it gets the slot.
+            slots.release()
+            first.cancel()
+            start = time()
+            return await second, time() - start
+
+        acquired, duration = asgiref_sync.async_to_sync(wait)()
+        self.assertTrue(acquired)
+        self.assertLess(duration, 0.5)
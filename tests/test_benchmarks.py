@@ -0,0 +1,45 @@
+'''
+@summary: Test cases for the benchmark harness.
+'''
+from __future__ import absolute_import, unicode_literals
+
+from django.test import SimpleTestCase
+
+from benchmarks.run import compare, run_benchmarks
+
+
+class TestBenchmarks(SimpleTestCase):
+    '''
+        Smoke tests the benchmarks and the comparison of their results.
+    '''
+
+    def test_run_benchmarks(self):
+        report = run_benchmarks(
+            batch_sizes=(2,), body_sizes=(16,), executors=("sequential", "thread"),
+            views=("cpu", "io"), repeat=1,
+        )
+
+        stages = {(r["stage"], r["executor"], r["view"]) for r in report["results"]}
+        for view in ("cpu", "io"):
+            for stage in ("parse", "construct", "resolve", "serialise"):
+                self.assertIn((stage, None, view), stages)
+            for executor in ("sequential", "thread"):
+                self.assertIn(("dispatch", executor, view), stages)
+                self.assertIn(("end_to_end", executor, view), stages)
+
+        for result in report["results"]:
+            self.assertLessEqual(result["min_ms"], result["median_ms"])
+            self.assertLessEqual(result["median_ms"], result["max_ms"])
+
+    def test_compare(self):
+        def result(median_ms, stage="dispatch"):
+            return {
+                "stage": stage, "executor": "thread", "view": "io",
+                "batch_size": 2, "body_size": 0, "median_ms": median_ms,
+            }
+
+        baseline = {"results": [result(10.0), result(1.0, stage="parse")]}
+        report = {"results": [result(12.0), result(1.05, stage="parse"), result(5.0, stage="resolve")]}
+
+        regressions = compare(report, baseline, 0.1)
+        self.assertEqual(regressions, [(("json", "dispatch", "thread", "io", 2, 0), 10.0, 12.0)])
@@ -0,0 +1,134 @@
+'''
+@summary: Test cases for the views answering many sub-requests in one call.
+'''
+from __future__ import absolute_import, unicode_literals
+
+import json
+import unittest
+
+import mock
+import six
+from django.test import SimpleTestCase
+
+from batch_requests.bulk import get_bulk_handler
+from batch_requests.concurrent.executor import ThreadBasedExecutor
+from batch_requests.settings import br_settings as _settings
+from tests.test_base import TestBase
+from tests.test_views import ItemView, SimpleView, get_items, item_view
+
+
+class TestBulkHandler(SimpleTestCase):
+    '''
+        Tests bulk handlers are found on view functions and classes.
+    '''
+
+    def test_get_bulk_handler(self):
+        self.assertIs(get_bulk_handler(item_view), get_items)
+        self.assertEqual(get_bulk_handler(ItemView.as_view()), ItemView.bulk_handler)
+        self.assertIsNone(get_bulk_handler(SimpleView.as_view()))
+
+
+class TestBulkBatch(TestBase):
+    '''
+        Tests sub-requests to views with a bulk handler are answered in one call.
+    '''
+
+    def post_batch(self, requests, url="/api/v1/batch/"):
+        resp = self.client.post(url, json.dumps(requests), content_type="application/json")
+        return resp, [r["body"] for r in json.loads(resp.content.decode("utf-8"))]
+
+    def get_bodies(self, requests, url="/api/v1/batch/"):
+        with mock.patch.object(item_view, "bulk_handler", wraps=get_items) as handler:
+            _, bodies = self.post_batch(requests, url)
+        return bodies, [len(call[0][0]) for call in handler.call_args_list]
+
+    def test_grouped(self):
+        bodies, calls = self.get_bodies([
+            {"method": "get", "url": "/items/1/"},
+            {"method": "get", "url": "/views/"},
+            {"method": "get", "url": "/items/2/"},
+        ])
+
+        self.assertEqual(bodies, ["item 1 of 1,2", "Success!", "item 2 of 1,2"])
+        self.assertEqual(calls, [2])
+
+    def test_single_request_not_grouped(self):
+        bodies, calls = self.get_bodies([
+            {"method": "get", "url": "/items/1/"},
+            {"method": "get", "url": "/views/"},
+        ])
+
+        self.assertEqual(bodies, ["item 1", "Success!"])
+        self.assertEqual(calls, [])
+
+    def test_fall_back_to_view(self):
+        post = {"method": "post", "body": "", "headers": {"content_type": "text/plain"}}
+        bodies, calls = self.get_bodies([dict(post, url="/items/1/"), dict(post, url="/items/2/")])
+
+        self.assertEqual(bodies, ["item 1", "item 2"])
+        self.assertEqual(calls, [2])
+
+    def test_grouped_by_method(self):
+        post = {"method": "post", "body": "", "headers": {"content_type": "text/plain"}}
+        bodies, calls = self.get_bodies([
+            {"method": "get", "url": "/items/1/"},
+            dict(post, url="/items/2/"),
+            {"method": "get", "url": "/items/3/"},
+        ])
+
+        # The POST is not handed to the handler of the GETs, and runs on its own.
+        self.assertEqual(bodies, ["item 1 of 1,3", "item 2", "item 3 of 1,3"])
+        self.assertEqual(calls, [2])
+
+    def test_class_based_view(self):
+        _, bodies = self.post_batch([
+            {"method": "get", "url": "/item-views/1/"},
+            {"method": "get", "url": "/item-views/2/"},
+        ])
+
+        self.assertEqual(bodies, ["item 1 of 1,2", "item 2 of 1,2"])
+
+    def test_handler_errors(self):
+        requests = [{"method": "get", "url": "/items/1/"}, {"method": "get", "url": "/items/2/"}]
+        for side_effect in (Exception("bulk"), lambda calls: []):
+            with mock.patch.object(item_view, "bulk_handler", side_effect=side_effect):
+                resp = self.client.post("/api/v1/batch/", json.dumps(requests), content_type="application/json")
+
+            self.assertEqual([r["status_code"] for r in json.loads(resp.content.decode("utf-8"))], [500, 500])
+
+    def test_thread_executor(self):
+        orig_executor = _settings.executor
+        _settings.executor = ThreadBasedExecutor(2)
+        try:
+            bodies, calls = self.get_bodies([
+                {"method": "get", "url": "/items/1/"},
+                {"method": "get", "url": "/views/"},
+                {"method": "get", "url": "/items/2/"},
+            ])
+        finally:
+            _settings.executor.shutdown()
+            _settings.executor = orig_executor
+
+        self.assertEqual(bodies, ["item 1 of 1,2", "Success!", "item 2 of 1,2"])
+        self.assertEqual(calls, [2])
+
+    def test_streamed_batch(self):
+        with mock.patch.object(_settings, "STREAM_RESPONSES", True):
+            resp = self.client.post("/api/v1/batch/", json.dumps([
+                {"method": "get", "url": "/items/1/"},
+                {"method": "get", "url": "/views/"},
+                {"method": "get", "url": "/items/2/"},
+            ]), content_type="application/json")
+            responses = json.loads(b"".join(resp.streaming_content).decode("utf-8"))
+
+        self.assertEqual([r["body"] for r in responses], ["item 1 of 1,2", "Success!", "item 2 of 1,2"])
+
+    @unittest.skipIf(six.PY2, "The async batch view needs Python 3.")
+    def test_async_batch(self):
+        bodies, calls = self.get_bodies([
+            {"method": "get", "url": "/items/1/"},
+            {"method": "get", "url": "/items/2/"},
+        ], "/api/v1/async-batch/")
+
+        self.assertEqual(bodies, ["item 1 of 1,2", "item 2 of 1,2"])
+        self.assertEqual(calls, [2])
@@ -0,0 +1,129 @@
+'''
+@summary: Test cases for the per route concurrency limits of sub-requests.
+'''
+from __future__ import absolute_import, unicode_literals
+
+import json
+import threading
+import unittest
+
+import mock
+import six
+from django.core.exceptions import ImproperlyConfigured
+from django.test import RequestFactory, SimpleTestCase
+from django.urls import resolve
+
+from batch_requests.bulkheads import Bulkheads
+from batch_requests.concurrent.executor import ThreadBasedExecutor, acquire, monotonic
+from batch_requests.instrumentation import Timings
+from batch_requests.settings import DEFAULTS, BatchRequestSettings, br_settings as _settings
+from batch_requests.views import limit_concurrency
+from tests.test_base import TestBase
+
+
+class TestBulkheads(SimpleTestCase):
+    '''
+        Tests routes are matched to their bulkhead.
+    '''
+
+    def test_routes(self):
+        bulkheads = Bulkheads({"tests.test_views.SimpleView": 1, "^sleep/": 2})
+
+        self.assertEqual(bulkheads.get_route(resolve("/views/")), "tests.test_views.SimpleView")
+        self.assertEqual(bulkheads.get_route(resolve("/sleep/")), "^sleep/")
+        self.assertIsNone(bulkheads.get_route(resolve("/echo/")))
+        self.assertIsNone(bulkheads.get_semaphore(resolve("/echo/")))
+
+    def test_process_executor_rejected(self):
+        with self.assertRaises(ImproperlyConfigured):
+            BatchRequestSettings({
+                "EXECUTE_PARALLEL": True,
+                "CONCURRENT_EXECUTOR": "batch_requests.concurrent.executor.ProcessBasedExecutor",
+                "ROUTE_CONCURRENCY_LIMITS": {"tests.test_views.SimpleView": 1},
+            }, DEFAULTS)
+
+    def test_acquire(self):
+        semaphore = threading.BoundedSemaphore(1)
+
+        self.assertTrue(acquire(semaphore, 0))
+        self.assertFalse(acquire(semaphore, 0))
+        self.assertFalse(acquire(semaphore, 0.01))
+        semaphore.release()
+        self.assertTrue(acquire(semaphore))
+
+    def test_reset(self):
+        bulkheads = Bulkheads({"^sleep/": 1})
+        bulkheads.get_semaphore(resolve("/sleep/")).acquire()
+        bulkheads.reset()
+
+        self.assertTrue(acquire(bulkheads.get_semaphore(resolve("/sleep/")), 0))
+
+
+class TestLimitedBatch(TestBase):
+    '''
+        Tests sub-requests to a route at its limit wait or are answered with a 429.
+    '''
+
+    def setUp(self):
+        self.orig_executor = _settings.executor
+        _settings.executor = ThreadBasedExecutor(3)
+        bulkheads = Bulkheads({"tests.test_views.SimpleView": 1})
+        self.semaphore = bulkheads.get_semaphore(resolve("/views/"))
+        patcher = mock.patch.object(_settings, "bulkheads", bulkheads)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        _settings.executor.shutdown()
+        _settings.executor = self.orig_executor
+
+    def post_batch(self, url="/api/v1/batch/"):
+        resp = self.client.post(url, json.dumps([
+            {"method": "get", "url": "/views/"},
+            {"method": "get", "url": "/echo/?header=method"},
+        ]), content_type="application/json")
+        return json.loads(resp.content.decode("utf-8"))
+
+    def test_within_limit(self):
+        responses = self.post_batch()
+
+        self.assertEqual([r["status_code"] for r in responses], [200, 200])
+        self.assertTrue(acquire(self.semaphore, 0))
+
+    def test_fail_fast(self):
+        self.semaphore.acquire()
+        responses = self.post_batch()
+
+        self.assertEqual(responses[0]["status_code"], 429)
+        self.assertEqual(responses[0]["reason_phrase"], "Too Many Requests")
+        self.assertEqual(responses[1]["status_code"], 200)
+
+    def test_queue(self):
+        self.semaphore.acquire()
+        threading.Timer(0.1, self.semaphore.release).start()
+        with mock.patch.object(_settings, "ROUTE_CONCURRENCY_TIMEOUT", None):
+            responses = self.post_batch()
+
+        self.assertEqual(responses[0]["status_code"], 200)
+
+    def test_wait_bounded_by_deadline(self):
+        self.semaphore.acquire()
+        timer = threading.Timer(1, self.semaphore.release)
+        timer.start()
+        self.addCleanup(timer.cancel)
+        request = RequestFactory().get("/views/")
+        request.batch_deadline = monotonic() + 0.05
+
+        with mock.patch.object(_settings, "ROUTE_CONCURRENCY_TIMEOUT", None):
+            with limit_concurrency(request, Timings()) as admitted:
+                self.assertFalse(admitted)
+
+    @unittest.skipIf(six.PY2, "The async batch view needs Python 3.")
+    def test_async_batch(self):
+        self.semaphore.acquire()
+        with mock.patch.object(_settings, "ROUTE_CONCURRENCY_TIMEOUT", 0.05):
+            responses = self.post_batch("/api/v1/async-batch/")
+
+        self.assertEqual([r["status_code"] for r in responses], [429, 200])
+        self.semaphore.release()
+        self.assertEqual([r["status_code"] for r in self.post_batch("/api/v1/async-batch/")], [200, 200])
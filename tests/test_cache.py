@@ -0,0 +1,108 @@
+'''
+@summary: Test cases for the sub-response cache.
+'''
+from __future__ import absolute_import, unicode_literals
+
+import json
+
+import mock
+from django.http.response import HttpResponse
+from django.test import RequestFactory, SimpleTestCase
+
+from batch_requests.cache import LRUCache, ResponseCache, get_response_timeout
+from batch_requests.settings import br_settings as _settings
+from tests.test_base import TestBase
+
+
+class TestResponseTimeout(SimpleTestCase):
+    '''
+        Tests the Cache-Control header of the sub-response is honored.
+    '''
+
+    def response(self, status=200, **headers):
+        resp = HttpResponse(status=status)
+        for header, value in headers.items():
+            resp[header.replace("_", "-")] = value
+        return resp
+
+    def test_default_timeout(self):
+        self.assertEqual(get_response_timeout(self.response(), 60), 60)
+
+    def test_max_age(self):
+        self.assertEqual(get_response_timeout(self.response(Cache_Control="public, max-age=5"), 60), 5)
+        self.assertEqual(get_response_timeout(self.response(Cache_Control="max-age=5, s-maxage=7"), 60), 7)
+
+    def test_uncacheable(self):
+        self.assertEqual(get_response_timeout(self.response(Cache_Control="private, max-age=5"), 60), 0)
+        self.assertEqual(get_response_timeout(self.response(Cache_Control="no-store"), 60), 0)
+        self.assertEqual(get_response_timeout(self.response(Vary="*"), 60), 0)
+        self.assertEqual(get_response_timeout(self.response(status=500), 60), 0)
+
+
+class TestLRUCache(SimpleTestCase):
+    '''
+        Tests the eviction of the in-process cache.
+    '''
+
+    def test_least_recently_used_is_evicted(self):
+        cache = LRUCache(2)
+        cache.set("a", 1, 60)
+        cache.set("b", 2, 60)
+        cache.get("a")
+        cache.set("c", 3, 60)
+
+        self.assertEqual((cache.get("a"), cache.get("b"), cache.get("c")), (1, None, 3))
+
+    def test_expired_entries(self):
+        cache = LRUCache(2)
+        cache.set("a", 1, 0)
+
+        self.assertIsNone(cache.get("a"))
+
+
+class TestResponseCache(SimpleTestCase):
+    '''
+        Tests the keys of the cached sub-responses.
+    '''
+
+    def setUp(self):
+        self.cache = ResponseCache(vary_headers={"HTTP_COOKIE"})
+        self.factory = RequestFactory()
+
+    def store(self, request, resp):
+        self.cache.set(request, resp, {"status_code": 200, "headers": {"a": "b"}, "body": b"x"})
+
+    def test_vary(self):
+        resp = HttpResponse()
+        resp["Vary"] = "Accept-Language"
+        self.store(self.factory.get("/views/?q=1", HTTP_ACCEPT_LANGUAGE="en"), resp)
+
+        self.assertIsNotNone(self.cache.get(self.factory.get("/views/?q=1", HTTP_ACCEPT_LANGUAGE="en")))
+        self.assertIsNone(self.cache.get(self.factory.get("/views/?q=1", HTTP_ACCEPT_LANGUAGE="fr")))
+        self.assertIsNone(self.cache.get(self.factory.get("/views/?q=2", HTTP_ACCEPT_LANGUAGE="en")))
+        self.assertIsNone(self.cache.get(self.factory.get("/views/?q=1", HTTP_ACCEPT_LANGUAGE="en", HTTP_COOKIE="a=b")))
+        self.assertEqual(self.cache.stats(), {"hits": 1, "misses": 3, "entries": 2})
+
+    def test_unsafe_methods(self):
+        self.store(self.factory.post("/views/"), HttpResponse())
+
+        self.assertIsNone(self.cache.get(self.factory.post("/views/")))
+        self.assertEqual(self.cache.stats()["entries"], 0)
+
+
+class TestCachedBatch(TestBase):
+    '''
+        Tests repeated GET sub-requests are served from the cache.
+    '''
+
+    def test_repeated_get(self):
+        cache = ResponseCache(vary_headers=_settings.CACHE_VARY_HEADERS)
+        with mock.patch.object(_settings, "response_cache", cache):
+            self.make_a_batch_request("get", "/views/", "")
+            second = json.loads(self.make_a_batch_request("get", "/views/", "").text)[0]
+            post = json.loads(self.make_a_batch_request("post", "/views/", "x").text)[0]
+
+        self.assertEqual(second["headers"][_settings.CACHE_HEADER_NAME], "hit")
+        self.assertEqual(second["body"], "Success!")
+        self.assertNotIn(_settings.CACHE_HEADER_NAME, post["headers"])
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 1, "entries": 2})
@@ -0,0 +1,154 @@
+'''
+@summary: Test cases for the compression of batch responses.
+'''
+from __future__ import absolute_import, unicode_literals
+
+import gzip
+import io
+import json
+import zlib
+
+import mock
+from django.core.exceptions import ImproperlyConfigured
+from django.http.response import HttpResponse
+from django.test import RequestFactory, SimpleTestCase
+
+from batch_requests.compression import get_compressor_class, parse_accept_encoding
+from batch_requests.compressors import BrotliCompressor, Compressor, GzipCompressor
+from batch_requests.settings import DEFAULTS, BatchRequestSettings
+from batch_requests.settings import br_settings as _settings
+from tests.test_base import TestBase
+
+
+def gunzip(content):
+    return gzip.GzipFile(fileobj=io.BytesIO(content)).read()
+
+
+class TestNegotiation(SimpleTestCase):
+    '''
+        Tests the encoding picked according to Accept-Encoding.
+    '''
+
+    def get_compressor_class(self, accept_encoding):
+        request = RequestFactory().post("/api/v1/batch/", HTTP_ACCEPT_ENCODING=accept_encoding)
+        return get_compressor_class(request)
+
+    def test_parse_accept_encoding(self):
+        self.assertEqual(
+            parse_accept_encoding("gzip;q=0.5, br, identity; q=0, *;q=x"),
+            {"gzip": 0.5, "br": 1.0, "identity": 0.0, "*": 0.0},
+        )
+
+    def test_preference(self):
+        with mock.patch.object(_settings, "COMPRESSION", ("br", "gzip")), \
+                mock.patch.dict("batch_requests.compressors._available", {"brotli": True}):
+            self.assertIs(self.get_compressor_class("gzip, br"), BrotliCompressor)
+            self.assertIs(self.get_compressor_class("gzip, br;q=0.5"), GzipCompressor)
+            self.assertIs(self.get_compressor_class("*"), BrotliCompressor)
+            self.assertIsNone(self.get_compressor_class("deflate"))
+            self.assertIsNone(self.get_compressor_class("gzip;q=0"))
+
+    def test_library_not_installed(self):
+        with mock.patch.object(_settings, "COMPRESSION", ("br", "zstd", "gzip")), \
+                mock.patch.dict("batch_requests.compressors._available", clear=True), \
+                mock.patch("batch_requests.compressors.import_module", side_effect=ImportError) as import_module:
+            self.assertIs(self.get_compressor_class("br, zstd, gzip"), GzipCompressor)
+            self.assertIsNone(self.get_compressor_class("br, zstd"))
+
+        self.assertEqual(import_module.call_count, 2)
+
+    def test_incomplete_compressor(self):
+        class UnfinishedCompressor(Compressor):
+            encoding = "identity"
+
+            def compress(self, data):
+                return data
+
+            def flush(self):
+                return b""
+
+        with self.assertRaises(TypeError):
+            UnfinishedCompressor()
+
+    def test_unknown_encoding(self):
+        with self.assertRaises(ImproperlyConfigured):
+            BatchRequestSettings({"COMPRESSION": ("gzip", "deflate")}, DEFAULTS)
+
+
+class TestCompressedBatch(TestBase):
+    '''
+        Tests batch responses are compressed when enabled and worth it.
+    '''
+
+    def setUp(self):
+        for name, value in (("COMPRESSION", ("gzip",)), ("COMPRESSION_MIN_SIZE", 100)):
+            patcher = mock.patch.object(_settings, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def post_batch(self, count=3, **extra):
+        return self.client.post(
+            "/api/v1/batch/",
+            json.dumps([{"method": "get", "url": "/views/"}] * count),
+            content_type="application/json", **extra
+        )
+
+    def test_compressed(self):
+        resp = self.post_batch(HTTP_ACCEPT_ENCODING="gzip, deflate")
+
+        self.assertEqual(resp["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", resp["Vary"])
+        responses = json.loads(gunzip(resp.content).decode("utf-8"))
+        self.assertEqual([r["body"] for r in responses], ["Success!"] * 3)
+
+    def test_library_not_installed(self):
+        with mock.patch.object(_settings, "COMPRESSION", ("zstd", "gzip")), \
+                mock.patch.dict("batch_requests.compressors._available", {"zstandard": False}):
+            resp = self.post_batch(HTTP_ACCEPT_ENCODING="zstd, gzip")
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["Content-Encoding"], "gzip")
+
+    def test_not_accepted(self):
+        resp = self.post_batch()
+
+        self.assertFalse(resp.has_header("Content-Encoding"))
+        self.assertIn("Accept-Encoding", resp["Vary"])
+        self.assertEqual(len(json.loads(resp.content.decode("utf-8"))), 3)
+
+    def test_below_threshold(self):
+        with mock.patch.object(_settings, "COMPRESSION_MIN_SIZE", 10000):
+            resp = self.post_batch(HTTP_ACCEPT_ENCODING="gzip")
+
+        self.assertFalse(resp.has_header("Content-Encoding"))
+        self.assertFalse(resp.has_header("Vary"))
+
+    def test_level(self):
+        with mock.patch.object(_settings, "COMPRESSION_LEVEL", {"gzip": 1}), \
+                mock.patch("batch_requests.compressors.zlib.compressobj", wraps=zlib.compressobj) as compressobj:
+            resp = self.post_batch(HTTP_ACCEPT_ENCODING="gzip")
+
+        self.assertEqual(compressobj.call_args[0][0], 1)
+        self.assertEqual(len(json.loads(gunzip(resp.content).decode("utf-8"))), 3)
+
+    def test_precompressed_bodies_not_counted(self):
+        view_response = HttpResponse(b"a" * 1000)
+        view_response["Content-Encoding"] = "gzip"
+        with mock.patch("batch_requests.views.get_view_response", return_value=view_response), \
+                mock.patch.object(_settings, "COMPRESSION_MIN_SIZE", 500):
+            resp = self.post_batch(count=1, HTTP_ACCEPT_ENCODING="gzip")
+
+        self.assertFalse(resp.has_header("Content-Encoding"))
+
+    def test_streamed(self):
+        with mock.patch.object(_settings, "STREAM_RESPONSES", True):
+            resp = self.post_batch(HTTP_ACCEPT_ENCODING="gzip")
+            chunks = list(resp.streaming_content)
+
+        self.assertEqual(resp["Content-Encoding"], "gzip")
+        # Every chunk can be decoded as soon as it arrives.
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self.assertEqual(decompressor.decompress(chunks[0]), b"[")
+        content = b"[" + b"".join(decompressor.decompress(chunk) for chunk in chunks[1:])
+        responses = json.loads(content.decode("utf-8"))
+        self.assertEqual([r["body"] for r in responses], ["Success!"] * 3)
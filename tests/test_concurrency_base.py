@@ -24,6 +24,10 @@ class TestBaseConcurrency(TestBase):
         self.orig_executor = _settings.executor
 
     def tearDown(self):
+        # Shut down the pool of the executor under test, it outlives the batch.
+        if _settings.executor is not self.orig_executor:
+            _settings.executor.shutdown()
+
         # Restore the original batch requests settings.
         _settings.executor = self.orig_executor
 
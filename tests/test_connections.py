@@ -0,0 +1,126 @@
+'''
+@summary: Test cases for the lifecycle of the database connections of pool threads.
+'''
+from __future__ import absolute_import, unicode_literals
+
+import threading
+
+import mock
+from django.db import connections
+from django.test import SimpleTestCase
+
+from batch_requests.concurrent.connections import WorkerConnections, run_with_connections
+from batch_requests.concurrent.executor import ThreadBasedExecutor
+
+
+def open_connection():
+    '''Opens the connection of the current thread, and returns it.'''
+    conn = connections["default"]
+    conn.ensure_connection()
+    return conn
+
+
+class TestWorkerConnections(SimpleTestCase):
+    '''
+        Tests the threads holding connections are bounded.
+    '''
+
+    def run_in_thread(self, fn):
+        thread = threading.Thread(target=fn)
+        thread.start()
+        return thread
+
+    def test_idle_connections_taken_over(self):
+        worker_connections = WorkerConnections(1)
+        conn = mock.Mock()
+
+        def hold():
+            worker_connections.acquire()
+            with mock.patch("batch_requests.concurrent.connections.get_open_connections", return_value=[conn]):
+                worker_connections.release()
+
+        self.run_in_thread(hold).join()
+        self.assertEqual(worker_connections.holders, 1)
+        conn.close.assert_not_called()
+
+        worker_connections.acquire()
+        conn.close.assert_called_once_with()
+        conn.inc_thread_sharing.assert_called_once_with()
+        with mock.patch("batch_requests.concurrent.connections.get_open_connections", return_value=[]):
+            worker_connections.release()
+        self.assertEqual(worker_connections.holders, 0)
+
+    def test_wait_for_running(self):
+        worker_connections = WorkerConnections(1)
+        acquired = threading.Event()
+        worker_connections.acquire()
+
+        thread = self.run_in_thread(lambda: (worker_connections.acquire(), acquired.set()))
+        self.assertFalse(acquired.wait(0.05))
+
+        worker_connections.release()
+        self.assertTrue(acquired.wait(1))
+        thread.join()
+
+    def test_old_connections_closed(self):
+        with mock.patch("batch_requests.concurrent.connections.close_old_connections") as close_old_connections:
+            self.assertEqual(run_with_connections(WorkerConnections(), lambda x: x * 2, 2), 4)
+
+        self.assertEqual(close_old_connections.call_count, 2)
+
+
+class TestThreadConnections(SimpleTestCase):
+    '''
+        Tests the thread executor honours CONN_MAX_AGE on its threads.
+    '''
+    databases = {"default"}
+
+    def setUp(self):
+        # In memory SQLite databases are never closed, as that would lose them.
+        patcher = mock.patch.object(type(connections["default"]), "is_in_memory_db", return_value=False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.executor = ThreadBasedExecutor(2)
+        self.addCleanup(self.executor.shutdown)
+
+    def run_jobs(self, count=2):
+        pool = self.executor.get_executor_pool()
+        return [self.executor.submit(pool, open_connection).result() for _ in range(count)]
+
+    def test_closed_after_sub_request(self):
+        for conn in self.run_jobs():
+            self.assertIsNone(conn.connection)
+        self.assertEqual(self.executor.worker_connections.holders, 0)
+
+    def test_persistent_connections_reused(self):
+        with mock.patch.dict(connections.databases["default"], {"CONN_MAX_AGE": None}):
+            conns = self.run_jobs(4)
+
+        self.assertLessEqual(len({id(conn.connection) for conn in conns}), 2)
+        self.assertIsNotNone(conns[0].connection)
+
+        self.executor.shutdown()
+        self.assertIsNone(conns[0].connection)
+        self.assertEqual(self.executor.worker_connections.holders, 0)
+
+    def test_max_connections(self):
+        self.executor = ThreadBasedExecutor(3, max_connections=1)
+        self.addCleanup(self.executor.shutdown)
+
+        with mock.patch.dict(connections.databases["default"], {"CONN_MAX_AGE": None}):
+            pool = self.executor.get_executor_pool()
+            futures = [self.executor.submit(pool, open_connection) for _ in range(6)]
+            conns = [future.result() for future in futures]
+
+        self.assertEqual(sum(conn.connection is not None for conn in set(conns)), 1)
+        self.assertEqual(self.executor.worker_connections.holders, 1)
+
+    def test_not_managed(self):
+        self.executor = ThreadBasedExecutor(1, manage_connections=False)
+        self.addCleanup(self.executor.shutdown)
+
+        conn = self.run_jobs(1)[0]
+        self.assertIsNotNone(conn.connection)
+        self.assertIsNone(self.executor.worker_connections)
+        self.executor.submit(self.executor.get_executor_pool(), conn.close).result()
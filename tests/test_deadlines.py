@@ -0,0 +1,103 @@
+'''
+@summary: Test cases to make sure per request and per batch deadlines bound the
+          duration of a batch.
+'''
+from __future__ import absolute_import, unicode_literals
+
+import json
+
+from batch_requests.concurrent.executor import SequentialExecutor, ThreadBasedExecutor
+from batch_requests.settings import br_settings as _settings
+from tests.test_base import TestBase
+
+
+class TestDeadlines(TestBase):
+    '''
+        Tests that requests running past their deadline are answered with a 408.
+    '''
+
+    def setUp(self):
+        self.orig_executor = _settings.executor
+
+    def tearDown(self):
+        _settings.executor.shutdown()
+        _settings.executor = self.orig_executor
+
+    def post_batch(self, requests):
+        resp = self.client.post("/api/v1/batch/", json.dumps(requests), content_type="application/json")
+        duration = float(resp._headers.get(_settings.DURATION_HEADER_NAME)[1])
+        return json.loads(resp.content.decode("utf-8")), duration
+
+    def test_batch_timeout(self):
+        _settings.executor = ThreadBasedExecutor(3, batch_timeout=0.2)
+        responses, duration = self.post_batch([
+            {"method": "get", "url": "/sleep/?seconds=1"},
+            {"method": "get", "url": "/views/"},
+        ])
+
+        self.assertEqual(responses[0]["status_code"], 408)
+        self.assertEqual(responses[1]["status_code"], 200)
+        self.assertLess(duration, 1)
+
+    def test_request_timeout(self):
+        _settings.executor = ThreadBasedExecutor(3)
+        responses, duration = self.post_batch([
+            {"method": "get", "url": "/sleep/?seconds=1", "timeout": 0.2},
+            {"method": "get", "url": "/views/", "timeout": 5},
+        ])
+
+        self.assertEqual([r["status_code"] for r in responses], [408, 200])
+        self.assertLess(duration, 1)
+
+    def test_request_timeout_capped(self):
+        _settings.executor = ThreadBasedExecutor(3, timeout=0.2)
+        responses, duration = self.post_batch([
+            {"method": "get", "url": "/sleep/?seconds=1", "timeout": 5},
+            {"method": "get", "url": "/views/", "timeout": 0.1},
+        ])
+
+        self.assertEqual([r["status_code"] for r in responses], [408, 200])
+        self.assertLess(duration, 1)
+
+    def test_queue_wait_bounded_by_deadline(self):
+        _settings.executor = ThreadBasedExecutor(1, queue_size=1, batch_timeout=0.3)
+        responses, duration = self.post_batch([
+            {"method": "get", "url": "/sleep/?seconds=1"},
+            {"method": "get", "url": "/views/"},
+        ])
+
+        # The second request waits for the slot of the first until the deadline, not longer.
+        self.assertEqual([r["status_code"] for r in responses], [408, 408])
+        self.assertLess(duration, 1)
+
+    def test_sequential_skips_requests_past_batch_deadline(self):
+        _settings.executor = SequentialExecutor(1, batch_timeout=0.5)
+        responses, duration = self.post_batch([
+            {"method": "get", "url": "/sleep/?seconds=1"},
+            {"method": "get", "url": "/views/"},
+        ])
+
+        # Nothing can interrupt the running request, but the next one is never started.
+        self.assertEqual([r["status_code"] for r in responses], [200, 408])
+        self.assertLess(duration, 2)
+
+    def test_batch_timeout_across_layers(self):
+        _settings.executor = ThreadBasedExecutor(3, batch_timeout=1.5)
+        responses, duration = self.post_batch([
+            {"method": "get", "url": "/sleep/?seconds=1", "name": "first"},
+            {"method": "get", "url": "/sleep/?seconds=1", "depends_on": ["first"]},
+        ])
+
+        # Every layer fits in the batch timeout, both do not.
+        self.assertEqual([r["status_code"] for r in responses], [200, 408])
+        self.assertLess(duration, 1.9)
+
+    def test_invalid_timeout(self):
+        resp = self.client.post(
+            "/api/v1/batch/",
+            json.dumps([{"method": "get", "url": "/views/", "timeout": "soon"}]),
+            content_type="application/json"
+        )
+
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.content, b"Request timeout should be a positive number of seconds.")
@@ -0,0 +1,76 @@
+'''
+@summary: Test cases for the deduplication of identical requests within a batch.
+'''
+from __future__ import absolute_import, unicode_literals
+
+import json
+
+import mock
+from django.test import SimpleTestCase
+
+from batch_requests.dedup import deduplicate, fan_out_list
+from batch_requests.settings import br_settings as _settings
+from batch_requests.views import get_view_response
+from tests.test_base import TestBase
+
+
+class TestDeduplicate(SimpleTestCase):
+    '''
+        Tests which requests are considered identical.
+    '''
+
+    def test_only_identical_safe_requests(self):
+        requests = [
+            {"method": "get", "url": "/a/"},
+            {"method": "post", "url": "/a/"},
+            {"method": "GET", "url": "/a/"},
+            {"method": "get", "url": "/a/", "headers": {"X": "1"}},
+            {"method": "post", "url": "/a/"},
+            {"method": "get", "url": "/a/", "middleware": []},
+            {"method": "get", "url": "/a/", "middleware": []},
+            {"method": "get", "url": "/a/", "read_replica": False},
+        ]
+        unique, positions = deduplicate(requests)
+
+        self.assertEqual(positions, [[0, 2], [1], [3], [4], [5, 6], [7]])
+        self.assertEqual(
+            fan_out_list(["a", "b", "c", "d", "e", "f"], positions), ["a", "b", "a", "c", "d", "e", "e", "f"]
+        )
+
+
+class TestDeduplicatedBatch(TestBase):
+    '''
+        Tests identical requests of a batch run once.
+    '''
+
+    def setUp(self):
+        patcher = mock.patch.object(_settings, "DEDUPLICATE_REQUESTS", True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post_batch(self):
+        with mock.patch("batch_requests.views.get_view_response", side_effect=get_view_response) as view:
+            with self.settings(DEBUG=True):
+                resp = self.client.post("/api/v1/batch/", json.dumps([
+                    self._batch_request("get", "/views/", ""),
+                    self._batch_request("post", "/views/", "data", {"content_type": "text/plain"}),
+                    self._batch_request("get", "/views/", ""),
+                ]), content_type="application/json")
+                content = b"".join(resp.streaming_content) if resp.streaming else resp.content
+        return resp, json.loads(content.decode("utf-8")), view.call_count
+
+    def test_duplicates_run_once(self):
+        resp, responses, calls = self.post_batch()
+
+        self.assertEqual(calls, 2)
+        self.assertEqual([r["status_code"] for r in responses], [200, 201, 200])
+        self.assertEqual(responses[0], responses[2])
+        self.assertEqual(json.loads(resp[_settings.DEDUPLICATION_HEADER_NAME]), {"2": 0})
+
+    def test_streaming(self):
+        with mock.patch.object(_settings, "STREAM_RESPONSES", True):
+            resp, responses, calls = self.post_batch()
+
+        self.assertEqual(calls, 2)
+        self.assertEqual([r["status_code"] for r in responses], [200, 201, 200])
+        self.assertEqual(json.loads(resp[_settings.DEDUPLICATION_HEADER_NAME]), {"2": 0})
@@ -0,0 +1,106 @@
+'''
+@summary: Test cases for dependencies between the requests of a batch.
+'''
+from __future__ import absolute_import, unicode_literals
+
+import json
+
+from django.test import SimpleTestCase
+
+from batch_requests.dependencies import DependencyGraph, resolve_json_path
+from batch_requests.exceptions import BadBatchRequest
+from tests.test_base import TestBase
+
+
+class TestDependencyGraph(SimpleTestCase):
+    '''
+        Tests the ordering of the requests and the resolution of references.
+    '''
+
+    def test_layers(self):
+        graph = DependencyGraph([
+            {"url": "/b/{result=a:$.id}/", "method": "get", "name": "b"},
+            {"url": "/a/", "method": "post", "name": "a"},
+            {"url": "/c/", "method": "get"},
+            {"url": "/d/", "method": "get", "depends_on": ["a", "b"]},
+        ])
+
+        self.assertEqual(graph.layers, [[1, 2], [0], [3]])
+
+    def test_circular_dependencies(self):
+        with self.assertRaises(BadBatchRequest):
+            DependencyGraph([
+                {"url": "/a/", "method": "get", "name": "a", "depends_on": ["b"]},
+                {"url": "/b/", "method": "get", "name": "b", "depends_on": ["a"]},
+            ])
+
+    def test_unknown_name(self):
+        with self.assertRaises(BadBatchRequest):
+            DependencyGraph([{"url": "/a/{result=nope:$.id}/", "method": "get"}])
+
+    def test_json_path(self):
+        document = {"items": [{"id": 1}, {"id": 2, "tags": {"a b": "c"}}]}
+
+        self.assertEqual(resolve_json_path(document, "$"), document)
+        self.assertEqual(resolve_json_path(document, "$.items[1].id"), 2)
+        self.assertEqual(resolve_json_path(document, "$.items[-1].tags['a b']"), "c")
+
+
+class TestDependentRequests(TestBase):
+    '''
+        Tests requests referring to the responses of earlier requests.
+    '''
+
+    def post_batch(self, requests):
+        resp = self.client.post("/api/v1/batch/", json.dumps(requests), content_type="application/json")
+        self.assertEqual(resp.status_code, 200)
+        return json.loads(resp.content.decode("utf-8"))
+
+    def test_references(self):
+        responses = self.post_batch([
+            {
+                "method": "post", "url": "/views/", "name": "create",
+                "body": json.dumps({"id": 7}), "headers": {"content_type": "text/plain"},
+            },
+            {
+                "method": "post", "url": "/views/?id={result=create:$.id}",
+                "body": {"user": "{result=create:$.id}"},
+            },
+            {
+                "method": "get", "url": "/echo/?header=HTTP_X_USER",
+                "headers": {"X_USER": "user-{result=create:$.id}"},
+            },
+        ])
+
+        self.assertEqual([r["status_code"] for r in responses], [201, 201, 200])
+        self.assertEqual(json.loads(responses[1]["body"]), {"user": 7})
+        self.assertEqual(responses[2]["body"], "user-7")
+
+    def test_failed_dependency(self):
+        responses = self.post_batch([
+            {"method": "get", "url": "/exception/", "name": "broken"},
+            {"method": "get", "url": "/views/", "depends_on": ["broken"]},
+            {"method": "get", "url": "/views/"},
+        ])
+
+        self.assertEqual([r["status_code"] for r in responses], [500, 424, 200])
+        self.assertEqual(responses[1]["body"], "Request 'broken' failed with status 500.")
+
+    def test_circular_dependencies(self):
+        resp = self.client.post("/api/v1/batch/", json.dumps([
+            {"method": "get", "url": "/views/", "name": "a", "depends_on": "a"},
+        ]), content_type="application/json")
+
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.content, b"Requests have circular dependencies.")
+
+    def test_invalid_names(self):
+        for data in (
+            {"method": "get", "url": "/views/", "name": 1},
+            {"method": "get", "url": "/views/", "depends_on": [1]},
+            {"method": "get", "url": "/views/", "depends_on": [{"a": 1}]},
+            {"method": "get", "url": "/views/", "depends_on": {"a": 1}},
+        ):
+            resp = self.client.post("/api/v1/batch/", json.dumps([data]), content_type="application/json")
+
+            self.assertEqual(resp.status_code, 400)
@@ -0,0 +1,85 @@
+'''
+@summary: Test cases for the encoding of the batch response from byte chunks.
+'''
+from __future__ import absolute_import, unicode_literals
+
+import json
+
+import mock
+from django.http.response import HttpResponse
+from django.test import SimpleTestCase
+
+from batch_requests.encoding import RawJSON, encode, is_json_response, looks_like_json
+from batch_requests.settings import br_settings as _settings
+from tests.test_base import TestBase
+
+
+class TestEncode(SimpleTestCase):
+    '''
+        Tests the chunked encoder produces the same documents as json.dumps.
+    '''
+
+    def test_same_as_json_dumps(self):
+        value = [
+            {"status_code": 200, "headers": {"X-A": "é", "d": 0.5}, "body": b"caf\xc3\xa9 \"q\""},
+            {"body": None, "empty": {}, "list": [], "flag": True},
+            [],
+        ]
+        expected = json.loads(json.dumps([
+            {"status_code": 200, "headers": {"X-A": "é", "d": 0.5}, "body": "café \"q\""},
+            {"body": None, "empty": {}, "list": [], "flag": True},
+            [],
+        ]))
+
+        self.assertEqual(json.loads(encode(value).decode("utf-8")), expected)
+
+    def test_raw_json_embedded_verbatim(self):
+        content = b'{"a":   [1, 2]}'
+        encoded = encode({"body": RawJSON(content)})
+
+        self.assertIn(content, encoded)
+        self.assertEqual(json.loads(encoded.decode("utf-8")), {"body": {"a": [1, 2]}})
+
+    def test_is_json_response(self):
+        self.assertTrue(is_json_response(HttpResponse(content_type="application/json")))
+        self.assertTrue(is_json_response(HttpResponse(content_type="application/vnd.api+json; charset=utf-8")))
+        self.assertFalse(is_json_response(HttpResponse(content_type="text/html")))
+        self.assertFalse(is_json_response(HttpResponse(content_type="application/jsonp")))
+
+    def test_looks_like_json(self):
+        for content in (b'{"a": 1}', b' [1]\n', b'"text"', b"null", b"-1.5e3"):
+            self.assertTrue(looks_like_json(content), content)
+        for content in (b"", b"not json", b'{"a": 1', b"<html></html>", "{}"):
+            self.assertFalse(looks_like_json(content), content)
+
+
+class TestRawJSONBodies(TestBase):
+    '''
+        Tests JSON sub-response bodies are not parsed when deserializing responses.
+    '''
+
+    def test_json_body_not_parsed(self):
+        content = b'{"id": 7,  "tags": ["a"]}'
+        view_response = HttpResponse(content, content_type="application/json")
+        with mock.patch.object(_settings, "DESERIALIZE_RESPONSES", True), \
+                mock.patch("batch_requests.views.get_view_response", return_value=view_response):
+            resp = self.make_a_batch_request("get", "/views/", "")
+
+        # Spacing of the view survives, the body was never parsed and dumped again.
+        self.assertIn(content, resp.content)
+        self.assertEqual(json.loads(resp.content.decode("utf-8"))[0]["body"], {"id": 7, "tags": ["a"]})
+
+    def test_other_bodies_still_deserialized(self):
+        with mock.patch.object(_settings, "DESERIALIZE_RESPONSES", True):
+            resp = self.make_a_batch_request("post", "/views/", '{"text": "hi"}')
+
+        self.assertEqual(json.loads(resp.content.decode("utf-8"))[0]["body"], {"text": "hi"})
+
+    def test_malformed_json_body(self):
+        view_response = HttpResponse(b"not json", content_type="application/json")
+        with mock.patch.object(_settings, "DESERIALIZE_RESPONSES", True), \
+                mock.patch("batch_requests.views.get_view_response", return_value=view_response):
+            resp = self.make_a_batch_request("get", "/views/", "")
+
+        # The batch response is still JSON, with the body passed on as a string.
+        self.assertEqual(json.loads(resp.content.decode("utf-8"))[0]["body"], "not json")
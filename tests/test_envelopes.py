@@ -0,0 +1,149 @@
+'''
+@summary: Test cases for the binary envelopes of batch requests and responses.
+'''
+from __future__ import absolute_import, unicode_literals
+
+import json
+import unittest
+
+import mock
+from django.core.exceptions import ImproperlyConfigured
+from django.test import RequestFactory, SimpleTestCase
+
+from batch_requests.envelopes import (
+    CBOREnvelope,
+    Envelope,
+    JSONEnvelope,
+    MessagePackEnvelope,
+    get_request_envelope,
+    get_response_envelope,
+)
+from batch_requests.settings import br_settings as _settings
+from tests.test_base import TestBase
+
+
+BINARY_BODY = b"\x89PNG\r\n\x1a\n\x00\xff"
+
+
+def get_envelopes():
+    try:
+        return [JSONEnvelope(), MessagePackEnvelope(), CBOREnvelope()]
+    except ImproperlyConfigured:
+        raise unittest.SkipTest("msgpack and cbor2 are needed for these tests.")
+
+
+class TestEnvelope(SimpleTestCase):
+    '''
+        Tests envelopes implement the whole format.
+    '''
+
+    def test_incomplete_envelope(self):
+        class NotStreamedEnvelope(Envelope):
+            content_types = ("application/json",)
+
+            def loads(self, data):
+                return json.loads(data)
+
+            def dumps(self, value):
+                return json.dumps(value).encode("utf-8")
+
+        with self.assertRaises(TypeError):
+            NotStreamedEnvelope()
+
+
+class TestNegotiation(SimpleTestCase):
+    '''
+        Tests the envelopes picked for batch requests and responses.
+    '''
+
+    def setUp(self):
+        self.envelopes = get_envelopes()
+        patcher = mock.patch.object(_settings, "envelopes", self.envelopes)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_request(self, content_type, accept=None):
+        extra = {"HTTP_ACCEPT": accept} if accept else {}
+        return RequestFactory().post("/api/v1/batch/", b"[]", content_type=content_type, **extra)
+
+    def test_request_envelope(self):
+        json_envelope, msgpack_envelope, cbor_envelope = self.envelopes
+        self.assertIs(get_request_envelope(self.get_request("application/x-msgpack")), msgpack_envelope)
+        self.assertIs(get_request_envelope(self.get_request("application/cbor; foo=bar")), cbor_envelope)
+        self.assertIs(get_request_envelope(self.get_request("text/plain")), json_envelope)
+
+    def test_response_envelope(self):
+        json_envelope, msgpack_envelope, cbor_envelope = self.envelopes
+        request = self.get_request("application/json", "text/html, application/cbor, application/msgpack")
+        self.assertIs(get_response_envelope(request), cbor_envelope)
+        self.assertIs(get_response_envelope(self.get_request("application/msgpack", "*/*")), msgpack_envelope)
+        self.assertIs(get_response_envelope(self.get_request("application/json")), json_envelope)
+
+
+class TestBinaryBatch(TestBase):
+    '''
+        Tests batches exchanged in binary envelopes carry raw bodies.
+    '''
+
+    def setUp(self):
+        self.json_envelope, self.msgpack_envelope, self.cbor_envelope = get_envelopes()
+        patcher = mock.patch.object(_settings, "envelopes", [
+            self.json_envelope, self.msgpack_envelope, self.cbor_envelope,
+        ])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post_batch(self, envelope, requests, **extra):
+        resp = self.client.post(
+            "/api/v1/batch/", envelope.dumps(requests), content_type=envelope.content_type, **extra
+        )
+        content = b"".join(resp.streaming_content) if resp.streaming else resp.content
+        return resp, content
+
+    def test_msgpack_batch(self):
+        resp, content = self.post_batch(self.msgpack_envelope, [
+            {"method": "post", "url": "/views/", "body": BINARY_BODY, "headers": {"content_type": "image/png"}},
+            {"method": "get", "url": "/views/"},
+        ])
+
+        self.assertEqual(resp["Content-Type"], "application/msgpack")
+        responses = self.msgpack_envelope.loads(content)
+        self.assertEqual(responses[0]["status_code"], 201)
+        self.assertEqual(responses[0]["body"], BINARY_BODY)
+        self.assertEqual(responses[1]["body"], b"Success!")
+
+    def test_json_request_cbor_response(self):
+        resp, content = self.post_batch(
+            self.json_envelope, [{"method": "get", "url": "/views/"}], HTTP_ACCEPT="application/cbor"
+        )
+
+        self.assertEqual(resp["Content-Type"], "application/cbor")
+        self.assertEqual(self.cbor_envelope.loads(content)[0]["body"], b"Success!")
+
+    def test_streamed_msgpack_batch(self):
+        with mock.patch.object(_settings, "STREAM_RESPONSES", True):
+            resp, content = self.post_batch(self.msgpack_envelope, [
+                {"method": "post", "url": "/views/", "body": BINARY_BODY, "headers": {"content_type": "image/png"}},
+                {"method": "get", "url": "/views/"},
+            ])
+
+        self.assertTrue(resp.streaming)
+        responses = self.msgpack_envelope.loads(content)
+        self.assertEqual([r["body"] for r in responses], [BINARY_BODY, b"Success!"])
+
+    def test_streamed_cbor_batch(self):
+        with mock.patch.object(_settings, "STREAM_RESPONSES", True):
+            resp, content = self.post_batch(
+                self.json_envelope, [{"method": "get", "url": "/views/"}] * 2, HTTP_ACCEPT="application/cbor"
+            )
+
+        self.assertEqual([r["body"] for r in self.cbor_envelope.loads(content)], [b"Success!"] * 2)
+
+    def test_json_bodies_decoded(self):
+        with mock.patch.object(_settings, "DESERIALIZE_RESPONSES", True):
+            resp, content = self.post_batch(self.msgpack_envelope, [
+                {"method": "post", "url": "/views/", "body": json.dumps({"a": 1}),
+                 "headers": {"content_type": "application/json"}},
+            ])
+
+        self.assertEqual(self.msgpack_envelope.loads(content)[0]["body"], {"a": 1})
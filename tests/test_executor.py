@@ -0,0 +1,105 @@
+'''
+@summary: Test cases for the lifecycle of the executor pools.
+'''
+from __future__ import absolute_import, unicode_literals
+
+import threading
+
+import mock
+from django.test import SimpleTestCase
+
+from batch_requests.concurrent.executor import (
+    SequentialExecutor,
+    ThreadBasedExecutor,
+    TimeoutError,
+    shutdown_executors,
+)
+
+
+def _identity(value):
+    return value
+
+
+class TestExecutorPool(SimpleTestCase):
+    '''
+        Tests the executor pools are shared, recreated and shut down as expected.
+    '''
+
+    def setUp(self):
+        self.executor = ThreadBasedExecutor(2)
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def test_pool_is_created_lazily(self):
+        self.assertIsNone(self.executor._pool)
+        self.executor.execute([1], _identity)
+        self.assertIsNotNone(self.executor._pool)
+
+    def test_pool_is_shared_across_batches(self):
+        self.assertEqual(self.executor.execute([1, 2], _identity), [1, 2])
+        pool = self.executor.get_executor_pool()
+
+        self.assertEqual(self.executor.execute([3], _identity), [3])
+        self.assertIs(self.executor.get_executor_pool(), pool)
+
+    def test_pool_is_recreated_after_fork(self):
+        pool = self.executor.get_executor_pool()
+
+        with mock.patch("batch_requests.concurrent.executor.os.getpid", return_value=-1):
+            forked_pool = self.executor.get_executor_pool()
+
+        self.assertIsNot(forked_pool, pool)
+        pool.shutdown()
+
+    def test_shutdown_allows_restart(self):
+        pool = self.executor.get_executor_pool()
+        shutdown_executors()
+
+        self.assertIsNone(self.executor._pool)
+        self.assertIsNot(self.executor.get_executor_pool(), pool)
+
+    def test_sequential_executor(self):
+        self.assertEqual(SequentialExecutor(2).execute([1, 2], _identity), [1, 2])
+
+
+class TestExecutorQueue(SimpleTestCase):
+    '''
+        Tests the bound on the submission queue.
+    '''
+
+    def test_submission_blocks_when_queue_is_full(self):
+        executor = ThreadBasedExecutor(2, queue_size=1)
+        release = threading.Event()
+        pool = executor.get_executor_pool()
+
+        first = executor.submit(pool, release.wait)
+        blocked = threading.Thread(target=executor.submit, args=(pool, _identity, 1))
+        blocked.start()
+        blocked.join(0.1)
+        self.assertTrue(blocked.is_alive(), "Submission should wait for a free slot.")
+
+        release.set()
+        blocked.join(1)
+        self.assertFalse(blocked.is_alive())
+        self.assertTrue(first.result())
+        executor.shutdown()
+
+    def test_submission_times_out(self):
+        executor = ThreadBasedExecutor(1, queue_size=1, queue_timeout=0.1)
+        release = threading.Event()
+        pool = executor.get_executor_pool()
+
+        first = executor.submit(pool, release.wait)
+        with self.assertRaises(TimeoutError):
+            executor.submit(pool, _identity, 1)
+
+        # A request finding no free slot is answered as timed out, and never run.
+        future, _ = executor.submit_request(pool, 0, 1, _identity)
+        with self.assertRaises(TimeoutError):
+            future.result(0)
+
+        release.set()
+        self.assertTrue(first.result())
+        self.assertEqual(executor.submit(pool, _identity, 1).result(), 1)
+        executor.shutdown()
@@ -0,0 +1,142 @@
+'''
+@summary: Test cases for the timings of batches and sub-requests.
+'''
+from __future__ import absolute_import, unicode_literals
+
+import json
+import unittest
+
+import mock
+import six
+from django.test import SimpleTestCase
+
+from batch_requests.instrumentation import Timings
+from batch_requests.metrics import InMemoryMetricsSink, StatsdMetricsSink
+from batch_requests.settings import br_settings as _settings
+from batch_requests.signals import batch_finished, sub_request_finished
+from tests.test_base import TestBase
+
+
+def get_stages(server_timing):
+    return [entry.split(";")[0] for entry in server_timing.split(", ")]
+
+
+class TestTimings(SimpleTestCase):
+    '''
+        Tests stages are measured and formatted.
+    '''
+
+    def test_server_timing(self):
+        timings = Timings(start=0)
+        timings.add("parse", 0.0015)
+        timings.add("view", 0.25)
+        timings.add("parse", 0.001)
+
+        self.assertEqual(timings.as_server_timing(), "parse;dur=2.500, view;dur=250.000")
+
+    def test_measure(self):
+        timings = Timings()
+        with timings.measure("stage"):
+            pass
+        timings.finish()
+
+        self.assertEqual(list(timings.durations), ["stage", "total"])
+        self.assertLessEqual(timings.durations["stage"], timings.durations["total"])
+
+    def test_statsd_sink(self):
+        statsd = mock.Mock()
+        with mock.patch("batch_requests.metrics.import_library", return_value=statsd):
+            sink = StatsdMetricsSink(host="statsd", port=8125)
+        sink.increment("batch_requests.sub_requests", tags={"status": "2xx"})
+        sink.observe("batch_requests.batch.duration", 0.5, {"stage": "parse"})
+
+        statsd.StatsClient.assert_called_once_with(host="statsd", port=8125)
+        sink.client.incr.assert_called_once_with("batch_requests.sub_requests.2xx", 1)
+        sink.client.timing.assert_called_once_with("batch_requests.batch.duration.parse", 500.0)
+
+
+class TestInstrumentedBatch(TestBase):
+    '''
+        Tests the timings of batches are reported.
+    '''
+
+    def post_batch(self, url="/api/v1/batch/"):
+        return self.client.post(url, json.dumps([
+            {"method": "get", "url": "/views/"},
+            {"method": "get", "url": "/exception/"},
+        ]), content_type="application/json")
+
+    def test_server_timing(self):
+        with mock.patch.object(_settings, "SERVER_TIMING", True):
+            resp = self.post_batch()
+
+        self.assertEqual(get_stages(resp["Server-Timing"]), ["parse", "construct", "execute", "serialise", "total"])
+        for sub_response in json.loads(resp.content.decode("utf-8")):
+            self.assertEqual(
+                get_stages(sub_response["headers"]["Server-Timing"]),
+                ["queue", "resolve", "view", "serialise", "total"],
+            )
+
+    def test_no_server_timing_by_default(self):
+        resp = self.post_batch()
+
+        self.assertFalse(resp.has_header("Server-Timing"))
+        self.assertNotIn("Server-Timing", json.loads(resp.content.decode("utf-8"))[0]["headers"])
+
+    def test_signals(self):
+        batch_receiver, sub_request_receiver = mock.Mock(), mock.Mock()
+        batch_finished.connect(batch_receiver)
+        sub_request_finished.connect(sub_request_receiver)
+        self.addCleanup(batch_finished.disconnect, batch_receiver)
+        self.addCleanup(sub_request_finished.disconnect, sub_request_receiver)
+
+        self.post_batch()
+
+        self.assertEqual(batch_receiver.call_count, 1)
+        kwargs = batch_receiver.call_args[1]
+        self.assertEqual(len(kwargs["responses"]), 2)
+        self.assertIn("execute", kwargs["timings"].durations)
+
+        self.assertEqual(sub_request_receiver.call_count, 2)
+        statuses = sorted(call[1]["response"]["status_code"] for call in sub_request_receiver.call_args_list)
+        self.assertEqual(statuses, [200, 500])
+        self.assertIn(sub_request_receiver.call_args[1]["request"].path_info, ("/views/", "/exception/"))
+
+    def test_metrics(self):
+        sink = InMemoryMetricsSink()
+        with mock.patch.object(_settings, "metrics_sink", sink):
+            self.post_batch()
+
+        self.assertEqual(sink.get_counter("batch_requests.batches"), 1)
+        self.assertEqual(sink.get_counter("batch_requests.sub_requests", status="2xx"), 1)
+        self.assertEqual(sink.get_counter("batch_requests.sub_requests", status="5xx"), 1)
+        self.assertEqual(sink.get_histogram("batch_requests.batch.size"), [2])
+        self.assertEqual(len(sink.get_histogram("batch_requests.batch.duration", stage="execute")), 1)
+        self.assertEqual(len(sink.get_histogram("batch_requests.sub_request.duration", stage="view")), 2)
+
+    def test_streamed_batch(self):
+        batch_receiver = mock.Mock()
+        batch_finished.connect(batch_receiver)
+        self.addCleanup(batch_finished.disconnect, batch_receiver)
+
+        with mock.patch.object(_settings, "STREAM_RESPONSES", True), \
+                mock.patch.object(_settings, "SERVER_TIMING", True):
+            resp = self.post_batch()
+            self.assertEqual(get_stages(resp["Server-Timing"]), ["parse", "construct"])
+            self.assertFalse(batch_receiver.called)
+            b"".join(resp.streaming_content)
+
+        self.assertEqual(batch_receiver.call_count, 1)
+        self.assertEqual(list(batch_receiver.call_args[1]["timings"].durations)[-2:], ["stream", "total"])
+
+    @unittest.skipIf(six.PY2, "The async batch view needs Python 3.")
+    def test_async_batch(self):
+        with mock.patch.object(_settings, "SERVER_TIMING", True):
+            resp = self.post_batch("/api/v1/async-batch/")
+
+        self.assertEqual(get_stages(resp["Server-Timing"]), ["parse", "construct", "execute", "serialise", "total"])
+        sub_response = json.loads(resp.content.decode("utf-8"))[0]
+        self.assertEqual(
+            get_stages(sub_response["headers"]["Server-Timing"]),
+            ["queue", "resolve", "view", "serialise", "total"],
+        )
@@ -0,0 +1,90 @@
+'''
+@summary: Test cases for the JSON codecs.
+'''
+from __future__ import absolute_import, unicode_literals
+
+import json
+import unittest
+
+import mock
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase
+
+from batch_requests.encoding import encode
+from batch_requests.json_codecs import JSONCodec, MsgspecCodec, OrjsonCodec, StdlibCodec, UjsonCodec
+from batch_requests.settings import br_settings as _settings
+from tests.test_base import TestBase
+
+
+def get_installed_codecs():
+    codecs = [StdlibCodec()]
+    for codec_class in (OrjsonCodec, UjsonCodec, MsgspecCodec):
+        try:
+            codecs.append(codec_class())
+        except ImproperlyConfigured:
+            pass
+    return codecs
+
+
+class TestCodecs(SimpleTestCase):
+    '''
+        Tests all the installed codecs behave the same.
+    '''
+
+    def test_round_trip(self):
+        value = {"url": "/a/b/", "text": "café", "list": [1, 2.5, None, True]}
+        for codec in get_installed_codecs():
+            encoded = codec.dumps(value)
+            self.assertIsInstance(encoded, bytes, codec.name)
+            self.assertEqual(json.loads(encoded.decode("utf-8")), value, codec.name)
+            self.assertEqual(codec.loads(encoded), value, codec.name)
+            self.assertEqual(codec.loads(encoded.decode("utf-8")), value, codec.name)
+
+    def test_invalid_document(self):
+        for codec in get_installed_codecs():
+            with self.assertRaises(ValueError, msg=codec.name):
+                codec.loads(b"{not json")
+
+    def test_missing_library(self):
+        with mock.patch("batch_requests.json_codecs.import_module", side_effect=ImportError):
+            with self.assertRaises(ImproperlyConfigured):
+                OrjsonCodec()
+
+    def test_incomplete_codec(self):
+        class LoadsOnlyCodec(JSONCodec):
+            def loads(self, data):
+                return json.loads(data)
+
+        with self.assertRaises(TypeError):
+            LoadsOnlyCodec()
+
+    def test_encode_with_codec(self):
+        value = [{"headers": {"A": "b"}, "body": b"x", "status_code": 200}]
+        for codec in get_installed_codecs():
+            self.assertEqual(json.loads(encode(value, codec).decode("utf-8")), [
+                {"headers": {"A": "b"}, "body": "x", "status_code": 200},
+            ], codec.name)
+
+
+class TestBatchWithCodec(TestBase):
+    '''
+        Tests batches are parsed and encoded with the configured codec.
+    '''
+
+    def test_orjson_batch(self):
+        try:
+            codec = OrjsonCodec()
+        except ImproperlyConfigured:
+            raise unittest.SkipTest("orjson is not installed.")
+
+        with mock.patch.object(_settings, "json_codec", codec), \
+                mock.patch.object(codec, "dumps", wraps=codec.dumps) as dumps:
+            resp = self.make_multiple_batch_request([
+                ("get", "/views/", "", {}),
+                ("post", "/views/", json.dumps({"text": "hi"}), {"content_type": "application/json"}),
+            ])
+
+        self.assertTrue(dumps.called)
+        responses = json.loads(resp.text)
+        self.assertEqual(responses[0]["body"], "Success!")
+        self.assertEqual(json.loads(responses[1]["body"]), {"text": "hi"})
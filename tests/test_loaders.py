@@ -0,0 +1,156 @@
+'''
+@summary: Test cases for the batch scoped data loaders.
+'''
+from __future__ import absolute_import, unicode_literals
+
+import json
+import threading
+
+import mock
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, override_settings
+
+from batch_requests.concurrent.executor import ThreadBasedExecutor
+from batch_requests.loaders import BatchContext, DataLoader, ModelLoader, get_loader
+from batch_requests.metrics import InMemoryMetricsSink
+from batch_requests.routers import BatchRouting
+from batch_requests.settings import br_settings as _settings
+from tests.test_base import TestBase
+from tests.test_views import get_squares
+
+
+class TestDataLoader(SimpleTestCase):
+    '''
+        Tests loaders memoise and coalesce lookups.
+    '''
+
+    def test_memoised(self):
+        batch_load_fn = mock.Mock(side_effect=get_squares)
+        loader = DataLoader(batch_load_fn)
+
+        self.assertEqual(loader.load(2), 4)
+        self.assertEqual(loader.load_many([2, 3]), [4, 9])
+        self.assertEqual(loader.load(3), 9)
+
+        self.assertEqual([call[0][0] for call in batch_load_fn.call_args_list], [[2], [3]])
+        self.assertEqual((loader.lookups, loader.queries), (3, 2))
+
+    def test_list_values(self):
+        loader = DataLoader(lambda keys: [key.upper() for key in keys])
+
+        self.assertEqual(loader.load_many(["a", "b"]), ["A", "B"])
+
+    def test_missing_values(self):
+        self.assertIsNone(DataLoader(lambda keys: {}).load(1))
+
+    def test_failed_load_is_retried(self):
+        batch_load_fn = mock.Mock(side_effect=[ValueError("down"), {1: "one"}])
+        loader = DataLoader(batch_load_fn)
+
+        with self.assertRaises(ValueError):
+            loader.load(1)
+        self.assertEqual(loader.load(1), "one")
+
+    def test_wrong_number_of_values(self):
+        with self.assertRaises(ValueError):
+            DataLoader(lambda keys: []).load(1)
+
+    def test_coalesced(self):
+        batch_load_fn = mock.Mock(side_effect=get_squares)
+        loader = DataLoader(batch_load_fn, window=0.05)
+        results = {}
+
+        def load(n):
+            results[n] = loader.load(n)
+
+        threads = [threading.Thread(target=load, args=(n,)) for n in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, {n: n * n for n in range(5)})
+        self.assertEqual(batch_load_fn.call_count, 1)
+        self.assertEqual(sorted(batch_load_fn.call_args[0][0]), list(range(5)))
+
+    def test_batch_context(self):
+        context = BatchContext()
+        request = mock.Mock(batch_context=context)
+
+        self.assertIs(get_loader(request, get_squares), get_loader(request, get_squares))
+        get_loader(request, get_squares).load_many([1, 2])
+        get_loader(request, get_squares).load(1)
+        self.assertEqual(context.stats(), {"lookups": 2, "queries": 1, "saved": 1})
+
+    def test_by_database(self):
+        context = BatchContext()
+        routing = BatchRouting("replica")
+        request = mock.Mock(batch_context=context, batch_routing=routing, batch_read_replica=True)
+        from_replica = get_loader(request, User)
+
+        self.assertEqual(from_replica.using, "replica")
+        self.assertIs(get_loader(request, User), from_replica)
+
+        # Once the batch wrote, its reads stick to the primary, as do those of its loaders.
+        routing.wrote = True
+        self.assertIsNone(get_loader(request, User).using)
+        self.assertEqual(len(context.loaders), 2)
+
+    def test_outside_batch(self):
+        request = mock.Mock(spec=[])
+
+        self.assertIsNot(get_loader(request, get_squares), get_loader(request, get_squares))
+
+
+class TestModelLoader(TestBase):
+    '''
+        Tests model instances are loaded by primary key.
+    '''
+
+    def setUp(self):
+        self.users = {pk: User(pk=pk, username=name) for pk, name in ((1, "ann"), (2, "bob"))}
+        patcher = mock.patch.object(User._default_manager, "in_bulk", side_effect=self.in_bulk)
+        self.in_bulk = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def in_bulk(self, pks):
+        return {pk: self.users[pk] for pk in pks if pk in self.users}
+
+    def test_load(self):
+        loader = ModelLoader(User)
+
+        self.assertEqual(loader.load_many([1, "2", 3]), [self.users[1], self.users[2], None])
+        self.assertEqual(loader.load(1), self.users[1])
+        self.in_bulk.assert_called_once_with([1, 2, 3])
+
+    @override_settings(DEBUG=True)
+    def test_batch(self):
+        sink = InMemoryMetricsSink()
+        with mock.patch.object(_settings, "metrics_sink", sink):
+            resp = self.client.post("/api/v1/batch/", json.dumps([
+                {"method": "get", "url": "/users/1/"},
+                {"method": "get", "url": "/users/2/"},
+                {"method": "get", "url": "/users/1/"},
+            ]), content_type="application/json")
+
+        bodies = [r["body"] for r in json.loads(resp.content.decode("utf-8"))]
+        self.assertEqual(bodies, ["ann", "bob", "ann"])
+        self.assertEqual(self.in_bulk.call_count, 2)
+        self.assertEqual(json.loads(resp[_settings.LOADER_HEADER_NAME]), {"lookups": 3, "queries": 2, "saved": 1})
+        self.assertEqual(sink.get_counter("batch_requests.loader.saved_queries"), 1)
+
+    @override_settings(DEBUG=True)
+    def test_concurrent_batch(self):
+        orig_executor = _settings.executor
+        _settings.executor = ThreadBasedExecutor(3)
+        try:
+            with mock.patch.object(_settings, "LOADER_BATCH_WINDOW", 0.05):
+                resp = self.client.post("/api/v1/batch/", json.dumps([
+                    {"method": "get", "url": "/squares/%d/" % n} for n in range(3)
+                ]), content_type="application/json")
+        finally:
+            _settings.executor.shutdown()
+            _settings.executor = orig_executor
+
+        self.assertEqual([r["body"] for r in json.loads(resp.content.decode("utf-8"))], ["0", "1", "4"])
+        self.assertEqual(json.loads(resp[_settings.LOADER_HEADER_NAME]), {"lookups": 3, "queries": 1, "saved": 2})
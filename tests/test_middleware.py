@@ -0,0 +1,84 @@
+'''
+@summary: Test cases for sub-requests going through the middleware stack.
+'''
+from __future__ import absolute_import, unicode_literals
+
+import json
+
+import mock
+from django.test import RequestFactory
+
+from batch_requests.settings import br_settings as _settings
+from batch_requests.views import handle_batch_requests
+from tests.test_base import TestBase
+
+
+MIDDLEWARE = ["tests.middleware.HeaderMiddleware", "tests.middleware.AttributeMiddleware"]
+
+
+class TestMiddleware(TestBase):
+    '''
+        Tests sub-requests go through the allowed middleware only.
+    '''
+
+    def setUp(self):
+        for attr, value in (("USE_MIDDLEWARE", True), ("SUB_REQUEST_MIDDLEWARE", MIDDLEWARE)):
+            patcher = mock.patch.object(_settings, attr, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def post_batch(self, requests):
+        resp = self.client.post("/api/v1/batch/", json.dumps(requests), content_type="application/json")
+        return resp, json.loads(resp.content.decode("utf-8")) if resp.status_code == 200 else None
+
+    def test_all_middleware(self):
+        _, responses = self.post_batch([{"method": "get", "url": "/echo/?header=middleware_attribute"}])
+
+        self.assertEqual(responses[0]["body"], "set")
+        self.assertEqual(responses[0]["headers"]["X-Header-Middleware"], "yes")
+
+    def test_some_middleware(self):
+        _, responses = self.post_batch([{
+            "method": "get", "url": "/echo/?header=middleware_attribute",
+            "middleware": ["tests.middleware.HeaderMiddleware"],
+        }])
+
+        self.assertEqual(responses[0]["body"], "None")
+        self.assertEqual(responses[0]["headers"]["X-Header-Middleware"], "yes")
+
+    def test_middleware_not_allowed(self):
+        resp, _ = self.post_batch([{
+            "method": "get", "url": "/views/", "middleware": ["tests.middleware.Unknown"],
+        }])
+
+        self.assertEqual(resp.status_code, 400)
+
+    def test_exception(self):
+        # The test client re-raises exceptions handled by Django, call the view directly.
+        request = RequestFactory().post(
+            "/api/v1/batch/",
+            json.dumps([{"method": "get", "url": "/exception/"}]),
+            content_type="application/json",
+        )
+        resp = handle_batch_requests(request)
+
+        self.assertEqual(json.loads(resp.content.decode("utf-8"))[0]["status_code"], 500)
+
+
+class TestSharedAttributes(TestBase):
+    '''
+        Tests sub-requests share the configured attributes of the batch request.
+    '''
+
+    def test_shared_user(self):
+        request = RequestFactory().post(
+            "/api/v1/batch/",
+            json.dumps([{"method": "get", "url": "/echo/?header=user"}]),
+            content_type="application/json",
+        )
+        request.user = "alice"
+
+        with mock.patch.object(_settings, "SHARED_REQUEST_ATTRIBUTES", ("user", "session")):
+            resp = handle_batch_requests(request)
+
+        self.assertEqual(json.loads(resp.content.decode("utf-8"))[0]["body"], "alice")
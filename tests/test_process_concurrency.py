@@ -4,8 +4,19 @@
 @summary: Test cases to make sure sequential execution and process based concurrent execution return
           the same response.
 '''
+import json
+import pickle
+
+import mock
+from django.test import RequestFactory, SimpleTestCase
+
 from tests.test_concurrency_base import TestBaseConcurrency
 from batch_requests.concurrent.executor import ProcessBasedExecutor
+from batch_requests.concurrent.process import SubResponse, from_result, init_worker, run_in_worker, to_spec
+from batch_requests.routers import BatchRouting
+from batch_requests.settings import br_settings as _settings
+from batch_requests.utils import get_wsgi_request_object
+from batch_requests.views import get_response
 
 
 class TestProcessConcurrency(TestBaseConcurrency):
@@ -31,3 +42,75 @@ class TestProcessConcurrency(TestBaseConcurrency):
             them sequentially.
         '''
         self.compare_seq_concurrent_duration()
+
+
+class TestProcessWorkers(SimpleTestCase):
+    '''
+        Tests what is exchanged with the worker processes.
+    '''
+
+    def test_sub_request_spec(self):
+        batch_request = RequestFactory().post(
+            "/api/v1/batch/", "[]", content_type="application/json", HTTP_USER_AGENT="agent"
+        )
+        request = get_wsgi_request_object(batch_request, "POST", "/views/?a=1", {"X-Custom": "x"}, "data")
+        request.batch_middleware = ("tests.middleware.SimpleMiddleware",)
+        request.batch_timeout = 1
+
+        spec = pickle.loads(pickle.dumps(to_spec(request)))
+        rebuilt = spec.to_request()
+
+        self.assertEqual(rebuilt.method, "POST")
+        self.assertEqual(rebuilt.path_info, "/views/")
+        self.assertEqual(rebuilt.GET.dict(), {"a": "1"})
+        self.assertEqual(rebuilt.META["HTTP_X_CUSTOM"], "x")
+        self.assertEqual(rebuilt.META["HTTP_USER_AGENT"], "agent")
+        self.assertEqual(rebuilt.body, b"data")
+        self.assertEqual(rebuilt.batch_middleware, ("tests.middleware.SimpleMiddleware",))
+        self.assertFalse(hasattr(rebuilt, "batch_timeout"))
+
+    def test_shared_attributes(self):
+        request = get_wsgi_request_object(RequestFactory().get("/"), "GET", "/views/", {}, "")
+        request.batch_routing = BatchRouting("replica")
+        request.batch_read_replica = True
+        request.batch_context = object()
+        request.custom = {"user": 1}
+
+        with mock.patch.object(_settings, "SHARED_REQUEST_ATTRIBUTES", ("custom",)):
+            rebuilt = pickle.loads(pickle.dumps(to_spec(request))).to_request()
+
+        self.assertEqual(rebuilt.batch_routing.replica, "replica")
+        self.assertTrue(rebuilt.batch_read_replica)
+        self.assertEqual(rebuilt.custom, {"user": 1})
+        self.assertFalse(hasattr(rebuilt, "batch_context"))
+
+    def test_sub_response(self):
+        d_resp = {"status_code": 200, "reason_phrase": "OK", "headers": {}, "body": "Success!"}
+        result = run_in_worker(lambda request: dict(d_resp), 1)
+
+        self.assertIsInstance(result, SubResponse)
+        self.assertEqual(from_result(pickle.loads(pickle.dumps(result))), d_resp)
+        self.assertEqual(run_in_worker(lambda request: {"other": request}, 1), {"other": 1})
+
+    def test_workers_are_initialised(self):
+        executor = ProcessBasedExecutor(1, mp_context="fork")
+        self.addCleanup(executor.shutdown)
+        pool = executor.get_executor_pool()
+
+        self.assertIs(pool._initializer, init_worker)
+        self.assertEqual(pool._mp_context.get_start_method(), "fork")
+        self.assertEqual(executor.execute([RequestFactory().get("/views/")], get_response)[0]["body"], b"Success!")
+
+    def test_bulk_views_not_grouped(self):
+        orig_executor = _settings.executor
+        _settings.executor = ProcessBasedExecutor(2, mp_context="fork")
+        try:
+            resp = self.client.post("/api/v1/batch/", json.dumps([
+                {"method": "get", "url": "/items/1/"},
+                {"method": "get", "url": "/items/2/"},
+            ]), content_type="application/json")
+        finally:
+            _settings.executor.shutdown()
+            _settings.executor = orig_executor
+
+        self.assertEqual([r["body"] for r in json.loads(resp.content.decode("utf-8"))], ["item 1", "item 2"])
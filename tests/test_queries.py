@@ -0,0 +1,121 @@
+'''
+@summary: Test cases for the accounting of the database queries of sub-requests.
+'''
+from __future__ import absolute_import, unicode_literals
+
+import json
+import unittest
+
+import mock
+import six
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from batch_requests.concurrent.executor import ThreadBasedExecutor
+from batch_requests.metrics import InMemoryMetricsSink
+from batch_requests.queries import QueryCounter, count_queries
+from batch_requests.settings import br_settings as _settings
+from batch_requests.views import call_bulk_handler
+from tests.test_base import TestBase
+
+
+class TestQueryCounter(TestCase):
+    '''
+        Tests the queries made in a block are counted.
+    '''
+
+    def test_count_queries(self):
+        counter = QueryCounter()
+        with connection.cursor() as cursor:
+            with count_queries(counter):
+                cursor.execute("SELECT 1")
+                cursor.execute("SELECT %s", [2])
+            cursor.execute("SELECT 1")
+
+        self.assertEqual(counter.count, 2)
+        self.assertGreater(counter.duration, 0)
+        self.assertEqual(connection.execute_wrappers, [])
+
+    def test_disabled(self):
+        with count_queries(None):
+            self.assertEqual(connection.execute_wrappers, [])
+
+
+@override_settings(DEBUG=True)
+class TestQueryAccounting(TestBase):
+    '''
+        Tests the queries of every sub-request are reported.
+    '''
+
+    def setUp(self):
+        patcher = mock.patch.object(_settings, "QUERY_ACCOUNTING", True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post_batch(self, urls, url="/api/v1/batch/"):
+        resp = self.client.post(url, json.dumps([
+            {"method": "get", "url": sub_url} for sub_url in urls
+        ]), content_type="application/json")
+        return json.loads(resp.content.decode("utf-8"))
+
+    def get_counts(self, responses):
+        return [json.loads(r["headers"][_settings.QUERY_HEADER_NAME])["count"] for r in responses]
+
+    def test_queries(self):
+        sink = InMemoryMetricsSink()
+        with mock.patch.object(_settings, "metrics_sink", sink), mock.patch.object(_settings, "SERVER_TIMING", True):
+            responses = self.post_batch(["/queries/2/", "/views/", "/queries/1/"])
+
+        self.assertEqual(self.get_counts(responses), [2, 0, 1])
+        self.assertIn("db;dur=", responses[0]["headers"]["Server-Timing"])
+        self.assertEqual(
+            sink.get_histogram("batch_requests.sub_request.queries", view="tests.test_views.query_view"), [2, 1]
+        )
+
+    def test_not_enabled(self):
+        with mock.patch.object(_settings, "QUERY_ACCOUNTING", False):
+            responses = self.post_batch(["/queries/2/"])
+
+        self.assertNotIn(_settings.QUERY_HEADER_NAME, responses[0]["headers"])
+
+    @override_settings(DEBUG=False)
+    def test_no_header_without_debug(self):
+        responses = self.post_batch(["/queries/2/"])
+
+        self.assertNotIn(_settings.QUERY_HEADER_NAME, responses[0]["headers"])
+
+    def test_thread_executor(self):
+        orig_executor = _settings.executor
+        _settings.executor = ThreadBasedExecutor(3)
+        try:
+            responses = self.post_batch(["/queries/1/", "/queries/2/", "/queries/3/"])
+        finally:
+            _settings.executor.shutdown()
+            _settings.executor = orig_executor
+
+        self.assertEqual(self.get_counts(responses), [1, 2, 3])
+
+    def test_bulk_handler(self):
+        def query_and_call(*args):
+            with connection.cursor() as cursor:
+                for i in range(6):
+                    cursor.execute("SELECT %s", [i])
+            return call_bulk_handler(*args)
+
+        sink = InMemoryMetricsSink()
+        with mock.patch("batch_requests.views.call_bulk_handler", side_effect=query_and_call), \
+                mock.patch.object(_settings, "metrics_sink", sink):
+            responses = self.post_batch(["/items/1/", "/items/2/", "/items/3/"])
+
+        # The queries of the call are split between the sub-requests it answers.
+        self.assertEqual(self.get_counts(responses), [2, 2, 2])
+        self.assertEqual(json.loads(responses[0]["headers"][_settings.QUERY_HEADER_NAME])["shared_by"], 3)
+        self.assertEqual(
+            sum(sink.get_histogram("batch_requests.sub_request.queries", view="tests.test_views.item_view")), 6
+        )
+
+    @unittest.skipIf(six.PY2, "The async batch view needs Python 3.")
+    def test_async_batch(self):
+        responses = self.post_batch(["/queries/2/", "/queries/1/"], "/api/v1/async-batch/")
+
+        self.assertEqual(self.get_counts(responses), [2, 1])
@@ -0,0 +1,76 @@
+'''
+@summary: Test cases for the cache of resolved sub-request paths.
+'''
+from __future__ import absolute_import, unicode_literals
+
+import json
+
+import mock
+from django.test import SimpleTestCase
+from django.urls import clear_url_caches, set_urlconf
+from django.urls.exceptions import Resolver404
+
+from batch_requests.resolver import ResolverCache
+from batch_requests.settings import br_settings as _settings
+from tests.test_base import TestBase
+
+
+class TestResolverCache(SimpleTestCase):
+    '''
+        Tests resolved paths are memoized and invalidated.
+    '''
+
+    def setUp(self):
+        self.cache = ResolverCache(10)
+
+    def test_resolves_once(self):
+        with mock.patch("django.urls.resolvers.URLResolver.resolve", autospec=True) as resolve:
+            resolve.return_value.kwargs = {}
+            self.cache.resolve("/views/")
+            self.cache.resolve("/views/")
+
+        self.assertEqual(resolve.call_count, 1)
+
+    def test_kwargs_are_not_shared(self):
+        first = self.cache.resolve("/views/")
+        first.kwargs["request"] = "mine"
+
+        self.assertNotIn("request", self.cache.resolve("/views/").kwargs)
+
+    def test_not_found(self):
+        for _ in range(2):
+            with self.assertRaises(Resolver404):
+                self.cache.resolve("/not-there/")
+
+    def test_invalidated_on_urlconf_reload(self):
+        self.cache.resolve("/views/")
+        resolver = self.cache.entries.get((None, "/views/"))[0]
+        clear_url_caches()
+        self.cache.resolve("/views/")
+
+        self.assertIsNot(self.cache.entries.get((None, "/views/"))[0], resolver)
+
+    def test_keyed_on_urlconf(self):
+        self.cache.resolve("/views/")
+        set_urlconf("tests.urls")
+        try:
+            self.cache.resolve("/views/")
+        finally:
+            set_urlconf(None)
+
+        self.assertEqual(len(self.cache.entries), 2)
+
+
+class TestCachedResolution(TestBase):
+    '''
+        Tests batches resolve their sub-requests through the cache when enabled.
+    '''
+
+    def test_batch(self):
+        cache = ResolverCache(10)
+        with mock.patch.object(_settings, "resolver_cache", cache):
+            first = json.loads(self.make_a_batch_request("get", "/views/", "").text)[0]
+            second = json.loads(self.make_a_batch_request("get", "/views/", "").text)[0]
+
+        self.assertEqual((first["status_code"], second["status_code"]), (200, 200))
+        self.assertEqual(len(cache.entries), 1)
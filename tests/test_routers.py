@@ -0,0 +1,148 @@
+'''
+@summary: Test cases for the routing of the reads of sub-requests to a read replica.
+'''
+from __future__ import absolute_import, unicode_literals
+
+import json
+import unittest
+
+import mock
+import six
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, override_settings
+
+from batch_requests.concurrent.executor import ProcessBasedExecutor, ThreadBasedExecutor
+from batch_requests.routers import BatchReplicaRouter
+from batch_requests.settings import br_settings as _settings
+from tests.test_base import TestBase
+
+
+class TestBatchReplicaRouter(SimpleTestCase):
+    '''
+        Tests the router leaves queries made outside of sub-requests alone.
+    '''
+
+    def setUp(self):
+        patcher = mock.patch.object(_settings, "READ_REPLICA_DATABASE", "replica")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.router = BatchReplicaRouter()
+
+    def get_user(self, db):
+        user = User()
+        user._state.db = db
+        return user
+
+    def test_outside_sub_requests(self):
+        self.assertIsNone(self.router.db_for_read(User))
+        self.assertIsNone(self.router.db_for_write(User))
+
+    def test_replica_instances_saved_to_primary(self):
+        self.assertEqual(self.router.db_for_write(User, instance=self.get_user("replica")), "default")
+        self.assertIsNone(self.router.db_for_write(User, instance=self.get_user("other")))
+
+    def test_allow_relation(self):
+        self.assertTrue(self.router.allow_relation(self.get_user("replica"), self.get_user("default")))
+        self.assertIsNone(self.router.allow_relation(self.get_user("replica"), self.get_user("other")))
+
+
+@override_settings(DATABASE_ROUTERS=["batch_requests.routers.BatchReplicaRouter"])
+class TestReplicaBatch(TestBase):
+    '''
+        Tests the reads of safe sub-requests go to the replica until the batch writes.
+    '''
+
+    def setUp(self):
+        patcher = mock.patch.object(_settings, "READ_REPLICA_DATABASE", "replica")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_databases(self, requests, url="/api/v1/batch/"):
+        resp = self.client.post(url, json.dumps(requests), content_type="application/json")
+        return [r["body"] for r in json.loads(resp.content.decode("utf-8"))]
+
+    def test_safe_methods(self):
+        databases = self.get_databases([
+            {"method": "get", "url": "/databases/"},
+            {"method": "head", "url": "/databases/"},
+            {"method": "options", "url": "/databases/"},
+        ])
+
+        self.assertEqual(databases, ["replica", "replica", "replica"])
+
+    def test_after_write_requested(self):
+        databases = self.get_databases([
+            {"method": "get", "url": "/databases/"},
+            {"method": "post", "url": "/databases/", "body": "", "headers": {"content_type": "text/plain"}},
+            {"method": "get", "url": "/databases/?a=1"},
+        ])
+
+        self.assertEqual(databases, ["replica", "default", "default"])
+
+    def test_tagged(self):
+        databases = self.get_databases([
+            {"method": "get", "url": "/databases/", "read_replica": False},
+            {"method": "post", "url": "/databases/", "read_replica": True, "body": "",
+             "headers": {"content_type": "text/plain"}},
+            {"method": "get", "url": "/databases/?a=1"},
+        ])
+
+        self.assertEqual(databases, ["default", "replica", "replica"])
+
+    def test_sticky_after_write(self):
+        databases = self.get_databases([
+            {"method": "get", "url": "/databases/?write=1"},
+            {"method": "get", "url": "/databases/"},
+        ])
+
+        self.assertEqual(databases, ["default", "default"])
+
+    def test_not_configured(self):
+        with mock.patch.object(_settings, "READ_REPLICA_DATABASE", None):
+            databases = self.get_databases([{"method": "get", "url": "/databases/"}])
+
+        self.assertEqual(databases, ["default"])
+
+    def test_invalid_tag(self):
+        resp = self.client.post("/api/v1/batch/", json.dumps([
+            {"method": "get", "url": "/databases/", "read_replica": "yes"},
+        ]), content_type="application/json")
+
+        self.assertEqual(resp.status_code, 400)
+
+    def test_thread_executor(self):
+        orig_executor = _settings.executor
+        _settings.executor = ThreadBasedExecutor(2)
+        try:
+            databases = self.get_databases([
+                {"method": "get", "url": "/databases/"},
+                {"method": "get", "url": "/databases/?a=1"},
+            ])
+        finally:
+            _settings.executor.shutdown()
+            _settings.executor = orig_executor
+
+        self.assertEqual(databases, ["replica", "replica"])
+
+    def test_process_executor(self):
+        orig_executor = _settings.executor
+        _settings.executor = ProcessBasedExecutor(2, mp_context="fork")
+        try:
+            databases = self.get_databases([
+                {"method": "get", "url": "/databases/"},
+                {"method": "post", "url": "/databases/", "body": "", "headers": {"content_type": "text/plain"}},
+            ])
+        finally:
+            _settings.executor.shutdown()
+            _settings.executor = orig_executor
+
+        self.assertEqual(databases, ["replica", "default"])
+
+    @unittest.skipIf(six.PY2, "The async batch view needs Python 3.")
+    def test_async_batch(self):
+        databases = self.get_databases([
+            {"method": "get", "url": "/databases/"},
+            {"method": "post", "url": "/databases/", "body": "", "headers": {"content_type": "text/plain"}},
+        ], "/api/v1/async-batch/")
+
+        self.assertEqual(databases, ["replica", "default"])
@@ -0,0 +1,68 @@
+'''
+@summary: Test cases for streamed batch responses.
+'''
+from __future__ import absolute_import, unicode_literals
+
+import json
+
+import mock
+
+from batch_requests.concurrent.executor import ThreadBasedExecutor
+from batch_requests.settings import br_settings as _settings
+from tests.test_base import TestBase
+
+
+class TestStreaming(TestBase):
+    '''
+        Tests the batch response can be streamed as a JSON array or as NDJSON.
+    '''
+
+    def setUp(self):
+        self.orig_executor = _settings.executor
+        patcher = mock.patch.object(_settings, "STREAM_RESPONSES", True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        _settings.executor.shutdown()
+        _settings.executor = self.orig_executor
+
+    def post_batch(self, requests, **extra):
+        resp = self.client.post(
+            "/api/v1/batch/", json.dumps(requests), content_type="application/json", **extra
+        )
+        self.assertTrue(resp.streaming)
+        return resp, b"".join(resp.streaming_content).decode("utf-8")
+
+    def test_json_array(self):
+        requests = [
+            self._batch_request("get", "/views/", ""),
+            self._batch_request("post", "/views/", "echo", {"content_type": "text/plain"}),
+        ]
+        resp, content = self.post_batch(requests)
+        responses = json.loads(content)
+
+        self.assertEqual(resp["Content-Type"], "application/json")
+        self.assertEqual([r["status_code"] for r in responses], [200, 201])
+        self.assertEqual(responses[1]["body"], "echo")
+
+    def test_ndjson_in_completion_order(self):
+        _settings.executor = ThreadBasedExecutor(2)
+        requests = [
+            self._batch_request("get", "/sleep/?seconds=1", ""),
+            self._batch_request("get", "/views/", ""),
+        ]
+        resp, content = self.post_batch(requests, HTTP_ACCEPT="application/x-ndjson")
+        responses = [json.loads(line) for line in content.splitlines()]
+
+        self.assertEqual(resp["Content-Type"], "application/x-ndjson")
+        self.assertEqual([r["index"] for r in responses], [1, 0])
+        self.assertEqual([r["status_code"] for r in responses], [200, 200])
+
+    def test_bad_request_is_not_streamed(self):
+        resp = self.client.post(
+            "/api/v1/batch/", json.dumps([{"method": "get"}]), content_type="application/json"
+        )
+
+        self.assertEqual(resp.status_code, 400)
+        self.assertFalse(resp.streaming)
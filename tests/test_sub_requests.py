@@ -0,0 +1,105 @@
+'''
+@summary: Test cases for the construction of the sub-requests of a batch.
+'''
+from __future__ import absolute_import, unicode_literals
+
+import json
+
+import mock
+from django.test import RequestFactory, SimpleTestCase
+
+from batch_requests.settings import br_settings as _settings
+from batch_requests.utils import SubRequestBuilder, get_sub_request_builder, get_wsgi_request_object
+from batch_requests.views import construct_wsgi_from_data
+from tests.test_base import TestBase
+
+
+class TestSubRequestBuilder(SimpleTestCase):
+    '''
+        Tests the sub-requests look like requests made by a client.
+    '''
+
+    def setUp(self):
+        self.batch_request = RequestFactory().post(
+            "/api/v1/batch/", "[]", content_type="application/json",
+            HTTP_USER_AGENT="agent", HTTP_X_OTHER="other",
+        )
+
+    def test_get(self):
+        request = get_wsgi_request_object(
+            self.batch_request, "GET", "/views/caf%C3%A9/?a=1&b=%C3%A9", {"X-Custom": "x"}, ""
+        )
+
+        self.assertEqual(request.method, "GET")
+        self.assertEqual(request.path_info, "/views/café/")
+        self.assertEqual(request.GET.dict(), {"a": "1", "b": "é"})
+        self.assertEqual(request.META["HTTP_X_CUSTOM"], "x")
+        self.assertEqual(request.META["HTTP_USER_AGENT"], "agent")
+        self.assertNotIn("HTTP_X_OTHER", request.META)
+        self.assertEqual(request.body, b"")
+
+    def test_post(self):
+        request = get_wsgi_request_object(
+            self.batch_request, "POST", "/views/", {"content_type": "text/plain; charset=latin-1",
+                                                   "User-Agent": "own"}, "café"
+        )
+
+        self.assertEqual(request.body, "café".encode("latin-1"))
+        self.assertEqual(request.META["CONTENT_LENGTH"], "4")
+        self.assertEqual(request.content_type, "text/plain")
+        self.assertEqual(request.META["HTTP_USER_AGENT"], "own")
+
+    def test_dict_body_with_bytes(self):
+        request = construct_wsgi_from_data(self.batch_request, {
+            "method": "post", "url": "/views/", "body": {"text": b"caf\xc3\xa9", "tags": [b"a"]},
+        })
+
+        self.assertEqual(json.loads(request.body.decode("utf-8")), {"text": "café", "tags": ["a"]})
+
+    def test_form_post(self):
+        request = get_wsgi_request_object(
+            self.batch_request, "POST", "/views/", {"content_type": "application/x-www-form-urlencoded"}, "a=1&b=2"
+        )
+
+        self.assertEqual(request.POST.dict(), {"a": "1", "b": "2"})
+
+    def test_default_content_type(self):
+        request = get_wsgi_request_object(self.batch_request, "PUT", "/views/", {}, b"\x00\x01")
+
+        self.assertEqual(request.META["CONTENT_TYPE"], _settings.DEFAULT_CONTENT_TYPE)
+        self.assertEqual(request.body, b"\x00\x01")
+
+    def test_https(self):
+        for use_https, port in ((True, "443"), (False, "80")):
+            with mock.patch.object(_settings, "USE_HTTPS", use_https):
+                request = SubRequestBuilder(self.batch_request).build("GET", "/views/", {}, "")
+
+            self.assertEqual(request.is_secure(), use_https)
+            self.assertEqual(request.META["SERVER_PORT"], port)
+
+    def test_own_error_stream(self):
+        builder = SubRequestBuilder(self.batch_request)
+        requests = [builder.build("GET", "/views/", {}, "") for _ in range(2)]
+
+        self.assertIsNot(requests[0].META["wsgi.errors"], requests[1].META["wsgi.errors"])
+
+    def test_builder_shared_by_the_batch(self):
+        self.assertIs(get_sub_request_builder(self.batch_request), get_sub_request_builder(self.batch_request))
+
+
+class TestBatchSubRequests(TestBase):
+    '''
+        Tests what the sub-requests inherit from the batch request is computed once.
+    '''
+
+    def test_base_environ_computed_once(self):
+        with mock.patch("batch_requests.utils.SubRequestBuilder", wraps=SubRequestBuilder) as builder:
+            resp = self.client.post("/api/v1/batch/", json.dumps([
+                {"method": "get", "url": "/views/"},
+                {"method": "post", "url": "/views/", "body": "data", "headers": {"content_type": "text/plain"}},
+                {"method": "get", "url": "/echo/?header=method", "headers": {"User-Agent": "sub"}},
+            ]), content_type="application/json", HTTP_USER_AGENT="batch")
+
+        self.assertEqual(builder.call_count, 1)
+        responses = json.loads(resp.content.decode("utf-8"))
+        self.assertEqual([r["body"] for r in responses], ["Success!", "data", "GET"])
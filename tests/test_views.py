@@ -7,10 +7,15 @@ import json
 from time import sleep
 
 import six
+from django.contrib.auth.models import User
+from django.db import connection, router
 from django.http.response import HttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import View
 
+from batch_requests.bulk import bulk_handler
+from batch_requests.loaders import get_loader
+
 
 class SimpleView(View):
 
@@ -141,3 +146,68 @@ class SleepingView(View):
         sleep(seconds)
         # Make the current thread sleep.
         return HttpResponse("Success!")
+
+
+def get_items(calls):
+    '''
+        Answers the GET requests for items all at once, lets the view answer the others.
+    '''
+    pks = ",".join(call.kwargs["pk"] for call in calls)
+    return [
+        HttpResponse("item %s of %s" % (call.kwargs["pk"], pks)) if call.request.method == "GET" else None
+        for call in calls
+    ]
+
+
+@bulk_handler(get_items)
+def item_view(request, pk):
+    return HttpResponse("item %s" % pk)
+
+
+class ItemView(View):
+
+    '''
+        A class based view with a bulk handler.
+    '''
+
+    def get(self, request, pk):
+        return HttpResponse("item %s" % pk)
+
+    @classmethod
+    def bulk_handler(cls, calls):
+        return get_items(calls)
+
+
+def user_view(request, pk):
+    '''
+        Answers the username of the user, loaded through the loader of the batch.
+    '''
+    user = get_loader(request, User).load(pk)
+    return HttpResponse(user.username if user else "", status=200 if user else 404)
+
+
+def get_squares(numbers):
+    return {n: n * n for n in numbers}
+
+
+def square_view(request, n):
+    return HttpResponse("%d" % get_loader(request, get_squares).load(int(n)))
+
+
+def query_view(request, n):
+    '''
+        Makes n queries, which need no table.
+    '''
+    with connection.cursor() as cursor:
+        for i in range(int(n)):
+            cursor.execute("SELECT %s", [i])
+    return HttpResponse("%s queries" % n)
+
+
+def database_view(request):
+    '''
+        Answers the database reads of users are routed to, after routing a write if asked.
+    '''
+    if "write" in request.GET:
+        router.db_for_write(User)
+    return HttpResponse(router.db_for_read(User))
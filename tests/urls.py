@@ -1,12 +1,19 @@
+import six
 from django.conf.urls import url
 
 from batch_requests.views import handle_batch_requests
 from tests.test_views import (
     EchoHeaderView,
     ExceptionView,
+    ItemView,
     RateLimitedView,
     SimpleView,
     SleepingView,
+    database_view,
+    item_view,
+    query_view,
+    square_view,
+    user_view,
 )
 
 
@@ -16,5 +23,20 @@ urlpatterns = [
     url(r'^exception/', ExceptionView.as_view()),
     url(r'^sleep/', SleepingView.as_view()),
     url(r'^rate-limited/', RateLimitedView.as_view()),
+    url(r'^items/(?P<pk>\d+)/', item_view),
+    url(r'^item-views/(?P<pk>\d+)/', ItemView.as_view()),
+    url(r'^users/(?P<pk>\d+)/', user_view),
+    url(r'^squares/(?P<n>\d+)/', square_view),
+    url(r'^queries/(?P<n>\d+)/', query_view),
+    url(r'^databases/', database_view),
     url(r'^api/v1/batch/', handle_batch_requests),
 ]
+
+if not six.PY2:
+    from batch_requests.async_views import async_handle_batch_requests
+    from tests.async_views import async_sleeping_view
+
+    urlpatterns += [
+        url(r'^async-sleep/', async_sleeping_view),
+        url(r'^api/v1/async-batch/', async_handle_batch_requests),
+    ]